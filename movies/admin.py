@@ -1,9 +1,9 @@
 # movies/admin.py
 from django.contrib import admin
-from .models import Genre, Movie, Review, UserProfile
+from .models import Genre, Movie, Review, Task, UserProfile
 
 class MovieAdmin(admin.ModelAdmin):
-    list_display = ["title", "release_date", "average_rating", "trailer_url"]  # NEW: Include trailer_url in list_display
+    list_display = ["title", "release_date", "average_rating", "rating_count", "trailer_url"]  # NEW: Include trailer_url in list_display
     list_filter = ["genre", "release_date"]
     search_fields = ["title"]
 
@@ -17,7 +17,14 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ["user"]
     search_fields = ["user__username", "telegram_id", "phone_number"]
 
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "attempts", "max_attempts", "run_after", "created_at", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name", "dedupe_key"]
+    readonly_fields = ["created_at", "finished_at", "locked_at"]
+
 admin.site.register(Genre)
 admin.site.register(Movie, MovieAdmin)
 admin.site.register(Review, ReviewAdmin)
-admin.site.register(UserProfile, UserProfileAdmin)
\ No newline at end of file
+admin.site.register(UserProfile, UserProfileAdmin)
+admin.site.register(Task, TaskAdmin)
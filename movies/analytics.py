@@ -0,0 +1,126 @@
+"""
+Rollup tables behind the staff analytics page.
+
+DailyReviewStat, GenreMovieStat and UserReviewStat are shifted by signals on
+every review and movie-genre write, and rebuild_analytics() recomputes them
+from the raw tables (see `manage.py rebuild_analytics`). The analytics view
+only ever reads the rollups.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .counters import bump
+from .models import DailyReviewStat, Genre, GenreMovieStat, Review, UserReviewStat
+
+GRANULARITIES = {
+    "day": None,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+
+def record_review(review, sign=1, previous_rating=None):
+    """
+    Count a review in (sign=1) or out of (sign=-1) the rollups. For an edit,
+    pass the rating it replaced and only the rating sum moves.
+    """
+    day = timezone.localdate(review.created_at)
+    if previous_rating is not None:
+        bump(DailyReviewStat, {"date": day}, rating_sum=review.rating - previous_rating)
+        return
+    bump(DailyReviewStat, {"date": day}, review_count=sign, rating_sum=sign * review.rating)
+    bump(UserReviewStat, {"user_id": review.user_id}, review_count=sign)
+
+
+def record_genre_links(genre_ids, delta):
+    for genre_id in genre_ids:
+        bump(GenreMovieStat, {"genre_id": genre_id}, movie_count=delta)
+
+
+# =================== BACKFILL ===================
+
+def rebuild_analytics():
+    """Recompute every rollup from the raw tables. Returns row counts per rollup."""
+    with transaction.atomic():
+        DailyReviewStat.objects.all().delete()
+        daily = (
+            Review.objects.order_by()
+            .annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(review_count=Count("id"), rating_sum=Sum("rating"))
+        )
+        DailyReviewStat.objects.bulk_create(
+            [DailyReviewStat(date=row["day"], review_count=row["review_count"], rating_sum=row["rating_sum"])
+             for row in daily],
+            batch_size=1000,
+        )
+
+        GenreMovieStat.objects.all().delete()
+        genres = Genre.objects.annotate(movie_count=Count("movie")).values_list("id", "movie_count")
+        GenreMovieStat.objects.bulk_create(
+            [GenreMovieStat(genre_id=genre_id, movie_count=count) for genre_id, count in genres],
+            batch_size=1000,
+        )
+
+        UserReviewStat.objects.all().delete()
+        users = Review.objects.order_by().values("user_id").annotate(review_count=Count("id"))
+        UserReviewStat.objects.bulk_create(
+            [UserReviewStat(user_id=row["user_id"], review_count=row["review_count"]) for row in users],
+            batch_size=1000,
+        )
+
+    return {
+        "daily reviews": DailyReviewStat.objects.count(),
+        "genres": GenreMovieStat.objects.count(),
+        "users": UserReviewStat.objects.count(),
+    }
+
+
+# =================== READS ===================
+
+def rating_series(start, end, granularity="month"):
+    """
+    Review count and average rating per day, week or month between `start` and
+    `end` (inclusive dates), aggregated from DailyReviewStat alone.
+    """
+    rows = DailyReviewStat.objects.filter(date__range=(start, end))
+    trunc = GRANULARITIES[granularity]
+    period = trunc("date") if trunc else F("date")
+    rows = (
+        rows.annotate(period=period)
+        .values("period")
+        .annotate(review_count=Sum("review_count"), rating_sum=Sum("rating_sum"))
+        .order_by("period")
+    )
+    return [
+        {
+            "period": row["period"],
+            "review_count": row["review_count"],
+            "avg_rating": row["rating_sum"] / row["review_count"] if row["review_count"] else 0,
+        }
+        for row in rows
+    ]
+
+
+def genre_movie_counts():
+    return GenreMovieStat.objects.filter(movie_count__gt=0).order_by("-movie_count").values(
+        "genre__name", "movie_count"
+    )
+
+
+def top_reviewers(limit=5):
+    return (
+        UserReviewStat.objects.filter(review_count__gt=0)
+        .order_by("-review_count")
+        .annotate(username=F("user__username"))
+        .values("username", "review_count")[:limit]
+    )
+
+
+def default_range(days=180):
+    end = timezone.localdate()
+    return end - datetime.timedelta(days=days), end
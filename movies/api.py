@@ -0,0 +1,240 @@
+"""
+Read-only JSON API (v1) for the mobile client.
+
+Rows are fetched with .values() and serialized straight from those dicts,
+so a response never builds model instances or walks ORM attributes in
+Python. Every list endpoint takes `fields=` (comma separated, see the
+*_FIELDS tables below), keyset `cursor=` pagination and `limit=`; the movie
+list also accepts `ids=` for batched lookups and the same genre/search/sort
+parameters as the movie_list page.
+"""
+from collections import defaultdict
+
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Genre, Movie, Review
+from .pagination import KeysetPaginator
+from .search import search_movies, search_terms
+from .views import MOVIE_LIST_ORDERINGS
+from .wishlist import get_wishlist_ids
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_IDS = 100
+
+# Public field name -> expression for .values(); None marks fields filled in afterwards
+MOVIE_FIELDS = {
+    "id": F("id"),
+    "title": F("title"),
+    "release_date": F("release_date"),
+    "synopsis": F("synopsis"),
+    "average_rating": F("average_rating"),
+    "rating_count": F("rating_count"),
+    "telegram_link": F("telegram_link"),
+    "trailer_url": F("trailer_url"),
+    "poster": F("poster"),
+    "genres": None,
+}
+MOVIE_DEFAULT_FIELDS = ("id", "title", "release_date", "average_rating", "rating_count", "poster", "genres")
+
+GENRE_FIELDS = {"id": F("id"), "name": F("name")}
+
+REVIEW_FIELDS = {
+    "id": F("id"),
+    "movie_id": F("movie_id"),
+    "username": F("user__username"),
+    "rating": F("rating"),
+    "comment": F("comment"),
+    "created_at": F("created_at"),
+}
+REVIEW_DEFAULT_FIELDS = ("id", "username", "rating", "comment", "created_at")
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({"status": "error", "message": message}, status=status)
+
+
+def _json(payload):
+    return JsonResponse(payload, json_dumps_params={"separators": (",", ":")})
+
+
+def _selected_fields(request, available, default):
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(default)
+    fields = [name for name in dict.fromkeys(raw.split(",")) if name]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _int_list(raw, limit):
+    try:
+        values = [int(value) for value in raw.split(",") if value]
+    except ValueError:
+        raise BadRequest("ids must be a comma separated list of integers")
+    if len(values) > limit:
+        raise BadRequest(f"At most {limit} ids per request")
+    return values
+
+
+def _limit(request):
+    try:
+        return max(1, min(int(request.GET.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+
+
+def _values(queryset, fields, table, ordering=()):
+    """
+    .values() over the requested columns plus whatever the ordering needs
+    for cursors. Returns (queryset, names to drop from each row afterwards).
+    """
+    keys = [key.lstrip("-") for key in ordering]
+    columns = {name: table[name] for name in fields if table[name] is not None}
+    extra = [key for key in keys if key not in columns]
+    for key in extra:
+        columns[key] = table.get(key) or F(key)
+    # .values() can't alias an expression to an existing field name, so the
+    # plain F() columns are selected by name
+    plain = [name for name, expr in columns.items() if isinstance(expr, F) and expr.name == name]
+    aliased = {name: expr for name, expr in columns.items() if name not in plain}
+    return queryset.values(*plain, **aliased), extra
+
+
+def _page(queryset, ordering, request, drop=()):
+    page = KeysetPaginator(queryset, _limit(request), ordering).get_page(request.GET.get("cursor"))
+    rows = page.object_list
+    for row in rows:
+        for name in drop:
+            del row[name]
+    return rows, {"next": page.next_cursor, "previous": page.previous_cursor}
+
+
+def _fill_movie_rows(rows, fields):
+    """Resolve poster URLs and genre names in place, one query for all genres."""
+    if "genres" in fields:
+        names = defaultdict(list)
+        links = (
+            Movie.genre.through.objects
+            .filter(movie_id__in=[row["id"] for row in rows])
+            .order_by("id")
+            .values_list("movie_id", "genre__name")
+        )
+        for movie_id, name in links:
+            names[movie_id].append(name)
+        for row in rows:
+            row["genres"] = names[row["id"]]
+    if "poster" in fields:
+        for row in rows:
+            row["poster"] = row["poster"].url if row["poster"] else ""
+
+
+def api_view(view):
+    """GET only, and BadRequest raised anywhere inside becomes a 400 JSON error."""
+    @require_GET
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return _error(str(exc))
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+# =================== ENDPOINTS ===================
+
+@api_view
+def movie_list(request):
+    fields = _selected_fields(request, MOVIE_FIELDS, MOVIE_DEFAULT_FIELDS)
+    # id is always fetched: genre names are looked up by it
+    needed = fields if "id" in fields else ["id", *fields]
+
+    movies = Movie.objects.all()
+    if request.GET.get("ids"):
+        ids = _int_list(request.GET["ids"], MAX_IDS)
+        queryset, _ = _values(movies.filter(pk__in=ids), needed, MOVIE_FIELDS)
+        rows = {row["id"]: row for row in queryset}
+        results = [rows[movie_id] for movie_id in dict.fromkeys(ids) if movie_id in rows]
+        _fill_movie_rows(results, fields)
+        if "id" not in fields:
+            for row in results:
+                del row["id"]
+        return _json({"results": results})
+
+    # Same lookup as the movie_list page, so a genre filter matches the same movies in both
+    genre = request.GET.get("genre", "").strip()
+    if genre:
+        movies = movies.filter(
+            pk__in=Movie.genre.through.objects.filter(genre__name__icontains=genre).values("movie_id")
+        )
+    # Normalised like the movie_list page: a query with no terms left ("!!!") is no search at all
+    search_key = " ".join(search_terms(request.GET.get("search", "")))
+    sort_by = request.GET.get("sort") or ("relevance" if search_key else "newest")
+    if sort_by not in MOVIE_LIST_ORDERINGS or (sort_by == "relevance" and not search_key):
+        sort_by = "newest"
+    if search_key:
+        movies = search_movies(movies, search_key)
+
+    ordering = MOVIE_LIST_ORDERINGS[sort_by]
+    queryset, drop = _values(movies, needed, MOVIE_FIELDS, ordering)
+    if "id" not in fields and "id" not in drop:
+        drop = [*drop, "id"]
+    rows, cursors = _page(queryset, ordering, request)
+    _fill_movie_rows(rows, fields)
+    for row in rows:
+        for name in drop:
+            del row[name]
+    return _json({"results": rows, **cursors})
+
+
+@api_view
+def movie_detail(request, movie_id):
+    fields = _selected_fields(request, MOVIE_FIELDS, MOVIE_FIELDS)
+    needed = fields if "id" in fields else ["id", *fields]
+    queryset, _ = _values(Movie.objects.filter(pk=movie_id), needed, MOVIE_FIELDS)
+    rows = list(queryset)
+    if not rows:
+        return _error("Movie not found", status=404)
+    _fill_movie_rows(rows, fields)
+    if "id" not in fields:
+        del rows[0]["id"]
+    return _json(rows[0])
+
+
+@api_view
+def genre_list(request):
+    fields = _selected_fields(request, GENRE_FIELDS, GENRE_FIELDS)
+    queryset, _ = _values(Genre.objects.order_by("name"), fields, GENRE_FIELDS)
+    return _json({"results": list(queryset)})
+
+
+@api_view
+def review_list(request, movie_id):
+    if not Movie.objects.filter(pk=movie_id).exists():
+        return _error("Movie not found", status=404)
+    fields = _selected_fields(request, REVIEW_FIELDS, REVIEW_DEFAULT_FIELDS)
+    ordering = ("-created_at", "-id")
+    queryset, drop = _values(Review.objects.filter(movie_id=movie_id), fields, REVIEW_FIELDS, ordering)
+    rows, cursors = _page(queryset, ordering, request, drop)
+    return _json({"results": rows, **cursors})
+
+
+@api_view
+def wishlist(request):
+    """The signed-in user's wishlisted movie ids, or with `ids=` just those of them wishlisted."""
+    if not request.user.is_authenticated:
+        return _error("Authentication required", status=401)
+    wishlisted = get_wishlist_ids(request.user)
+    if request.GET.get("ids"):
+        ids = _int_list(request.GET["ids"], MAX_IDS)
+        return _json({"ids": [movie_id for movie_id in ids if movie_id in wishlisted]})
+    return _json({"ids": sorted(wishlisted)})
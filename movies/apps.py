@@ -7,3 +7,4 @@ class MoviesConfig(AppConfig):
     def ready(self):
         # Ensure post_save signals for UserProfile are registered
         import movies.signals  # noqa
+        import movies.checks  # noqa
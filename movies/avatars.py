@@ -0,0 +1,229 @@
+"""
+Avatar processing.
+
+Uploads are capped while they stream in: AvatarUploadHandler stops reading
+once the file passes MAX_UPLOAD_BYTES, or once the image header shows the
+image is larger than MAX_DIMENSION. The accepted original is saved as it
+is. A background task (see tasks.py) then decodes it, applies and
+strips the EXIF orientation, crops it square and writes one WebP per
+AVATAR_SIZES entry. It then points UserProfile.avatar at the largest of
+them and deletes the original. The settings POST returns without waiting
+for Pillow. An original Pillow can't decode (HEIC, say) is kept as it is
+and shown unprocessed.
+
+Processed avatars are named "avatars/<user id>/<token>-<px>.webp", so the
+URL of any size follows from the stored name (see avatar_url).
+"""
+import io
+import logging
+import re
+import secrets
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+from .models import UserProfile
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+# Name -> square edge in pixels; 2x the largest size each one is shown at
+AVATAR_SIZES = {"small": 80, "medium": 240}
+LARGEST = max(AVATAR_SIZES.values())
+
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+MAX_DIMENSION = 6000
+WEBP_QUALITY = 82
+
+PROCESSED_NAME = re.compile(r"^(avatars/\d+/[0-9a-f]+)-\d+\.webp$")
+
+
+# =================== UPLOAD LIMITS ===================
+
+class AvatarTooLarge(Exception):
+    pass
+
+
+class AvatarUnreadable(Exception):
+    pass
+
+
+class AvatarUploadHandler(FileUploadHandler):
+    """
+    Rejects an oversized "avatar" upload as soon as the limit is crossed
+    instead of after the whole body has been written to disk. The reason
+    is kept in `error` for the view to show; the file itself is skipped.
+    """
+
+    field_name = "avatar"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self._active = False
+        self._received = 0
+        self._parser = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._active = field_name == self.field_name
+        self._received = 0
+        self._parser = None
+        if self._active:
+            from PIL import ImageFile
+
+            self._parser = ImageFile.Parser()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self._active:
+            return raw_data
+        self._received += len(raw_data)
+        try:
+            if self._received > MAX_UPLOAD_BYTES:
+                raise AvatarTooLarge(f"Photos can be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+            self._check_dimensions(raw_data)
+        except AvatarTooLarge as exc:
+            self.error = str(exc)
+            raise SkipFile
+        return raw_data
+
+    def _check_dimensions(self, raw_data):
+        # Feed the parser only until the header has given up the image size
+        if self._parser is None:
+            return
+        try:
+            self._parser.feed(raw_data)
+        except Exception:
+            self._parser = None  # not an image Pillow can parse; the form's own validation reports it
+            return
+        image = self._parser.image
+        if image is not None:
+            self._parser = None
+            if max(image.size) > MAX_DIMENSION:
+                raise AvatarTooLarge(f"Photos can be at most {MAX_DIMENSION}×{MAX_DIMENSION} pixels.")
+
+    def file_complete(self, file_size):
+        return None
+
+
+# =================== NAMES ===================
+
+def avatar_url(name, size="small"):
+    """
+    URL of the `size` rendition of a processed avatar. An avatar that hasn't
+    been processed (yet, or ever) falls back to its original; no avatar is "".
+    """
+    if not name:
+        return ""
+    match = PROCESSED_NAME.match(name)
+    if not match:
+        return default_storage.url(name)
+    return default_storage.url(f"{match.group(1)}-{AVATAR_SIZES[size]}.webp")
+
+
+def _rendition_names(name):
+    match = PROCESSED_NAME.match(name or "")
+    if not match:
+        return [name] if name else []
+    return [f"{match.group(1)}-{px}.webp" for px in AVATAR_SIZES.values()]
+
+
+def delete_avatar_files(name):
+    """Remove an avatar and, if it was processed, all of its sizes."""
+    for path in _rendition_names(name):
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning("Could not delete avatar file %s", path)
+
+
+# =================== PROCESSING ===================
+
+def render_avatar(source):
+    """{px: WebP bytes} for every avatar size, from an open file of the original."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        if max(image.size) > MAX_DIMENSION:
+            raise ValueError(f"{image.size[0]}×{image.size[1]} is larger than {MAX_DIMENSION}px")
+        image = ImageOps.exif_transpose(image)
+        # Re-encoding from pixel data alone leaves EXIF (GPS, camera serial) behind
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        rendered = {}
+        for px in sorted(AVATAR_SIZES.values(), reverse=True):
+            square = ImageOps.fit(image, (px, px), method=Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            square.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            rendered[px] = buffer.getvalue()
+    return rendered
+
+
+def process_avatar(profile_id, name, previous=None):
+    """
+    Replace the uploaded original `name` with its processed sizes.
+    `previous` is the avatar it replaced, deleted once the new one is live.
+    If the profile's avatar has changed in the meantime, only the files
+    left orphaned are removed. Returns the new name, or None if it was
+    superseded. Raises AvatarUnreadable, leaving the original and the
+    profile untouched, if the original can't be read or decoded.
+    """
+    profile = UserProfile.objects.filter(pk=profile_id).values("user_id", "avatar").first()
+    if profile is None:
+        return None
+    if profile["avatar"] != name:
+        # Superseded by a later upload: only the files nobody points at any more are left to clean up
+        for stale in (name, previous):
+            if stale and stale != profile["avatar"]:
+                delete_avatar_files(stale)
+        return None
+
+    try:
+        with default_storage.open(name, "rb") as source:
+            rendered = render_avatar(source)
+    except Exception as exc:
+        raise AvatarUnreadable(f"Could not process avatar {name}: {exc}") from exc
+
+    base = f"avatars/{profile['user_id']}/{secrets.token_hex(8)}"
+    for px, content in rendered.items():
+        default_storage.save(f"{base}-{px}.webp", ContentFile(content))
+    processed = f"{base}-{LARGEST}.webp"
+
+    # Only swap if nobody uploaded another photo while this one was rendering
+    if UserProfile.objects.filter(pk=profile_id, avatar=name).update(avatar=processed):
+        delete_avatar_files(name)
+        if previous and previous != name:
+            delete_avatar_files(previous)
+        return processed
+    delete_avatar_files(processed)
+    return None
+
+
+@task
+def process_avatar_task(profile_id, name, previous=None):
+    try:
+        process_avatar(profile_id, name, previous)
+    except AvatarUnreadable:
+        # Retrying won't make it decodable; the original stays up as it is
+        logger.warning("Avatar %s kept unprocessed", name, exc_info=True)
+
+
+def schedule_avatar_processing(profile, previous=None):
+    """Queue processing of `profile`'s freshly saved avatar."""
+    name = profile.avatar.name
+    if not name or PROCESSED_NAME.match(name):
+        return
+    process_avatar_task.enqueue(profile_id=profile.pk, name=name, previous=previous or None)
+
+
+def pending_avatars():
+    """(profile id, avatar name) for every avatar that was never processed, e.g. uploaded before this pipeline."""
+    rows = (
+        UserProfile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+        .order_by("pk")
+        .values_list("pk", "avatar")
+    )
+    for profile_id, name in rows.iterator(chunk_size=500):
+        if not PROCESSED_NAME.match(name):
+            yield profile_id, name
+
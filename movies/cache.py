@@ -0,0 +1,336 @@
+"""
+Two-tier cache for computed catalog data.
+
+    @cached(ttl=300, stale_ttl=3600, tags=("catalog",))
+    def genre_names():
+        return list(Genre.objects.order_by("name").values_list("name", flat=True))
+
+L1 is a bounded in-process LRU; L2 is Django's default cache, which must
+be shared by every process on every machine (Redis, or the database
+cache; see settings.CACHES). A lookup tries L1, then L2, then computes.
+
+- Tags: every tag has a version stamp in L2, and the stamps of an entry's
+  tags are part of its key. invalidate_tags() therefore makes every entry
+  carrying the tag unreachable in every process at once; the old entries
+  simply age out. Tag stamps are always read from L2, never from L1, so no
+  process can keep serving data from before an invalidation.
+- Single flight: concurrent misses for one key in a process wait for a
+  single computation, and across processes an L2 lock lets one of them
+  compute while the rest poll for its result. A waiter that gives up
+  computes the value itself rather than fail its request.
+- Stale-while-revalidate: for `stale_ttl` seconds after an entry stops
+  being fresh it is still served while one background thread recomputes
+  it.
+- Stats: hits, misses and so on are counted per process and added to
+  shared counters in L2 every few seconds (see shared_stats()).
+
+versions.py keeps its per-movie and catalog stamps as tags of this cache.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+STAT_NAMES = ("l1_hits", "l2_hits", "stale_hits", "misses", "computes", "waits", "refreshes", "errors")
+STATS_FLUSH_INTERVAL = 10.0
+
+
+class TTLCache:
+    """A thread-safe LRU of at most `maxsize` entries, each expiring `ttl` seconds after it was set."""
+
+    def __init__(self, maxsize=512, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < self.clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    def __init__(self, alias="default", l1_size=1024, l1_ttl=30, lock_timeout=10.0, poll_interval=0.05):
+        self.alias = alias
+        self.l1 = TTLCache(maxsize=l1_size, ttl=l1_ttl)
+        self.l1_ttl = l1_ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._inflight = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        self._stats = Counter()
+        self._unflushed = Counter()
+        self._last_flush = time.monotonic()
+
+    @property
+    def l2(self):
+        return caches[self.alias]
+
+    # ---- tags ----
+
+    @staticmethod
+    def tag_key(tag):
+        return f"movies:version:{tag}"
+
+    def tag_versions(self, tags):
+        """{tag: stamp}; a stamp lost to eviction is replaced with a fresh one."""
+        if not tags:
+            return {}
+        keys = {self.tag_key(tag): tag for tag in tags}
+        found = self.l2.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stamp = time.time_ns()
+            for key in missing:
+                # add() so a concurrent invalidation isn't overwritten with an older stamp
+                self.l2.add(key, stamp, None)
+            found.update(self.l2.get_many(missing))
+        return {keys[key]: found.get(key, 0) for key in keys}
+
+    def invalidate_tags(self, *tags):
+        stamp = time.time_ns()
+        self.l2.set_many({self.tag_key(tag): stamp for tag in tags}, None)
+        return stamp
+
+    def _full_key(self, key, tags):
+        if not tags:
+            return key
+        versions = self.tag_versions(tags)
+        suffix = ".".join(str(versions[tag]) for tag in sorted(versions))
+        return f"{key}@{hashlib.sha1(suffix.encode()).hexdigest()[:16]}"
+
+    # ---- lookups ----
+
+    def get_or_set(self, key, compute, ttl=300, stale_ttl=0, tags=()):
+        """The value under `key`, calling `compute()` (once, whatever the concurrency) if it has to."""
+        full_key = self._full_key(key, tags)
+        now = time.time()
+
+        entry = self.l1.get(full_key)
+        if entry is not None and now < entry[1]:
+            self._count("l1_hits")
+            return entry[0]
+        # Not fresh in L1: another process may already have refreshed L2
+        shared = self.l2.get(full_key)
+        if shared is not None:
+            entry = shared
+            self._remember(full_key, entry, now)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self._count("l2_hits")
+                return value
+            if now < stale_until:
+                self._count("stale_hits")
+                self._refresh_later(full_key, compute, ttl, stale_ttl)
+                return value
+
+        self._count("misses")
+        return self._single_flight(full_key, compute, ttl, stale_ttl)
+
+    def delete(self, key):
+        """Drop an untagged entry (other processes may hold it in L1 for up to l1_ttl seconds)."""
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def _remember(self, full_key, entry, now):
+        self.l1.set(full_key, entry, max(0.0, min(self.l1_ttl, entry[2] - now)))
+
+    def _store(self, full_key, value, ttl, stale_ttl):
+        now = time.time()
+        entry = (value, now + ttl, now + ttl + stale_ttl)
+        self.l2.set(full_key, entry, int(ttl + stale_ttl) + 1)
+        self._remember(full_key, entry, now)
+
+    def _single_flight(self, full_key, compute, ttl, stale_ttl):
+        with self._lock:
+            flight = self._inflight.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[full_key] = Future()
+        if not leader:
+            self._count("waits")
+            try:
+                return flight.result(timeout=self.lock_timeout * 2)
+            except FutureTimeoutError:
+                # The leader is stuck; serving this request beats failing it
+                logger.warning("Gave up waiting for %s; computing it here", full_key)
+                self._count("computes")
+                value = compute()
+                self._store(full_key, value, ttl, stale_ttl)
+                return value
+
+        try:
+            # A flight that landed between our lookup and taking the lead has already done the work
+            entry = self.l1.get(full_key)
+            if entry is not None and time.time() < entry[1]:
+                self._count("waits")
+                value = entry[0]
+            else:
+                value = self._compute_once(full_key, compute, ttl, stale_ttl)
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+
+    def _compute_once(self, full_key, compute, ttl, stale_ttl):
+        lock_key = f"{full_key}:lock"
+        owner = self.l2.add(lock_key, 1, int(self.lock_timeout) + 1)
+        if not owner:
+            # Another process is computing it; wait a little for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                entry = self.l2.get(full_key)
+                if entry is not None and time.time() < entry[1]:
+                    self._count("waits")
+                    self._remember(full_key, entry, time.time())
+                    return entry[0]
+        try:
+            if owner:
+                # The previous lock holder may have stored it just before we got the lock
+                entry = self.l2.get(full_key)
+                if entry is not None and time.time() < entry[1]:
+                    self._remember(full_key, entry, time.time())
+                    return entry[0]
+            self._count("computes")
+            value = compute()
+            self._store(full_key, value, ttl, stale_ttl)
+            return value
+        finally:
+            if owner:
+                self.l2.delete(lock_key)
+
+    def _refresh_later(self, full_key, compute, ttl, stale_ttl):
+        with self._lock:
+            if full_key in self._refreshing:
+                return
+            self._refreshing.add(full_key)
+        self._refresher.submit(self._refresh, full_key, compute, ttl, stale_ttl)
+
+    def _refresh(self, full_key, compute, ttl, stale_ttl):
+        try:
+            self._count("refreshes")
+            self._single_flight(full_key, compute, ttl, stale_ttl)
+        except Exception:
+            self._count("errors")
+            logger.exception("Background refresh of %s failed", full_key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(full_key)
+            close_old_connections()
+
+    # ---- stats ----
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+            self._unflushed[name] += 1
+            due = time.monotonic() - self._last_flush >= STATS_FLUSH_INTERVAL
+        if due:
+            self.flush_stats()
+
+    def stats(self):
+        """This process's counters since it started."""
+        with self._lock:
+            return {name: self._stats[name] for name in STAT_NAMES}
+
+    def flush_stats(self):
+        with self._lock:
+            pending, self._unflushed = self._unflushed, Counter()
+            self._last_flush = time.monotonic()
+        for name, value in pending.items():
+            key = f"movies:cache-stats:{name}"
+            self.l2.add(key, 0, None)
+            try:
+                self.l2.incr(key, value)
+            except ValueError:
+                self.l2.set(key, value, None)
+
+    def shared_stats(self):
+        """Counters summed over every process, as of each one's last flush."""
+        self.flush_stats()
+        values = self.l2.get_many([f"movies:cache-stats:{name}" for name in STAT_NAMES])
+        stats = {name: values.get(f"movies:cache-stats:{name}", 0) for name in STAT_NAMES}
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+            self._unflushed.clear()
+        self.l2.delete_many([f"movies:cache-stats:{name}" for name in STAT_NAMES])
+
+
+tiered = TieredCache()
+
+
+def cached(ttl=300, stale_ttl=0, tags=(), key=None):
+    """
+    Memoize a function in the tiered cache. `tags` is a tuple of tags, or
+    a callable taking the function's arguments and returning one. The key
+    is `key` (or the function's dotted name) plus a hash of the arguments,
+    which must have stable reprs.
+    """
+    def decorator(func):
+        prefix = key or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return tiered.get_or_set(
+                f"movies:cached:{prefix}:{digest}",
+                lambda: func(*args, **kwargs),
+                ttl=ttl,
+                stale_ttl=stale_ttl,
+                tags=entry_tags,
+            )
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+"""
+Read model for movie cards (home, movie_list and wishlist pages).
+
+A card needs a handful of columns, a short synopsis excerpt and the genre
+names. card_queryset() selects exactly that and build_cards() resolves the
+genre names for a whole page in one extra query, so rendering N cards costs
+the same two queries whatever N is.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+
+from django.db.models.functions import Substr
+
+from .models import Movie
+from .renditions import PosterRenditions, get_renditions_many, poster_reference
+
+CARD_FIELDS = ("id", "title", "release_date", "poster", "telegram_link", "average_rating")
+
+# Long enough for the `truncatewords:20` excerpt the cards display
+BLURB_LENGTH = 300
+
+
+@dataclass(frozen=True)
+class MovieCard:
+    id: int
+    title: str
+    release_date: date
+    average_rating: float
+    telegram_link: str
+    poster_url: str
+    genres: tuple
+    blurb: str
+    poster: PosterRenditions
+
+
+def card_queryset(queryset=None):
+    """Restrict a Movie queryset to the columns a card renders."""
+    if queryset is None:
+        queryset = Movie.objects.all()
+    return queryset.only(*CARD_FIELDS).annotate(blurb=Substr("synopsis", 1, BLURB_LENGTH))
+
+
+def build_cards(movies):
+    """
+    Turn rows from card_queryset() into MovieCards, fetching all genre names
+    at once and every poster's renditions with one cache round trip.
+    """
+    movies = list(movies)
+    genre_names = defaultdict(list)
+    rows = (
+        Movie.genre.through.objects
+        .filter(movie_id__in=[movie.id for movie in movies])
+        .order_by("id")
+        .values_list("movie_id", "genre__name")
+    )
+    for movie_id, name in rows:
+        genre_names[movie_id].append(name)
+    renditions = get_renditions_many(movie.poster for movie in movies)
+
+    return [
+        MovieCard(
+            id=movie.id,
+            title=movie.title,
+            release_date=movie.release_date,
+            average_rating=movie.average_rating,
+            telegram_link=movie.telegram_link,
+            poster_url=movie.poster.url if movie.poster else "",
+            genres=tuple(genre_names[movie.id]),
+            blurb=movie.blurb,
+            poster=renditions[poster_reference(movie.poster)],
+        )
+        for movie in movies
+    ]
@@ -0,0 +1,360 @@
+"""
+Streaming catalog import/export (genres, movies, reviews) as NDJSON or CSV.
+
+Export walks each table in primary-key chunks and writes one record per
+line. Import reads records one at a time and writes them in batches with
+bulk_create, so memory stays flat however long the file is. Nothing fires
+per-row signals. Instead, finish() recomputes the derived data once at the
+end: rating aggregates, search index, analytics rollups and dashboard
+counters.
+
+NDJSON records carry a "type" of "genre", "movie" or "review". A CSV file
+holds a single type, with a movie's genre names joined by "|". Movies and
+reviews keep their ids, so importing a file twice updates rows instead of
+duplicating them. Genres are matched by name and reviewers by username.
+"""
+import csv
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .analytics import rebuild_analytics
+from .counters import reconcile_counters
+from .frontpage import invalidate_front_page
+from .models import Genre, Movie, Review, UserProfile
+from .ratings import rebuild_ratings
+from .search import rebuild_search_index
+from .versions import bump_movie_versions
+
+TYPES = ("genre", "movie", "review")
+FORMATS = ("ndjson", "csv")
+
+COLUMNS = {
+    "genre": ("name",),
+    "movie": ("id", "title", "release_date", "synopsis", "poster", "telegram_link", "trailer_url", "genres"),
+    "review": ("id", "movie", "user", "rating", "comment", "created_at"),
+}
+GENRE_SEPARATOR = "|"
+
+MOVIE_UPDATE_FIELDS = ["title", "release_date", "synopsis", "poster", "telegram_link", "trailer_url"]
+REVIEW_UPDATE_FIELDS = ["movie", "user", "rating", "comment"]
+# A record missing any of these is skipped rather than failing its whole batch
+MOVIE_REQUIRED = ["title", "release_date"]
+REVIEW_REQUIRED = ["rating"]
+
+CHUNK_SIZE = 2000
+
+
+class CatalogError(Exception):
+    pass
+
+
+# =================== EXPORT ===================
+
+def _chunks(queryset, size=CHUNK_SIZE):
+    """Rows of a .values() queryset (which must include "id") in keyset chunks."""
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by("pk")[:size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]["id"]
+
+
+def export_records(types=TYPES):
+    """Yield catalog records as dicts, genres first so an import can follow the same order."""
+    if "genre" in types:
+        for name in Genre.objects.order_by("pk").values_list("name", flat=True).iterator(chunk_size=CHUNK_SIZE):
+            yield {"type": "genre", "name": name}
+
+    if "movie" in types:
+        poster = Movie._meta.get_field("poster")
+        fields = ("id", "title", "release_date", "synopsis", "poster", "telegram_link", "trailer_url")
+        for rows in _chunks(Movie.objects.values(*fields)):
+            names = {row["id"]: [] for row in rows}
+            links = (
+                Movie.genre.through.objects
+                .filter(movie_id__in=names)
+                .order_by("id")
+                .values_list("movie_id", "genre__name")
+            )
+            for movie_id, name in links:
+                names[movie_id].append(name)
+            for row in rows:
+                row["poster"] = poster.get_prep_value(row["poster"]) if row["poster"] else ""
+                yield {"type": "movie", **row, "genres": names[row["id"]]}
+
+    if "review" in types:
+        reviews = Review.objects.values("id", "movie_id", "user__username", "rating", "comment", "created_at")
+        for rows in _chunks(reviews):
+            for row in rows:
+                yield {
+                    "type": "review",
+                    "id": row["id"],
+                    "movie": row["movie_id"],
+                    "user": row["user__username"],
+                    "rating": row["rating"],
+                    "comment": row["comment"],
+                    "created_at": row["created_at"],
+                }
+
+
+def write_ndjson(records, stream):
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(records, stream, record_type):
+    writer = csv.DictWriter(stream, fieldnames=COLUMNS[record_type], extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for record in records:
+        if record_type == "movie":
+            record["genres"] = GENRE_SEPARATOR.join(record["genres"])
+        if record_type == "review":
+            record["created_at"] = record["created_at"].isoformat()
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+# =================== IMPORT ===================
+
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise CatalogError(f"Line {line_number}: {exc}")
+
+
+def read_csv(stream, record_type):
+    for row in csv.DictReader(stream):
+        record = {key: value for key, value in row.items() if value != ""}
+        record["type"] = record_type
+        if record_type == "movie":
+            record["genres"] = [name for name in record.get("genres", "").split(GENRE_SEPARATOR) if name]
+        yield record
+
+
+def _clean(model, record, names, validate=(), required=()):
+    """
+    Field values from `record` converted by each model field; `validate` also
+    runs its validators, and a name in `required` must have a non-empty value.
+    """
+    missing = [name for name in required if record.get(name) in (None, "")]
+    if missing:
+        raise ValidationError(f"missing {', '.join(missing)}")
+    values = {}
+    for name in names:
+        if name in record and record[name] is not None:
+            field = model._meta.get_field(name)
+            values[name] = field.to_python(record[name])
+            if name in validate:
+                field.run_validators(values[name])
+    return values
+
+
+def _last_per_id(records, skip):
+    """
+    `records` with only the last one for each id, as an upsert can't touch
+    one row twice in a statement (Postgres refuses). Earlier ones go to `skip`.
+    """
+    last = {}
+    for index, record in enumerate(records):
+        if record.get("id") not in (None, ""):
+            last[str(record["id"])] = index
+    for index, record in enumerate(records):
+        if record.get("id") not in (None, "") and last[str(record["id"])] != index:
+            skip(record, "superseded by a later record with the same id")
+            continue
+        yield record
+
+
+class CatalogImporter:
+    """
+    importer = CatalogImporter(batch_size=1000)
+    for record in records:
+        if importer.add(record):
+            importer.flush()
+    importer.flush()
+    importer.finish()
+    """
+
+    def __init__(self, batch_size=1000, create_users=True):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.pending = {record_type: [] for record_type in TYPES}
+        self.stats = {"genres": 0, "movies": 0, "reviews": 0, "users": 0, "skipped": 0}
+        self.errors = []
+        self._genre_ids = None
+
+    def add(self, record):
+        """Queue a record; returns True once a batch is ready to flush."""
+        record_type = record.get("type")
+        if record_type not in TYPES:
+            self._skip(record, f"unknown type {record_type!r}")
+            return False
+        self.pending[record_type].append(record)
+        return len(self.pending[record_type]) >= self.batch_size
+
+    def _skip(self, record, reason):
+        self.stats["skipped"] += 1
+        if len(self.errors) < 100:
+            self.errors.append(f"{record.get('type')} {record.get('id', record.get('name', ''))}: {reason}")
+
+    def flush(self):
+        """Write every queued record in one transaction, genres before movies before reviews."""
+        genres, movies, reviews = (self.pending[record_type] for record_type in TYPES)
+        with transaction.atomic():
+            self._ensure_genres(record["name"] for record in genres if record.get("name"))
+            self.stats["genres"] += len(genres)
+            self._write_movies(movies)
+            self._write_reviews(reviews)
+        for batch in self.pending.values():
+            batch.clear()
+
+    # ---- genres ----
+
+    def _ensure_genres(self, names):
+        """Name -> id for `names`, creating the ones that don't exist yet."""
+        if self._genre_ids is None:
+            self._genre_ids = {}
+            for pk, name in Genre.objects.order_by("-pk").values_list("pk", "name"):
+                self._genre_ids[name] = pk  # the oldest genre wins on duplicate names
+        missing = list(dict.fromkeys(name for name in names if name not in self._genre_ids))
+        for genre in Genre.objects.bulk_create([Genre(name=name) for name in missing]):
+            self._genre_ids[genre.name] = genre.pk
+        return self._genre_ids
+
+    # ---- movies ----
+
+    def _write_movies(self, records):
+        if not records:
+            return
+        genre_ids = self._ensure_genres(name for record in records for name in record.get("genres", ()))
+        movies, genres = [], []
+        for record in _last_per_id(records, self._skip):
+            try:
+                values = _clean(Movie, record, ["id", *MOVIE_UPDATE_FIELDS], required=MOVIE_REQUIRED)
+            except ValidationError as exc:
+                self._skip(record, "; ".join(exc.messages))
+                continue
+            movies.append(Movie(**values))
+            genres.append(record.get("genres", ()))
+
+        with_id = [movie for movie in movies if movie.pk is not None]
+        Movie.objects.bulk_create(
+            with_id, update_conflicts=True, unique_fields=["id"], update_fields=MOVIE_UPDATE_FIELDS,
+        )
+        Movie.objects.bulk_create([movie for movie in movies if movie.pk is None])
+
+        through = Movie.genre.through
+        movie_ids = [movie.pk for movie in movies]
+        through.objects.filter(movie_id__in=movie_ids).delete()
+        through.objects.bulk_create(
+            [
+                through(movie_id=movie.pk, genre_id=genre_ids[name])
+                for movie, names in zip(movies, genres)
+                for name in dict.fromkeys(names)
+            ],
+            ignore_conflicts=True,
+        )
+        bump_movie_versions(movie_ids)
+        self.stats["movies"] += len(movies)
+
+    # ---- reviews ----
+
+    def _user_ids(self, usernames):
+        usernames = set(usernames)
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list("username", "pk"))
+        missing = usernames - user_ids.keys()
+        if missing and self.create_users:
+            # Imported reviewers get no usable password; they can reset it later
+            password = make_password(None)
+            created = User.objects.bulk_create([User(username=name, password=password) for name in sorted(missing)])
+            UserProfile.objects.bulk_create([UserProfile(user=user) for user in created])
+            user_ids.update((user.username, user.pk) for user in created)
+            self.stats["users"] += len(created)
+        return user_ids
+
+    def _write_reviews(self, records):
+        if not records:
+            return
+        cleaned = []
+        for record in _last_per_id(records, self._skip):
+            try:
+                values = _clean(
+                    Review, record, ["id", "rating", "comment", "created_at"],
+                    validate=["rating"], required=REVIEW_REQUIRED,
+                )
+                movie_id = int(record.get("movie"))
+            except (ValidationError, TypeError, ValueError) as exc:
+                messages = exc.messages if isinstance(exc, ValidationError) else [str(exc)]
+                self._skip(record, "; ".join(messages))
+                continue
+            cleaned.append((record, movie_id, values))
+
+        movie_ids = set(
+            Movie.objects.filter(pk__in={movie_id for _, movie_id, _ in cleaned}).values_list("pk", flat=True)
+        )
+        user_ids = self._user_ids(
+            record["user"] for record, movie_id, _ in cleaned if movie_id in movie_ids and record.get("user")
+        )
+        reviews, created_at = [], {}
+        for record, movie_id, values in cleaned:
+            if movie_id not in movie_ids:
+                self._skip(record, f"movie {movie_id} does not exist")
+                continue
+            if record.get("user") not in user_ids:
+                self._skip(record, f"user {record.get('user')!r} does not exist")
+                continue
+            review = Review(movie_id=movie_id, user_id=user_ids[record["user"]], **values)
+            if "created_at" in values:
+                created_at[id(review)] = values["created_at"]
+            reviews.append(review)
+
+        with_id = [review for review in reviews if review.pk is not None]
+        Review.objects.bulk_create(
+            with_id, update_conflicts=True, unique_fields=["id"], update_fields=REVIEW_UPDATE_FIELDS,
+        )
+        Review.objects.bulk_create([review for review in reviews if review.pk is None])
+
+        # auto_now_add overwrote the imported timestamps on insert; put them back
+        dated = [review for review in reviews if id(review) in created_at]
+        for review in dated:
+            review.created_at = created_at[id(review)]
+        Review.objects.bulk_update(dated, ["created_at"], batch_size=self.batch_size)
+
+        bump_movie_versions({review.movie_id for review in reviews})
+        self.stats["reviews"] += len(reviews)
+
+    # ---- after the last batch ----
+
+    def finish(self):
+        """One set-based pass over everything the per-row signals would have maintained."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Genre, Movie, Review, User]):
+                cursor.execute(sql)
+        rebuild_derived_data()
+
+
+def rebuild_derived_data():
+    """Recompute everything signals maintain row by row, after a bulk write that bypassed them."""
+    rebuild_ratings()
+    rebuild_search_index()
+    rebuild_analytics()
+    reconcile_counters()
+    invalidate_front_page()
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.checks import Error, Tags, Warning, register
+from django.db import DatabaseError, connections, router
+
+# Each process (or machine) gets its own copy with these, so invalidations,
+# OTPs and rate limits made in one are invisible to the others
+UNSHARED_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if settings.DEBUG or backend not in UNSHARED_CACHE_BACKENDS:
+        return []
+    return [Error(
+        f"The default cache ({backend}) is not shared between processes.",
+        hint="Set REDIS_URL, or use django.core.cache.backends.db.DatabaseCache.",
+        id="movies.E001",
+    )]
+
+
+@register(Tags.database)
+def cache_tables(app_configs, databases=None, **kwargs):
+    """DatabaseCache tables are made by `manage.py createcachetable`, not by a migration."""
+    if not databases:
+        return []
+    warnings = []
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if not isinstance(cache, DatabaseCache):
+            continue
+        database = router.db_for_read(cache.cache_model_class)
+        if database not in databases:
+            continue
+        try:
+            with connections[database].cursor() as cursor:
+                tables = connections[database].introspection.table_names(cursor)
+        except DatabaseError:
+            continue  # unreachable databases have checks of their own
+        if cache._table not in tables:
+            warnings.append(Warning(
+                f"The table {cache._table!r} of the {alias!r} cache does not exist.",
+                hint="Run `manage.py createcachetable`.",
+                id="movies.W002",
+            ))
+    return warnings
@@ -0,0 +1,69 @@
+"""
+ETag / Last-Modified functions for the public catalog pages, for use with
+django.views.decorators.http.condition.
+
+Validators come from the version stamps in versions.py, so answering a
+conditional request with 304 costs a cache read or two and no queries for
+anonymous visitors. The pages also render per-visitor bits (the CSRF token
+in base.html, the wishlist icons, the user menu), so those are folded into
+the ETag; Last-Modified is only offered to anonymous visitors, where the
+stamp alone describes the page.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils import timezone
+
+from .versions import get_catalog_version, get_movie_version, stamp_to_datetime
+from .wishlist import get_wishlist_ids
+
+
+def _has_pending_messages(request):
+    # A 304 would hide flash messages, so pages carrying them always render.
+    return bool(len(get_messages(request)))
+
+
+def _etag(request, *parts):
+    if _has_pending_messages(request):
+        return None
+    parts = [*parts, request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")]
+    if request.user.is_authenticated:
+        parts += [request.user.pk, sorted(get_wishlist_ids(request.user))]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def _last_modified(request, stamp):
+    if request.user.is_authenticated or _has_pending_messages(request):
+        return None
+    return stamp_to_datetime(stamp)
+
+
+def catalog_etag(request, *args, **kwargs):
+    return _etag(request, "catalog", get_catalog_version())
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _last_modified(request, get_catalog_version())
+
+
+def home_etag(request):
+    # The front page also changes at midnight, when the movie of the day does
+    return _etag(request, "home", get_catalog_version(), timezone.localdate().isoformat())
+
+
+def home_last_modified(request):
+    modified = _last_modified(request, get_catalog_version())
+    if modified is None:
+        return None
+    midnight = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+    return max(modified, midnight)
+
+
+def movie_etag(request, movie_id):
+    return _etag(request, "movie", movie_id, get_movie_version(movie_id))
+
+
+def movie_last_modified(request, movie_id):
+    return _last_modified(request, get_movie_version(movie_id))
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .wishlist import get_wishlist_ids
+
+
+def wishlist(request):
+    """Expose `wishlist_ids` to templates; nothing is loaded unless a template uses it."""
+    return {"wishlist_ids": SimpleLazyObject(lambda: get_wishlist_ids(request.user))}
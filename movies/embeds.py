@@ -0,0 +1,247 @@
+"""
+Video link -> embeddable player, for the "Play Online" page.
+
+Providers are registered by hostname. resolve() parses the link once,
+looks up the provider by the hostname and its parent domains (so
+"m.youtube.com" finds youtube.com but "notyoutube.com" does not), then
+runs the provider's precompiled patterns against the path and query.
+Every provider returns the same Embed shape. A link that fits nothing
+raises EmbedError with a message fit to show the user; no link, however
+odd, raises anything else.
+
+oEmbed lookups (Instagram, when a Graph API token is configured) never
+run on the request thread. A miss renders the public embed page and
+queues a background task. That task fetches through one pooled requests
+session with strict timeouts. Results, failures included, go into a
+bounded in-process LRU with a TTL and into the Django cache, which the
+next request (in whichever process) finds.
+"""
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+
+from .cache import TTLCache
+from .tasks import task
+
+SUPPORTED_HELP = (
+    "Unsupported or invalid video link. Supported platforms include YouTube, Vimeo, Dailymotion, Twitch, "
+    "Facebook, TikTok, Instagram, or direct video URLs (e.g., .mp4). Ensure you copy the link correctly: "
+    "For YouTube, click 'Share' > 'Copy Link'; for Instagram/TikTok, use the share option and copy the URL."
+)
+
+PLAYER_PARAMS = "autoplay=1&rel=0&modestbranding=1&controls=1&iv_load_policy=3"
+
+
+class EmbedError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Embed:
+    provider: str
+    kind: str  # "iframe" (src in url), "direct" (a <video> source) or "html" (oEmbed markup)
+    url: str = ""
+    html: str = ""
+    mime: str = ""
+
+
+# =================== REGISTRY ===================
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    hosts: tuple
+    # (compiled pattern searched in "path?query", builder(match, context) -> Embed)
+    rules: tuple
+    hint: str = ""
+
+    def resolve(self, target, context):
+        for pattern, build in self.rules:
+            match = pattern.search(target)
+            if match:
+                return build(match, context)
+        raise EmbedError(self.hint or SUPPORTED_HELP)
+
+
+PROVIDERS = {}
+
+
+def register(name, hosts, rules, hint=""):
+    provider = Provider(name, tuple(hosts), tuple((re.compile(p), build) for p, build in rules), hint)
+    for host in provider.hosts:
+        PROVIDERS[host] = provider
+    return provider
+
+
+def _iframe(provider, template):
+    return lambda match, context: Embed(provider, "iframe", template.format(*match.groups(), **context))
+
+
+register("youtube", ["youtube.com", "youtube-nocookie.com"], [
+    (r"^/(?:embed|shorts|live|v)/([\w-]{11})\b", _iframe("youtube", "https://www.youtube.com/embed/{0}?" + PLAYER_PARAMS)),
+    (r"[?&]v=([\w-]{11})\b", _iframe("youtube", "https://www.youtube.com/embed/{0}?" + PLAYER_PARAMS)),
+], hint="Could not extract a valid video ID from the YouTube link. Use 'Share' > 'Copy Link'.")
+register("youtube", ["youtu.be"], [
+    (r"^/([\w-]{11})\b", _iframe("youtube", "https://www.youtube.com/embed/{0}?" + PLAYER_PARAMS)),
+], hint="Could not extract a valid video ID from the YouTube link. Use 'Share' > 'Copy Link'.")
+register("vimeo", ["vimeo.com"], [
+    (r"^/(?:video/|channels/[\w-]+/|groups/[\w-]+/videos/)?(\d+)\b", _iframe("vimeo", "https://player.vimeo.com/video/{0}?autoplay=1")),
+])
+register("dailymotion", ["dailymotion.com"], [
+    (r"^/(?:embed/)?video/([a-zA-Z0-9]+)", _iframe("dailymotion", "https://www.dailymotion.com/embed/video/{0}?autoplay=1")),
+])
+register("dailymotion", ["dai.ly"], [
+    (r"^/([a-zA-Z0-9]+)", _iframe("dailymotion", "https://www.dailymotion.com/embed/video/{0}?autoplay=1")),
+])
+register("twitch", ["twitch.tv"], [
+    (r"^/videos/(\d+)", _iframe("twitch", "https://player.twitch.tv/?video=v{0}&parent={parent}")),
+    # A channel name, but not /videos/ with its id missing
+    (r"^/(?!videos/?(?:\?|$))([a-zA-Z0-9_]{3,25})/?(?:\?|$)", _iframe("twitch", "https://player.twitch.tv/?channel={0}&parent={parent}")),
+])
+register("facebook", ["facebook.com", "fb.watch"], [
+    (r"^/(?:video\.php|watch/?)\?(?:.*&)?v=(\d+)", _iframe("facebook", "https://www.facebook.com/video/embed?video_id={0}")),
+    (r"^/[\w.-]+/videos/(?:[\w.-]+/)?(\d+)", _iframe("facebook", "https://www.facebook.com/video/embed?video_id={0}")),
+])
+register("tiktok", ["tiktok.com"], [
+    (r"/video/(\d+)", _iframe("tiktok", "https://www.tiktok.com/embed/v2/{0}")),
+])
+
+
+INSTAGRAM_OEMBED = "https://graph.facebook.com/v20.0/instagram_oembed"
+
+
+def _instagram_params(url):
+    return {"url": url, "access_token": getattr(settings, "INSTAGRAM_OEMBED_TOKEN", "")}
+
+
+@task(max_attempts=1)
+def fetch_instagram_oembed(url):
+    oembed.fetch(INSTAGRAM_OEMBED, _instagram_params(url))
+
+
+def _instagram(match, context):
+    kind, post_id = match.groups()
+    if getattr(settings, "INSTAGRAM_OEMBED_TOKEN", ""):
+        url = f"https://www.instagram.com/{kind}/{post_id}/"
+        html = oembed.cached(INSTAGRAM_OEMBED, _instagram_params(url))
+        if html:
+            return Embed("instagram", "html", html=html)
+        if html is None:
+            fetch_instagram_oembed.enqueue(url=url, dedupe_key=f"oembed:{url}")
+    # Instagram's public embed page needs no token
+    return Embed("instagram", "iframe", f"https://www.instagram.com/{kind}/{post_id}/embed")
+
+
+register("instagram", ["instagram.com", "instagr.am"], [
+    (r"^/(reel|p|tv)/([\w-]+)", _instagram),
+])
+
+DIRECT_TYPES = {".mp4": "video/mp4", ".webm": "video/webm", ".ogg": "video/ogg", ".ogv": "video/ogg"}
+DIRECT_PATTERN = re.compile(r"(\.(?:mp4|webm|ogg|ogv))$", re.IGNORECASE)
+
+
+def _provider_for(hostname):
+    labels = hostname.split(".")
+    for start in range(len(labels) - 1):
+        provider = PROVIDERS.get(".".join(labels[start:]))
+        if provider:
+            return provider
+    return None
+
+
+def resolve(link, parent="localhost"):
+    """
+    The Embed for a pasted video link. `parent` is this site's hostname,
+    which Twitch requires in its player URL.
+    """
+    try:
+        parts = urlsplit(link.strip())
+        hostname = parts.hostname
+    except ValueError:
+        raise EmbedError(SUPPORTED_HELP)
+    if parts.scheme not in ("http", "https") or not hostname:
+        raise EmbedError(SUPPORTED_HELP)
+
+    provider = _provider_for(hostname)
+    if provider is not None:
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        return provider.resolve(target, {"parent": parent})
+
+    direct = DIRECT_PATTERN.search(parts.path)
+    if direct:
+        return Embed("direct", "direct", link.strip(), mime=DIRECT_TYPES[direct.group(1).lower()])
+    raise EmbedError(SUPPORTED_HELP)
+
+
+# =================== OEMBED ===================
+
+class OEmbedClient:
+    """
+    oEmbed HTML for a URL, or "" if the provider didn't give any. One
+    pooled session for the process; (connect, read) timeouts keep a slow
+    provider from holding a worker for long.
+    """
+
+    def __init__(self, timeout=(2, 3), pool_size=10, cache=None, ttl=3600, failure_ttl=60):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache = cache if cache is not None else TTLCache(ttl=ttl)
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    @staticmethod
+    def _key(endpoint, params):
+        # Hashed, so the access token in `params` never ends up in a cache key
+        digest = hashlib.sha1(f"{endpoint}?{urlencode(sorted(params.items()))}".encode()).hexdigest()
+        return f"movies:oembed:{digest}"
+
+    def cached(self, endpoint, params):
+        """The stored result ("" for a remembered failure), or None if it has to be fetched."""
+        key = self._key(endpoint, params)
+        html = self.cache.get(key)
+        if html is None:
+            html = shared_cache.get(key)
+            if html is not None:
+                self.cache.set(key, html)
+        return html
+
+    def fetch(self, endpoint, params):
+        cached = self.cached(endpoint, params)
+        if cached is not None:
+            return cached
+        key = self._key(endpoint, params)
+        try:
+            response = self.session.get(endpoint, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            html = response.json().get("html") or ""
+        except Exception:
+            html = ""
+        # Remember failures too, but not for as long, so an outage isn't retried on every request
+        ttl = self.ttl if html else self.failure_ttl
+        self.cache.set(key, html, ttl)
+        shared_cache.set(key, html, ttl)
+        return html
+
+
+oembed = OEmbedClient()
@@ -1,6 +1,9 @@
 from django import forms
 from .models import Review, UserProfile, Movie, Genre
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import UploadedFile
+
+from .posters import stash_upload, upload_poster
 
 # ==========================
 # Review Form
@@ -39,8 +42,7 @@ class CustomUserCreationForm(forms.ModelForm):
         user = super().save(commit=False)
         user.set_password(self.cleaned_data["password1"])  # securely hash password
         if commit:
-            user.save()
-            UserProfile.objects.get_or_create(user=user)  # create linked profile
+            user.save()  # the post_save signal creates the linked profile
         return user
 
 # ==========================
@@ -72,6 +74,17 @@ class AdminMovieForm(forms.ModelForm):
             "synopsis": forms.Textarea(attrs={"rows": 6, "class": "textarea"}),
         }
 
+    def save(self, commit=True):
+        poster = self.cleaned_data.get("poster")
+        if not commit or not isinstance(poster, UploadedFile):
+            return super().save(commit)
+        # Keep the current poster until the background upload to Cloudinary replaces it
+        self.instance.poster = self.initial.get("poster")
+        name = stash_upload(poster)
+        movie = super().save(commit)
+        upload_poster.enqueue(movie_id=movie.pk, name=name)
+        return movie
+
 # ==========================
 # Admin Genre Form
 # ==========================
@@ -0,0 +1,98 @@
+"""
+Front-page snapshot: the latest releases plus a movie of the day.
+
+The snapshot is built once and served from the cache under a per-day key, so
+anonymous home page hits need no queries at all. Signals in signals.py drop
+it when a movie it shows (or could show) changes; the date in the key takes
+care of the daily rollover.
+
+The movie of the day is chosen once, by the first build of the day, and kept
+under a key of its own that invalidation leaves alone. Rebuilds only redo the
+list, so new releases can't change the pick halfway through the day; only
+deleting the picked movie does.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cards import build_cards, card_queryset
+
+FRONT_PAGE_SIZE = 10
+FRONT_PAGE_TIMEOUT = 60 * 60 * 25
+
+
+def _cache_key(day):
+    return f"movies:frontpage:{day.isoformat()}"
+
+
+def _pick_key(day):
+    return f"movies:frontpage:pick:{day.isoformat()}"
+
+
+def pick_movie_of_the_day(movies, day):
+    """
+    Highest-random-weight pick keyed on the date: the same every time for a
+    given day and candidate set, and a newly added movie only changes the
+    pick if it wins outright.
+    """
+    if not movies:
+        return None
+    return max(movies, key=lambda movie: hashlib.sha256(f"{day.isoformat()}:{movie.id}".encode()).digest())
+
+
+def _card(movie_id, movies):
+    """The card of `movie_id`, from `movies` if it is there; None if the movie is gone."""
+    for movie in movies:
+        if movie.id == movie_id:
+            return movie
+    cards = build_cards(card_queryset().filter(pk=movie_id))
+    return cards[0] if cards else None
+
+
+def todays_pick(day, movies):
+    """The card of the day's pick, choosing it from `movies` if there is none yet (or it was deleted)."""
+    key = _pick_key(day)
+    for _ in range(2):
+        movie_id = cache.get(key)
+        if movie_id is not None:
+            card = _card(movie_id, movies)
+            if card is not None:
+                return card
+            cache.delete(key)
+        pick = pick_movie_of_the_day(movies, day)
+        # add(), so of two concurrent first builds only one pick is ever kept
+        if pick is None or cache.add(key, pick.id, FRONT_PAGE_TIMEOUT):
+            return pick
+    return pick
+
+
+def build_front_page(day):
+    movies = build_cards(card_queryset().order_by("-release_date", "-id")[:FRONT_PAGE_SIZE])
+    pick = todays_pick(day, movies)
+    return {
+        "movies": movies,
+        "movie_of_the_day": pick,
+        # Edits to the pick must reach the snapshot even once it has left the list
+        "movie_ids": frozenset(movie.id for movie in [*movies, *([pick] if pick else [])]),
+    }
+
+
+def get_front_page():
+    day = timezone.localdate()
+    key = _cache_key(day)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_front_page(day)
+        cache.set(key, snapshot, FRONT_PAGE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_front_page(movie_id=None):
+    """Drop today's snapshot; with `movie_id`, only if that movie is on it."""
+    key = _cache_key(timezone.localdate())
+    if movie_id is not None:
+        snapshot = cache.get(key)
+        if snapshot is None or movie_id not in snapshot["movie_ids"]:
+            return
+    cache.delete(key)
@@ -0,0 +1,164 @@
+"""
+Batched engine for maintenance commands.
+
+Commands describe the rows to look at (ideally a single anti-join or
+filtered query streamed with .iterator()), how to turn a row into a
+write, and how to write a batch. run_batched() does the chunking, one
+transaction per batch, --dry-run and timing.
+"""
+import time
+from dataclasses import dataclass
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import CharField, Exists, OuterRef, Q
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Cast
+
+from .models import Movie, UserProfile
+from .posters import save_references
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class BatchStats:
+    scanned: int = 0
+    changed: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self):
+        return self.scanned / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f"{self.changed} of {self.scanned} row(s) in {self.batches} batch(es), "
+            f"{self.seconds:.2f}s ({self.rate:.0f} rows/s)"
+        )
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run_batched(rows, transform, write, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, on_change=None):
+    """
+    Feed `rows` through `transform` (row -> value to write, or None to leave
+    the row alone) and hand each batch of values to `write`, one transaction
+    per batch. With `dry_run` nothing is written but the counts are the same.
+    """
+    stats = BatchStats()
+    started = time.perf_counter()
+    for batch in batches(rows, batch_size):
+        changes = [change for change in map(transform, batch) if change is not None]
+        stats.scanned += len(batch)
+        stats.changed += len(changes)
+        stats.batches += 1
+        if on_change:
+            for change in changes:
+                on_change(change)
+        if changes and not dry_run:
+            with transaction.atomic():
+                write(changes)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+# =================== USER PROFILES ===================
+
+def users_without_profile():
+    return User.objects.filter(~Exists(UserProfile.objects.filter(user=OuterRef("pk"))))
+
+
+def _insert_profiles(user_ids):
+    """
+    INSERT ... SELECT an empty profile for each of `user_ids` that still
+    lacks one. Building a model instance per row cost more than the insert
+    itself; every other profile column is nullable. A user who signs up
+    mid-run gets a profile from post_save that may land between the check
+    and the insert, so conflicts are ignored rather than failing the batch.
+    """
+    profile_table = UserProfile._meta.db_table
+    user_field = UserProfile._meta.get_field("user")
+    columns = [
+        field.column for field in UserProfile._meta.concrete_fields
+        if not field.primary_key and field.name != "user"
+    ]
+    nulls = "".join(", NULL" for _ in columns)
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    on_conflict = connection.ops.on_conflict_suffix_sql([user_field], OnConflict.IGNORE, None, None)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{insert} {profile_table} ({', '.join([user_field.column, *columns])}) "
+            f"SELECT u.id{nulls} FROM {User._meta.db_table} u "
+            f"WHERE u.id IN ({placeholders}) "
+            f"AND NOT EXISTS (SELECT 1 FROM {profile_table} p WHERE p.{user_field.column} = u.id) "
+            f"{on_conflict}",
+            list(user_ids),
+        )
+
+
+def backfill_profiles(batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Create the missing UserProfile rows: one anti-join read, one INSERT per chunk."""
+    user_ids = users_without_profile().order_by("pk").values_list("pk", flat=True)
+    return run_batched(
+        user_ids.iterator(chunk_size=batch_size),
+        lambda user_id: user_id,
+        _insert_profiles,
+        batch_size=batch_size,
+        dry_run=dry_run,
+    )
+
+
+# =================== POSTER PATHS ===================
+
+# Stored prefixes that fix_poster_name knows how to clean up
+CLOUD_NAME_PREFIX = "dwt5oh4jd/"
+MEDIA_PREFIX = "media/"
+
+
+def fix_poster_name(name):
+    """The corrected poster reference for `name`, or None if it is fine as it is."""
+    if name.startswith(CLOUD_NAME_PREFIX):
+        # Already on Cloudinary but stored with the cloud name in front
+        return "posters/" + name.split("posters/", 1)[-1]
+    if name.startswith(MEDIA_PREFIX):
+        return name.split(MEDIA_PREFIX, 1)[-1]
+    return None
+
+
+def fix_poster_paths(batch_size=DEFAULT_BATCH_SIZE, dry_run=False, on_change=None):
+    """
+    Rewrite badly prefixed poster references with chunked bulk_update.
+    `on_change` receives (movie id, title, old name, new name) for each fix.
+    """
+    rows = (
+        Movie.objects
+        .annotate(poster_name=Cast("poster", output_field=CharField()))
+        .filter(Q(poster_name__startswith=CLOUD_NAME_PREFIX) | Q(poster_name__startswith=MEDIA_PREFIX))
+        .order_by("pk")
+        .values_list("pk", "title", "poster_name")
+    )
+
+    def transform(row):
+        movie_id, title, name = row
+        fixed = fix_poster_name(name)
+        return None if fixed is None else (movie_id, title, name, fixed)
+
+    return run_batched(
+        rows.iterator(chunk_size=batch_size),
+        transform,
+        lambda changes: save_references({movie_id: fixed for movie_id, _, _, fixed in changes}),
+        batch_size=batch_size,
+        dry_run=dry_run,
+        on_change=on_change,
+    )
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and response time of the JSON API against the HTML pages it replaces"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20, help="Requests per endpoint (default 20)")
+
+    def handle(self, *args, **options):
+        movie_id = Movie.objects.order_by("-release_date", "-id").values_list("id", flat=True).first()
+        if movie_id is None:
+            raise CommandError("No movies to benchmark against")
+
+        pairs = [
+            ("movie list", reverse("movies:movie_list"), reverse("movies:api_movie_list")),
+            (
+                "movie detail",
+                reverse("movies:movie_detail", args=[movie_id]),
+                reverse("movies:api_movie_detail", args=[movie_id]),
+            ),
+        ]
+        client = Client()
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for label, html_url, api_url in pairs:
+                for kind, url in (("html", html_url), ("json", api_url)):
+                    size, timings = self._measure(client, url, options["runs"])
+                    self.stdout.write(
+                        f"{label:<13} {kind:<5} {size:>8} bytes  "
+                        f"median {statistics.median(timings):7.2f} ms  "
+                        f"max {max(timings):7.2f} ms"
+                    )
+
+    def _measure(self, client, url, runs):
+        timings = []
+        size = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} answered {response.status_code}")
+            size = len(response.content)
+        return size, timings
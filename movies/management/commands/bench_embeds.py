@@ -0,0 +1,68 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from movies.embeds import EmbedError, resolve
+
+SAMPLE_LINKS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "https://youtu.be/dQw4w9WgXcQ?si=abc",
+    "https://m.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ",
+    "https://vimeo.com/76979871",
+    "https://player.vimeo.com/video/76979871",
+    "https://www.dailymotion.com/video/x7tgad0",
+    "https://dai.ly/x7tgad0",
+    "https://www.twitch.tv/somechannel",
+    "https://www.twitch.tv/videos/123456789",
+    "https://www.facebook.com/video.php?v=10153231379946729",
+    "https://www.facebook.com/somepage/videos/10153231379946729/",
+    "https://www.tiktok.com/@someone/video/7012345678901234567",
+    "https://www.instagram.com/reel/Cabc123xyz/",
+    "https://cdn.example.com/clips/trailer.mp4",
+    "https://cdn.example.com/clips/trailer.WEBM?token=1",
+    # Links the old if/elif chain crashed on or mis-read
+    "https://www.youtube.com/watch",
+    "https://vimeo.com/",
+    "https://www.dailymotion.com/",
+    "https://www.tiktok.com/@someone",
+    "https://notyoutube.com/watch?v=dQw4w9WgXcQ",
+    "youtube.com/watch?v=dQw4w9WgXcQ",
+    "javascript:alert(1)",
+    "https://[::1",
+    "",
+]
+
+
+class Command(BaseCommand):
+    help = "Time resolving a large batch of mixed video links for the Play Online page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--links", type=int, default=10000, help="Links to resolve (default 10000)")
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        links = [rng.choice(SAMPLE_LINKS) for _ in range(options["links"])]
+
+        timings = []
+        resolved = rejected = 0
+        for _ in range(options["rounds"]):
+            resolved = rejected = 0
+            start = time.perf_counter()
+            for link in links:
+                try:
+                    resolve(link)
+                    resolved += 1
+                except EmbedError:
+                    rejected += 1
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        self.stdout.write(
+            f"{len(links)} links: {resolved} resolved, {rejected} rejected\n"
+            f"median {statistics.median(timings) * 1000:.1f} ms, best {best * 1000:.1f} ms "
+            f"({best / len(links) * 1e6:.2f} µs/link)"
+        )
@@ -0,0 +1,214 @@
+import json
+import platform
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from movies.cache import tiered
+from movies.cards import card_queryset
+from movies.models import Genre, Movie, Review, UserProfile
+from movies.pagination import KeysetPaginator
+from movies.profiling import percentile
+from movies.views import MOVIE_LIST_ORDERINGS
+
+# How many "Next" links the deep movie_list scenario follows
+DEEP_PAGES = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main pages through the test client and report latency percentiles, "
+        "query counts and response sizes; optionally save them and compare with a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=30, help="Timed requests per scenario (default 30)")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests first (default 3)")
+        parser.add_argument("--cold", action="store_true", help="Clear the caches before every request")
+        parser.add_argument("--only", action="append", metavar="SCENARIO", help="Run just these scenarios")
+        parser.add_argument("--output", metavar="JSON", help="Save the results here")
+        parser.add_argument("--baseline", metavar="JSON", help="Compare with results saved earlier")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            metavar="PERCENT",
+            help="With --baseline, fail if any p95 got this much slower or any query count went up",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read the baseline: {exc}")
+
+        # Keep the profiler's own writes out of the numbers
+        with override_settings(ALLOWED_HOSTS=["testserver"], PERF_SAMPLE_RATE=0, PERF_SLOW_MS=None):
+            scenarios = self._scenarios()
+            if options["only"]:
+                unknown = set(options["only"]) - {name for name, _, _ in scenarios}
+                if unknown:
+                    raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+                scenarios = [scenario for scenario in scenarios if scenario[0] in options["only"]]
+
+            results = {}
+            for name, url, user in scenarios:
+                results[name] = self._measure(url, user, options)
+                self._report(name, results[name], (baseline or {}).get("scenarios", {}).get(name))
+
+        report = {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "runs": options["runs"],
+                "cold": options["cold"],
+                "movies": Movie.objects.count(),
+                "reviews": Review.objects.count(),
+            },
+            "scenarios": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Saved to {options['output']}")
+
+        if baseline is not None and options["max_regression"] is not None:
+            regressions = self._regressions(results, baseline.get("scenarios", {}), options["max_regression"])
+            if regressions:
+                raise CommandError("Regressed: " + "; ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("✔ No regressions against the baseline"))
+
+    # ---- scenarios ----
+
+    def _scenarios(self):
+        """[(name, url, user to log in as or None)] for the data in this database."""
+        popular = Movie.objects.order_by("-rating_count", "-id").values_list("id", "title").first()
+        if popular is None:
+            raise CommandError("No movies to benchmark against; try `manage.py seed_synthetic` first")
+        tail = Movie.objects.order_by("rating_count", "id").values_list("id", flat=True).first()
+        list_url = reverse("movies:movie_list")
+
+        scenarios = [
+            ("home", reverse("movies:home"), None),
+            ("movie_list", list_url, None),
+            ("movie_list_deep", self._deep_page(list_url), None),
+            ("movie_detail_popular", reverse("movies:movie_detail", args=[popular[0]]), None),
+            ("movie_detail_tail", reverse("movies:movie_detail", args=[tail]), None),
+        ]
+        genre = Genre.objects.annotate(movies=Count("movie")).order_by("-movies").values_list("name", flat=True).first()
+        if genre:
+            scenarios.append(("movie_list_genre", f"{list_url}?{urlencode({'genre': genre})}", None))
+        word = popular[1].split()[0] if popular[1].split() else ""
+        if word:
+            scenarios.append(("movie_list_search", f"{list_url}?{urlencode({'search': word})}", None))
+
+        collector = (
+            UserProfile.objects.annotate(saved=Count("wishlist"))
+            .filter(saved__gt=0)
+            .order_by("-saved")
+            .values_list("user_id", flat=True)
+            .first()
+        )
+        if collector:
+            scenarios.append(("wishlist", reverse("movies:wishlist"), User.objects.get(pk=collector)))
+        staff = User.objects.filter(is_staff=True, is_active=True).order_by("pk").first()
+        if staff:
+            scenarios.append(("analytics", reverse("movies:admin_analytics"), staff))
+        else:
+            self.stdout.write(self.style.WARNING("⚠ No staff user, skipping analytics"))
+        return scenarios
+
+    def _deep_page(self, url):
+        # Walk the cursors the way "Next" links would, without rendering the pages
+        paginator = KeysetPaginator(card_queryset(), 12, MOVIE_LIST_ORDERINGS["newest"])
+        cursor = None
+        for _ in range(DEEP_PAGES):
+            page = paginator.get_page(cursor)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        return f"{url}?{urlencode({'cursor': cursor})}" if cursor else url
+
+    # ---- measuring ----
+
+    def _clear_caches(self):
+        cache.clear()
+        tiered.l1.clear()
+
+    def _measure(self, url, user, options):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        for _ in range(options["warmup"]):
+            client.get(url)
+
+        timings, queries = [], []
+        size = status = 0
+        for _ in range(options["runs"]):
+            if options["cold"]:
+                self._clear_caches()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            size, status = len(response.content), response.status_code
+        if status != 200:
+            raise CommandError(f"{url} answered {status}")
+
+        timings.sort()
+        return {
+            "url": url,
+            "p50": round(percentile(timings, 0.50), 2),
+            "p95": round(percentile(timings, 0.95), 2),
+            "p99": round(percentile(timings, 0.99), 2),
+            "mean": round(statistics.fmean(timings), 2),
+            "queries": max(queries),
+            "bytes": size,
+        }
+
+    # ---- reporting ----
+
+    def _report(self, name, result, previous):
+        line = (
+            f"{name:<22} p50 {result['p50']:8.2f} ms  p95 {result['p95']:8.2f} ms  p99 {result['p99']:8.2f} ms  "
+            f"{result['queries']:>3} queries  {result['bytes']:>8} bytes"
+        )
+        if previous:
+            line += (
+                f"  | p95 {self._change(result['p95'], previous['p95'])}, "
+                f"queries {result['queries'] - previous['queries']:+d}"
+            )
+        self.stdout.write(line)
+
+    @staticmethod
+    def _change(current, previous):
+        if not previous:
+            return "n/a"
+        return f"{(current - previous) / previous:+.0%}"
+
+    @staticmethod
+    def _regressions(results, baseline, max_regression):
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            if previous["p95"] and (result["p95"] - previous["p95"]) / previous["p95"] * 100 > max_regression:
+                regressions.append(f"{name} p95 {previous['p95']} -> {result['p95']} ms")
+            if result["queries"] > previous["queries"]:
+                regressions.append(f"{name} queries {previous['queries']} -> {result['queries']}")
+        return regressions
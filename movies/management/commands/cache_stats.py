@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from movies.cache import STAT_NAMES, tiered
+
+
+class Command(BaseCommand):
+    help = "Show the tiered cache's hit/miss counters, summed over every process"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters afterwards")
+
+    def handle(self, *args, **options):
+        stats = tiered.shared_stats()
+        for name in STAT_NAMES:
+            self.stdout.write(f"{name:<12} {stats[name]:>10}")
+        self.stdout.write(f"{'hit_rate':<12} {stats['hit_rate']:>10.1%}")
+
+        if options["reset"]:
+            tiered.reset_stats()
+            self.stdout.write(self.style.SUCCESS("✔ Counters reset"))
@@ -1,13 +1,17 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from movies.models import UserProfile
+from movies.maintenance import DEFAULT_BATCH_SIZE, backfill_profiles
+
 
 class Command(BaseCommand):
-    help = 'Create UserProfile for all existing users'
+    help = 'Create UserProfile for all existing users that lack one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the users missing a profile")
 
     def handle(self, *args, **options):
-        for user in User.objects.all():
-            UserProfile.objects.get_or_create(user=user)
-            self.stdout.write(
-                self.style.SUCCESS(f'Created profile for {user.username}')
-            )
\ No newline at end of file
+        stats = backfill_profiles(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{stats.changed} user(s) have no profile ({stats.summary()})'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Created {stats.changed} profile(s): {stats.summary()}'))
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from movies.catalog import FORMATS, TYPES, export_records, write_csv, write_ndjson
+
+
+class Command(BaseCommand):
+    help = "Stream genres, movies and reviews out as NDJSON (all types) or CSV (one type per file)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="ndjson")
+        parser.add_argument(
+            "--type",
+            choices=TYPES,
+            action="append",
+            dest="types",
+            help="Record type to export; repeat for several (NDJSON only). Default: all",
+        )
+        parser.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+
+    def handle(self, *args, **options):
+        types = options["types"] or list(TYPES)
+        if options["format"] == "csv" and len(types) != 1:
+            raise CommandError("CSV export needs exactly one --type")
+
+        stream = sys.stdout if options["output"] == "-" else open(options["output"], "w", encoding="utf-8", newline="")
+        try:
+            records = export_records(types)
+            if options["format"] == "csv":
+                count = write_csv(records, stream, types[0])
+            else:
+                count = write_ndjson(records, stream)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if options["output"] != "-":
+            self.stdout.write(self.style.SUCCESS(f"✔ Exported {count} record(s) to {options['output']}"))
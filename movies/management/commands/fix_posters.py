@@ -1,40 +1,27 @@
 from django.core.management.base import BaseCommand
-from movies.models import Movie
+from movies.maintenance import DEFAULT_BATCH_SIZE, fix_poster_paths
 
 class Command(BaseCommand):
     help = "Fix Movie.poster paths so they point correctly to Cloudinary"
 
-    def handle(self, *args, **options):
-        fixed_count = 0
-        for movie in Movie.objects.all():
-            if movie.poster:
-                poster_str = str(movie.poster)
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Report the fixes without saving them")
 
-                # Case 1: Already Cloudinary but stored with dwt5oh4jd/ prefix
-                if poster_str.startswith("dwt5oh4jd/"):
-                    cleaned = poster_str.split("posters/", 1)[-1]
-                    movie.poster.name = f"posters/{cleaned}"
-                    movie.save()
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"✅ Fixed (prefix): {movie.title} -> {movie.poster.name}"
-                        )
-                    )
-                    fixed_count += 1
+    def handle(self, *args, **options):
+        def report(change):
+            movie_id, title, old, new = change
+            self.stdout.write(self.style.SUCCESS(f"✅ Fixed: {title} {old} -> {new}"))
 
-                # Case 2: Stored with /media/ prefix
-                elif poster_str.startswith("media/"):
-                    cleaned = poster_str.split("media/", 1)[-1]
-                    movie.poster.name = cleaned
-                    movie.save()
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"✅ Fixed (media path): {movie.title} -> {movie.poster.name}"
-                        )
-                    )
-                    fixed_count += 1
+        stats = fix_poster_paths(
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            on_change=report if options["verbosity"] > 1 else None,
+        )
 
-        if fixed_count == 0:
+        if stats.changed == 0:
             self.stdout.write(self.style.WARNING("⚠️ No poster paths needed fixing"))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Would fix {stats.changed} poster(s): {stats.summary()}"))
         else:
-            self.stdout.write(self.style.SUCCESS(f"🎉 Fixed {fixed_count} poster(s)!"))
+            self.stdout.write(self.style.SUCCESS(f"🎉 Fixed {stats.changed} poster(s)! {stats.summary()}"))
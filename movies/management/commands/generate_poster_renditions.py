@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movies.renditions import warm_renditions
+
+
+class Command(BaseCommand):
+    help = "Pre-compute every poster's responsive renditions so the first page views don't have to"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        warmed, empty = warm_renditions(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Renditions ready for {warmed - empty} of {warmed} poster(s) "
+            f"({settings.POSTER_RENDITIONS_BACKEND} backend)"
+        ))
+        if empty:
+            self.stdout.write(self.style.WARNING(f"⚠ {empty} poster(s) have no renditions (missing or unreadable file)"))
@@ -1,29 +1,57 @@
-from django.core.management.base import BaseCommand
-from movies.models import Movie
-import cloudinary.uploader
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
 import os
 
+from movies.posters import PosterMigration, local_poster_jobs
+
+
 class Command(BaseCommand):
-    help = "Migrate existing movie posters to Cloudinary"
-
-    def handle(self, *args, **kwargs):
-        for movie in Movie.objects.all():
-            poster_path = str(movie.poster)
-            if poster_path and not poster_path.startswith("http"):
-                local_path = os.path.join("media", poster_path)
-                if os.path.exists(local_path):
-                    self.stdout.write(f"Uploading {local_path}...")
-                    result = cloudinary.uploader.upload(
-                        local_path,
-                        folder="webzmovies/posters/",
-                        overwrite=True
-                    )
-                    movie.poster = result["secure_url"]
-                    movie.save()
-                    self.stdout.write(self.style.SUCCESS(
-                        f"✔ Uploaded {movie.title} to Cloudinary"
-                    ))
-                else:
-                    self.stdout.write(self.style.WARNING(
-                        f"⚠ File not found: {local_path}"
-                    ))
+    help = "Migrate existing movie posters to Cloudinary (concurrent, resumable)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent uploads (default 8)")
+        parser.add_argument("--batch-size", type=int, default=100, help="Poster references saved per UPDATE batch")
+        parser.add_argument("--retries", type=int, default=4, help="Retries per poster, with exponential backoff")
+        parser.add_argument(
+            "--checkpoint",
+            default="poster_migration.ckpt",
+            help="File recording finished uploads so a rerun resumes instead of starting over",
+        )
+        parser.add_argument(
+            "--storage",
+            default="movies.posters.CloudinaryPosterStorage",
+            help="Dotted path of the storage backend, e.g. movies.posters.LocalPosterStorage",
+        )
+        parser.add_argument("--target", help="Backend target: Cloudinary folder or local directory")
+        parser.add_argument("--media-root", default=settings.MEDIA_ROOT, help="Where the local poster files live")
+
+    def handle(self, *args, **options):
+        try:
+            storage = import_string(options["storage"])(options["target"])
+        except (ImportError, ValueError) as exc:
+            raise CommandError(f"Can't set up storage {options['storage']}: {exc}")
+
+        jobs, missing = local_poster_jobs(options["media_root"])
+        for job in missing:
+            self.stdout.write(self.style.WARNING(f"⚠ File not found: {job.path}"))
+        self.stdout.write(f"Uploading {len(jobs)} poster(s) with {options['workers']} worker(s)...")
+
+        migration = PosterMigration(
+            storage,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            checkpoint=options["checkpoint"],
+            retries=options["retries"],
+        )
+        updated = migration.run(jobs, progress=self.stdout.write)
+
+        for job, exc in migration.failed:
+            self.stdout.write(self.style.ERROR(f"✘ {job.title} ({job.path}): {exc}"))
+        if migration.resumed:
+            self.stdout.write(f"Recovered {migration.resumed} upload(s) from the checkpoint")
+        if migration.failed:
+            raise CommandError(f"{len(migration.failed)} poster(s) failed; rerun to retry them")
+        if os.path.exists(options["checkpoint"]):
+            os.remove(options["checkpoint"])
+        self.stdout.write(self.style.SUCCESS(f"✔ Moved {updated} poster(s) to {options['storage'].rsplit('.', 1)[-1]}"))
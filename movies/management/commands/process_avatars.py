@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from movies.avatars import AvatarUnreadable, pending_avatars, process_avatar
+
+
+class Command(BaseCommand):
+    help = "Resize, strip and re-encode every avatar that was uploaded before avatar processing existed"
+
+    def handle(self, *args, **options):
+        processed = unreadable = replaced = 0
+        for profile_id, name in pending_avatars():
+            try:
+                result = process_avatar(profile_id, name)
+            except AvatarUnreadable as exc:
+                unreadable += 1
+                self.stdout.write(self.style.WARNING(f"⚠ {name}: could not be decoded ({exc.__cause__}), original kept"))
+                continue
+            if result:
+                processed += 1
+            else:
+                replaced += 1
+                self.stdout.write(self.style.WARNING(f"⚠ {name}: replaced by a newer upload, left alone"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Processed {processed} avatar(s); {unreadable} unreadable and kept, {replaced} replaced"
+        ))
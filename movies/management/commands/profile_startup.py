@@ -0,0 +1,119 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: everything a gunicorn worker does before it can
+# answer its first request (the URLconf is only imported by that request, but
+# management commands import it for their system checks), timed by phase
+STARTUP_SCRIPT = """
+import json, sys, time
+marks = [("start", time.perf_counter())]
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+marks.append(("settings", time.perf_counter()))
+django.setup()
+marks.append(("apps", time.perf_counter()))
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+marks.append(("middleware", time.perf_counter()))
+from django.urls import get_resolver
+get_resolver().url_patterns
+marks.append(("urls", time.perf_counter()))
+phases = {name: (t - marks[i][1]) * 1000 for i, (name, t) in enumerate(marks[1:])}
+print(json.dumps({"phases": phases, "modules": sorted(sys.modules)}))
+"""
+
+# Only needed on first use; loading any of them at boot is a regression
+LAZY_MODULES = ("PIL", "cProfile", "pstats", "cloudinary.api")
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a cold start (interpreter, settings, apps, middleware, URLconf) in a fresh process, "
+        "show which modules the import time goes to, and check it against STARTUP_BUDGET_MS"
+    )
+    # The point is to measure the checks' imports in the child, not pay them here too
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Cold starts to time (default 5)")
+        parser.add_argument("--top", type=int, default=15, help="Rows in each table (default 15)")
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            default=getattr(settings, "STARTUP_BUDGET_MS", None),
+            help="Fail if the median cold start takes longer (default STARTUP_BUDGET_MS; 0 to skip)",
+        )
+
+    def handle(self, *args, **options):
+        starts = [self._start() for _ in range(max(1, options["runs"]))]
+        wall = statistics.median(start["wall_ms"] for start in starts)
+        median = min(starts, key=lambda start: abs(start["wall_ms"] - wall))
+
+        self.stdout.write(f"Cold start, median of {len(starts)}: {wall:.0f} ms")
+        self.stdout.write(f"  {'interpreter':<12} {wall - sum(median['phases'].values()):8.1f} ms")
+        for name, ms in median["phases"].items():
+            self.stdout.write(f"  {name:<12} {ms:8.1f} ms")
+
+        # One more start under -X importtime, which slows imports down too much to time the others
+        imports = self._parse_importtime(self._start(importtime=True)["stderr"])
+        top = options["top"]
+
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _ in imports:
+            package = packages[name.split(".")[0]]
+            package[0] += self_us
+            package[1] += 1
+        self.stdout.write("\nImport time by top-level package (self time of all its modules):")
+        for name, (self_us, count) in sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            self.stdout.write(f"  {name:<40} {self_us / 1000:8.1f} ms  {count:>4} modules")
+
+        # Django's own and the standard library's imports are the floor; the rest is what can be made lazy
+        ours = [row for row in imports if row[0].split(".")[0] not in sys.stdlib_module_names | {"django"}]
+        self.stdout.write("\nSlowest imports outside Django and the standard library (cumulative):")
+        for name, self_us, cumulative_us in sorted(ours, key=lambda row: row[2], reverse=True)[:top]:
+            self.stdout.write(f"  {name:<60} {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:.1f})")
+
+        failures = []
+        eager = [name for name in LAZY_MODULES if name in median["modules"]]
+        if eager:
+            failures.append(f"loaded at startup: {', '.join(eager)}")
+        budget = options["budget_ms"]
+        if budget and wall > budget:
+            failures.append(f"cold start {wall:.0f} ms is over the {budget:.0f} ms budget")
+        if failures:
+            raise CommandError("; ".join(failures))
+        if budget:
+            self.stdout.write(self.style.SUCCESS(f"\n✔ Within the {budget:.0f} ms budget"))
+
+    def _start(self, importtime=False):
+        command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", STARTUP_SCRIPT]
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        started = time.perf_counter()
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            raise CommandError(f"The startup script failed:\n{result.stderr}")
+        # The script's report is the last line; anything printed while starting up comes before it
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        return {"wall_ms": wall_ms, "stderr": result.stderr, **report}
+
+    @staticmethod
+    def _parse_importtime(stderr):
+        """[(module, self µs, cumulative µs)] from -X importtime output."""
+        rows = []
+        for line in stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            if self_us.isdigit():  # skips the header line
+                rows.append((name, int(self_us), int(cumulative_us)))
+        return rows
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from movies.analytics import rebuild_analytics
+
+
+class Command(BaseCommand):
+    help = "Backfill the analytics rollup tables from the review, movie and genre tables"
+
+    def handle(self, *args, **options):
+        counts = rebuild_analytics()
+        for name, count in counts.items():
+            self.stdout.write(f"  {name}: {count} row(s)")
+        self.stdout.write(self.style.SUCCESS("✔ Analytics rollups rebuilt"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from movies.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every movie's rating aggregates from the reviews with a single GROUP BY"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report movies whose stored aggregates have drifted; exit non-zero if any have",
+        )
+
+    def handle(self, *args, **options):
+        checked, drifted = rebuild_ratings(apply=not options["check"])
+
+        for movie in drifted[:20]:
+            self.stdout.write(self.style.WARNING(
+                f"⚠ {movie.title}: {movie.rating_count} review(s), average {movie.average_rating:.2f}"
+            ))
+        if len(drifted) > 20:
+            self.stdout.write(self.style.WARNING(f"⚠ ...and {len(drifted) - 20} more"))
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{len(drifted)} of {checked} movie(s) have drifted rating aggregates")
+            self.stdout.write(self.style.SUCCESS(f"✔ All {checked} movie(s) are consistent"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✔ Checked {checked} movie(s), fixed {len(drifted)}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from movies.search import rebuild_search_index, search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text movie search index from the movie and genre tables"
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if not backend:
+            self.stdout.write(self.style.WARNING("⚠ This database has no full-text backend; search uses icontains"))
+            return
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"✔ Indexed {count} movie(s) ({backend})"))
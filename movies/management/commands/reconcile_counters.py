@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from movies.counters import reconcile_counters
+from movies.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recount the dashboard counters and per-movie review counts from the raw tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report drifted counters; exit non-zero if any have drifted",
+        )
+
+    def handle(self, *args, **options):
+        apply = not options["check"]
+        drifted = reconcile_counters(apply=apply)
+        checked, movies = rebuild_ratings(apply=apply)
+
+        for name, (stored, actual) in drifted.items():
+            self.stdout.write(self.style.WARNING(f"⚠ {name}: stored {stored}, actual {actual}"))
+        for movie in movies[:20]:
+            self.stdout.write(self.style.WARNING(f"⚠ {movie.title}: {movie.rating_count} review(s)"))
+        if len(movies) > 20:
+            self.stdout.write(self.style.WARNING(f"⚠ ...and {len(movies) - 20} more movie(s)"))
+
+        if options["check"]:
+            if drifted or movies:
+                raise CommandError(f"{len(drifted)} counter(s) and {len(movies)} movie(s) have drifted")
+            self.stdout.write(self.style.SUCCESS(f"✔ Counters and all {checked} movie(s) are consistent"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Fixed {len(drifted)} counter(s) and {len(movies)} of {checked} movie(s)"
+            ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from movies.models import Task
+from movies.tasks import STALE_AFTER, claim_next, execute, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks until stopped (or, with --once, until the queue is empty)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        last_sweep = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_sweep > 60:
+                    last_sweep = time.monotonic()
+                    stale = requeue_stale(STALE_AFTER)
+                    if stale:
+                        self.stdout.write(self.style.WARNING(f"⚠ Re-queued {stale} task(s) left running by a dead worker"))
+
+                queued = claim_next()
+                if queued is None:
+                    if options["once"]:
+                        break
+                    close_old_connections()
+                    time.sleep(options["sleep"])
+                    continue
+
+                status = execute(queued)
+                if status == Task.DONE:
+                    done += 1
+                elif status == Task.FAILED:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"✖ {queued.name} #{queued.pk} failed for good"))
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{queued.name} #{queued.pk}: {status}")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"✔ {done} task(s) done, {failed} failed"))
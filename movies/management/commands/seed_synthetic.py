@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from movies.synthetic import SyntheticCatalog
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a large, Zipf-skewed synthetic catalog for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--movies", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--reviews", type=int, default=5_000_000)
+        parser.add_argument("--wishlists", type=int, default=2_000_000, help="Wishlist adds (duplicates are dropped)")
+        parser.add_argument("--exponent", type=float, default=1.1, help="Zipf exponent for popularity and activity")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--force", action="store_true", help="Run even with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("Refusing to add synthetic data with DEBUG off; pass --force if this really isn't production")
+
+        catalog = SyntheticCatalog(
+            movies=options["movies"],
+            users=options["users"],
+            reviews=options["reviews"],
+            wishlists=options["wishlists"],
+            exponent=options["exponent"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        start = time.perf_counter()
+        catalog.generate(progress=lambda message: self.stdout.write(f"  {message}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Added {options['movies']} movie(s), {options['users']} user(s) and "
+            f"{options['reviews']} review(s) in {time.perf_counter() - start:.0f}s"
+        ))
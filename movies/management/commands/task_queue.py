@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+from movies.models import Task
+
+
+class Command(BaseCommand):
+    help = "Show the background task queue; optionally retry failed tasks or purge finished ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", help="Only tasks with this name")
+        parser.add_argument("--failures", type=int, default=10, help="How many recent failures to show")
+        parser.add_argument("--retry-failed", action="store_true", help="Queue every failed task again")
+        parser.add_argument("--purge", type=int, metavar="DAYS", help="Delete done/failed tasks older than DAYS")
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.all()
+        if options["name"]:
+            tasks = tasks.filter(name=options["name"])
+
+        if options["retry_failed"]:
+            # Oldest first, skipping any whose dedupe key already has a queued task
+            retried = 0
+            for task in tasks.filter(status=Task.FAILED).order_by("pk"):
+                if task.dedupe_key and Task.objects.filter(dedupe_key=task.dedupe_key, status=Task.QUEUED).exists():
+                    continue
+                task.status, task.attempts, task.run_after, task.finished_at = Task.QUEUED, 0, timezone.now(), None
+                task.save(update_fields=["status", "attempts", "run_after", "finished_at"])
+                retried += 1
+            self.stdout.write(self.style.SUCCESS(f"✔ Re-queued {retried} failed task(s)"))
+
+        if options["purge"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["purge"])
+            deleted, _ = tasks.filter(status__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff).delete()
+            self.stdout.write(self.style.SUCCESS(f"✔ Purged {deleted} finished task(s)"))
+
+        rows = tasks.values("name", "status").annotate(count=Count("id")).order_by("name", "status")
+        if not rows:
+            self.stdout.write("The queue is empty")
+            return
+        for row in rows:
+            self.stdout.write(f"{row['name']:<45} {row['status']:<8} {row['count']:>7}")
+
+        waiting = tasks.filter(status=Task.QUEUED, run_after__lte=timezone.now()).aggregate(oldest=Min("run_after"))
+        if waiting["oldest"]:
+            age = (timezone.now() - waiting["oldest"]).total_seconds()
+            self.stdout.write(f"Oldest due task has waited {age:.0f}s")
+
+        for task in tasks.filter(status=Task.FAILED).order_by("-finished_at")[:options["failures"]]:
+            last_line = task.last_error.strip().splitlines()[-1] if task.last_error.strip() else ""
+            self.stdout.write(self.style.ERROR(
+                f"✖ {task.name} #{task.pk} after {task.attempts} attempt(s) at {task.finished_at:%Y-%m-%d %H:%M}: {last_line}"
+            ))
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Frozen copies of the DDL and backfill in movies/search.py as of this
+# migration, so later changes there can't change what it does
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_movie_search "
+    "USING fts5(title, genres, synopsis, tokenize = 'unicode61 remove_diacritics 2')",
+    "DELETE FROM movies_movie_search",
+    "INSERT INTO movies_movie_search (rowid, title, genres, synopsis) "
+    "SELECT m.id, m.title, coalesce((SELECT group_concat(g.name, ' ') FROM movies_movie_genre mg "
+    "JOIN movies_genre g ON g.id = mg.genre_id WHERE mg.movie_id = m.id), ''), m.synopsis "
+    "FROM movies_movie m",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE IF NOT EXISTS movies_movie_search ("
+    "movie_id bigint PRIMARY KEY REFERENCES movies_movie (id) ON DELETE CASCADE, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS movies_movie_search_document_gin ON movies_movie_search USING GIN (document)",
+    "DELETE FROM movies_movie_search",
+    "INSERT INTO movies_movie_search (movie_id, document) "
+    "SELECT m.id, "
+    "setweight(to_tsvector('simple', m.title), 'A') || "
+    "setweight(to_tsvector('simple', coalesce((SELECT string_agg(g.name, ' ') FROM movies_movie_genre mg "
+    "JOIN movies_genre g ON g.id = mg.genre_id WHERE mg.movie_id = m.id), '')), 'B') || "
+    "setweight(to_tsvector('simple', m.synopsis), 'C') "
+    "FROM movies_movie m",
+]
+
+FORWARD = {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}
+
+
+def create_index(apps, schema_editor):
+    # Other backends have no index; search falls back to icontains there
+    for statement in FORWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in FORWARD:
+        schema_editor.execute("DROP TABLE IF EXISTS movies_movie_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_movie_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
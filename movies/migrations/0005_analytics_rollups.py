@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Review = apps.get_model('movies', 'Review')
+    Genre = apps.get_model('movies', 'Genre')
+    DailyReviewStat = apps.get_model('movies', 'DailyReviewStat')
+    GenreMovieStat = apps.get_model('movies', 'GenreMovieStat')
+    UserReviewStat = apps.get_model('movies', 'UserReviewStat')
+
+    daily = (
+        Review.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(review_count=Count('id'), rating_sum=Sum('rating'))
+    )
+    DailyReviewStat.objects.bulk_create(
+        [DailyReviewStat(date=row['day'], review_count=row['review_count'], rating_sum=row['rating_sum'])
+         for row in daily]
+    )
+    GenreMovieStat.objects.bulk_create(
+        [GenreMovieStat(genre_id=genre_id, movie_count=count)
+         for genre_id, count in Genre.objects.annotate(movie_count=Count('movie')).values_list('id', 'movie_count')]
+    )
+    UserReviewStat.objects.bulk_create(
+        [UserReviewStat(user_id=row['user_id'], review_count=row['review_count'])
+         for row in Review.objects.order_by().values('user_id').annotate(review_count=Count('id'))]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('movies', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReviewStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenreMovieStat',
+            fields=[
+                ('genre', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='movie_stat', serialize=False, to='movies.genre')),
+                ('movie_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserReviewStat',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_stat', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['review_count'], name='user_review_count_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
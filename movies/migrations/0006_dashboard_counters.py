@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:04
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_counters(apps, schema_editor):
+    Counter = apps.get_model('movies', 'Counter')
+    Movie = apps.get_model('movies', 'Movie')
+    Genre = apps.get_model('movies', 'Genre')
+    Review = apps.get_model('movies', 'Review')
+    User = apps.get_model('auth', 'User')
+    values = {
+        'movies': Movie.objects.count(),
+        'genres': Genre.objects.count(),
+        'reviews': Review.objects.count(),
+        'users': User.objects.count(),
+        'rating_sum': Review.objects.aggregate(total=Sum('rating'))['total'] or 0,
+    }
+    Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('movies', '0005_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['rating_count', 'release_date'], name='movie_review_count_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_background_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('view_name', models.CharField(max_length=200)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('sampled', models.BooleanField(default=False)),
+                ('duration_ms', models.FloatField()),
+                ('sql_ms', models.FloatField(default=0)),
+                ('sql_count', models.PositiveIntegerField(default=0)),
+                ('template_ms', models.FloatField(default=0)),
+                ('queries', models.JSONField(blank=True, default=list)),
+                ('profile', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['view_name', 'created_at'], name='reqprofile_view_created_idx'), models.Index(fields=['-duration_ms'], name='reqprofile_duration_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_request_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestprofile',
+            name='call_sites',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save
@@ -17,6 +19,18 @@ class Genre(models.Model):
         return self.name
 
 
+# Per-star histogram columns on Movie, keyed by the star value they count.
+RATING_HISTOGRAM_FIELDS = {
+    1: "rating_1",
+    2: "rating_2",
+    3: "rating_3",
+    4: "rating_4",
+    5: "rating_5",
+}
+# Only ever written by apply_rating_change(), update_average_rating() and rebuild_ratings()
+RATING_AGGREGATE_FIELDS = ("average_rating", "rating_sum", "rating_count", *RATING_HISTOGRAM_FIELDS.values())
+
+
 class Movie(models.Model):
     title = models.CharField(max_length=200)
     genre = models.ManyToManyField(Genre)
@@ -24,17 +38,86 @@ class Movie(models.Model):
     synopsis = models.TextField()
     poster = CloudinaryField("poster", folder="webzmovies/posters/")
     telegram_link = models.URLField()
-    average_rating = models.FloatField(default=0)
+    average_rating = models.FloatField(default=0)  # Derived: rating_sum / rating_count
     trailer_url = models.URLField(blank=True, null=True)  # NEW: Trailer addition - YouTube URL for the trailer
 
+    # Running rating aggregates, shifted in SQL by every review write
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def apply_rating_change(cls, movie_id, added=None, removed=None):
+        """
+        Shift the stored aggregates of one movie by a single review write.
+
+        `added` is the rating that now counts, `removed` the one that no longer
+        does (both set for an edit). Everything, including average_rating, is
+        computed from the current row inside one UPDATE, so concurrent reviews
+        never overwrite each other.
+        """
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+
+        histogram = {}
+        if added is not None:
+            histogram[added] = histogram.get(added, 0) + 1
+        if removed is not None:
+            histogram[removed] = histogram.get(removed, 0) - 1
+        updates = {
+            RATING_HISTOGRAM_FIELDS[star]: F(RATING_HISTOGRAM_FIELDS[star]) + delta
+            for star, delta in histogram.items() if delta
+        }
+        if not updates and not count_delta:
+            return
+
+        updates["rating_sum"] = F("rating_sum") + sum_delta
+        updates["rating_count"] = F("rating_count") + count_delta
+        updates["average_rating"] = Case(
+            When(Q(rating_count__lte=-count_delta), then=Value(0.0)),
+            default=Cast(F("rating_sum") + sum_delta, FloatField()) / (F("rating_count") + count_delta),
+            output_field=FloatField(),
+        )
+        cls.objects.filter(pk=movie_id).update(**updates)
+
+    @property
+    def rating_histogram(self):
+        """(stars, count) pairs from five stars down, for the detail page."""
+        return [(star, getattr(self, RATING_HISTOGRAM_FIELDS[star])) for star in range(5, 0, -1)]
+
     def update_average_rating(self):
-        reviews = self.review_set.all()
-        if reviews:
-            total = sum([review.rating for review in reviews])
-            self.average_rating = total / len(reviews)
-        else:
-            self.average_rating = 0
-        self.save()
+        """Recompute this movie's aggregates from its reviews with one query."""
+        from .ratings import aggregate_ratings
+
+        stats = aggregate_ratings(Review.objects.filter(movie=self)).get(self.pk, {})
+        for field in ("rating_sum", "rating_count", *RATING_HISTOGRAM_FIELDS.values()):
+            setattr(self, field, stats.get(field, 0))
+        self.average_rating = self.rating_sum / self.rating_count if self.rating_count else 0
+        self.save(update_fields=RATING_AGGREGATE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # An instance loaded before a review was written holds stale aggregates;
+        # a plain save of an existing row must not put them back
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in RATING_AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        # Composite (sort key, id) indexes back the keyset-paginated listings
+        indexes = [
+            models.Index(fields=["release_date", "id"], name="movie_release_id_idx"),
+            models.Index(fields=["average_rating", "id"], name="movie_rating_id_idx"),
+            models.Index(fields=["title", "id"], name="movie_title_id_idx"),
+            models.Index(fields=["rating_count", "release_date"], name="movie_review_count_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -48,12 +131,34 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.movie.update_average_rating()
+        # Deletes are handled by the post_delete receiver in signals.py so that
+        # cascades and queryset deletes keep the aggregates in step as well.
+        with transaction.atomic():
+            if self._state.adding:
+                previous = None
+            else:
+                previous = (
+                    Review.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("movie_id", "rating")
+                    .first()
+                )
+            # (movie_id, rating) before this save, for the post_save receivers
+            self._previous_rating = previous
+            super().save(*args, **kwargs)
 
-    def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        self.movie.update_average_rating()
+            if previous is None:
+                Movie.apply_rating_change(self.movie_id, added=self.rating)
+            elif previous[0] != self.movie_id:
+                Movie.apply_rating_change(previous[0], removed=previous[1])
+                Movie.apply_rating_change(self.movie_id, added=self.rating)
+            elif previous[1] != self.rating:
+                Movie.apply_rating_change(self.movie_id, added=self.rating, removed=previous[1])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="review_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.movie.title}"
@@ -70,6 +175,116 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+# =================== COUNTERS ===================
+
+class Counter(models.Model):
+    """One row per site-wide metric, kept current by signals (see counters.py)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+# =================== ANALYTICS ROLLUPS ===================
+# Maintained incrementally by signals (see analytics.py) so the staff
+# analytics page never has to scan the review, movie or user tables.
+
+class DailyReviewStat(models.Model):
+    date = models.DateField(unique=True)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.review_count} review(s)"
+
+
+class GenreMovieStat(models.Model):
+    genre = models.OneToOneField(Genre, on_delete=models.CASCADE, primary_key=True, related_name="movie_stat")
+    movie_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.genre}: {self.movie_count} movie(s)"
+
+
+class UserReviewStat(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="review_stat")
+    review_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["review_count"], name="user_review_count_idx")]
+
+    def __str__(self):
+        return f"{self.user}: {self.review_count} review(s)"
+
+
+
+# =================== BACKGROUND TASKS ===================
+# Queued by tasks.py, run by the run_tasks worker (or a thread pool in development).
+
+class Task(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # At most one queued task per key; enqueueing a duplicate is a no-op
+    dedupe_key = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"], name="task_status_run_after_idx")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"], condition=Q(status="queued"), name="task_queued_dedupe_key_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+
+# =================== REQUEST PROFILES ===================
+# Written by profiling.ProfilerMiddleware for sampled and slow requests, shown at /dashboard/perf/.
+
+class RequestProfile(models.Model):
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200)
+    status_code = models.PositiveSmallIntegerField()
+    # True if picked by the sampler (an unbiased sample); False if kept only for being slow
+    sampled = models.BooleanField(default=False)
+    duration_ms = models.FloatField()
+    sql_ms = models.FloatField(default=0)
+    sql_count = models.PositiveIntegerField(default=0)
+    template_ms = models.FloatField(default=0)
+    # [{"sql": ..., "ms": ..., "site": "file:line in function"}, ...]; "site" only with call_sites
+    queries = models.JSONField(default=list, blank=True)
+    # False if the statements' call sites weren't collected (requests kept only for being slow)
+    call_sites = models.BooleanField(default=True)
+    profile = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["view_name", "created_at"], name="reqprofile_view_created_idx"),
+            models.Index(fields=["-duration_ms"], name="reqprofile_duration_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
 # Signals moved to signals.py to avoid circular imports
 # Keep this commented out or remove it
 # @receiver(post_save, sender=User)
@@ -0,0 +1,213 @@
+"""
+One-time passcodes for phone signup, kept in the cache instead of the session.
+
+issue() stores a challenge (a keyed hash of the code, plus the email and
+phone it was issued for) under a random id. The id goes back to the
+browser in a signed cookie. verify() looks the challenge up by that id,
+counts the attempt and compares hashes in constant time. A challenge
+expires after OTP_TTL, dies after MAX_ATTEMPTS wrong guesses and is
+deleted once used.
+
+The code itself waits in the cache only until send_code() has mailed it.
+That task's row holds the challenge id alone, so the code never reaches
+the database.
+
+Token buckets in the same cache bound how often one IP address or one
+email address can ask for a code, and how fast one IP can guess: a bucket
+holds up to `capacity` tokens and regains one every `refill` seconds.
+Views check them first, so a burst is turned away before any form
+parsing, database or mail work happens. A bucket is read and written
+under a lock taken with cache.add(), which Redis runs atomically, so
+concurrent requests can't both spend the last token.
+"""
+import hashlib
+import hmac
+import logging
+import math
+import secrets
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+OTP_TTL = 10 * 60
+MAX_ATTEMPTS = 5
+CODE_DIGITS = 6
+
+COOKIE_NAME = "otp_challenge"
+COOKIE_SALT = "movies.otp"
+
+# Bucket name -> (capacity, seconds to regain one token)
+THROTTLES = {
+    "send-ip": (5, 60),        # codes requested from one address
+    "send-email": (3, 120),    # codes mailed to one inbox
+    "verify-ip": (10, 6),      # guesses from one address, across challenges
+}
+
+
+class OTPError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Challenge:
+    email: str
+    phone: str
+
+
+# =================== THROTTLING ===================
+
+def client_ip(request):
+    """
+    The client's address. Behind the hosting proxy that is the last
+    X-Forwarded-For hop, the one the proxy itself appended. Earlier hops
+    are whatever the client chose to send.
+    """
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if forwarded:
+        return forwarded.rsplit(",", 1)[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+LOCK_TTL = 2          # seconds; outlives any read-modify-write of a bucket
+LOCK_TRIES = 20
+LOCK_WAIT = 0.005
+
+
+def take_token(bucket, subject, now=None):
+    """
+    Spend a token from `subject`'s `bucket`. Returns 0 if one was
+    available, or else the seconds until one will be.
+    """
+    capacity, refill = THROTTLES[bucket]
+    key = f"movies:otp:bucket:{bucket}:{hashlib.sha1(subject.lower().encode()).hexdigest()}"
+    lock = f"{key}:lock"
+    for _ in range(LOCK_TRIES):
+        if cache.add(lock, 1, LOCK_TTL):
+            break
+        time.sleep(LOCK_WAIT)
+    else:
+        return 1  # another request has held it all along; turn this one away rather than race it
+
+    try:
+        now = time.time() if now is None else now
+        # (tokens, when they were counted); a missing bucket is a full one
+        tokens, counted_at = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - counted_at) / refill)
+        if tokens < 1:
+            return math.ceil(round((1 - tokens) * refill, 3))
+        # Once it has had time to fill up again it may as well be gone
+        cache.set(key, (tokens - 1, now), math.ceil((capacity - tokens + 1) * refill))
+        return 0
+    finally:
+        cache.delete(lock)
+
+
+# =================== CHALLENGES ===================
+
+def _challenge_key(challenge_id):
+    return f"movies:otp:challenge:{challenge_id}"
+
+
+def _attempts_key(challenge_id):
+    return f"movies:otp:attempts:{challenge_id}"
+
+
+def _digest(challenge_id, code):
+    message = f"{challenge_id}:{code}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _outbox_key(challenge_id):
+    return f"movies:otp:outbox:{challenge_id}"
+
+
+def issue(email, phone):
+    """
+    Start a challenge; returns (challenge id, code). The code is kept in
+    the cache for send_code() to mail, and only its hash after that.
+    """
+    challenge_id = secrets.token_urlsafe(24)
+    code = f"{secrets.randbelow(10 ** CODE_DIGITS):0{CODE_DIGITS}d}"
+    cache.set_many({
+        _challenge_key(challenge_id): {"digest": _digest(challenge_id, code), "email": email, "phone": phone},
+        _outbox_key(challenge_id): code,
+    }, OTP_TTL)
+    return challenge_id, code
+
+
+@task(max_attempts=5, retry_delay=30.0)
+def send_code(challenge_id):
+    """Mail a challenge's code to its address, then forget the code."""
+    from django.core.mail import send_mail
+
+    stored = cache.get(_challenge_key(challenge_id))
+    code = cache.get(_outbox_key(challenge_id))
+    if stored is None or code is None:
+        logger.info("OTP challenge expired or was used before its code could be mailed")
+        return
+    send_mail(
+        subject="Your WEBZMOVIES OTP",
+        message=f"Your OTP for WEBZMOVIES signup is: {code}",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[stored["email"]],
+    )
+    cache.delete(_outbox_key(challenge_id))
+
+
+def verify(challenge_id, code):
+    """
+    The Challenge if `code` is right; it is then used up. Raises OTPError
+    with a message for the user otherwise.
+    """
+    stored = cache.get(_challenge_key(challenge_id)) if challenge_id else None
+    if stored is None:
+        raise OTPError("This code has expired or is no longer valid. Please request a new one.")
+
+    attempts_key = _attempts_key(challenge_id)
+    cache.add(attempts_key, 0, OTP_TTL)
+    try:
+        attempts = cache.incr(attempts_key)
+    except ValueError:  # evicted between add() and incr()
+        attempts = MAX_ATTEMPTS + 1
+    if attempts > MAX_ATTEMPTS:
+        revoke(challenge_id)
+        raise OTPError("Too many wrong codes. Please request a new one.")
+
+    if not hmac.compare_digest(stored["digest"], _digest(challenge_id, (code or "").strip())):
+        raise OTPError("Invalid OTP. Please try again.")
+    revoke(challenge_id)
+    return Challenge(stored["email"], stored["phone"])
+
+
+def revoke(challenge_id):
+    cache.delete_many([_challenge_key(challenge_id), _attempts_key(challenge_id), _outbox_key(challenge_id)])
+
+
+# =================== COOKIE ===================
+
+def set_challenge_cookie(response, challenge_id):
+    response.set_signed_cookie(
+        COOKIE_NAME,
+        challenge_id,
+        salt=COOKIE_SALT,
+        max_age=OTP_TTL,
+        httponly=True,
+        samesite="Lax",
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
+
+
+def get_challenge_id(request):
+    return request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=OTP_TTL)
+
+
+def clear_challenge_cookie(response):
+    response.delete_cookie(COOKIE_NAME, samesite="Lax")
+    return response
@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with `WHERE (sort keys) > (last row's keys) ... LIMIT n`
+instead of OFFSET, and no COUNT(*) is run unless the template asks for a
+total, so page 500 costs the same as page 1. The ordering must end in a
+unique column (normally "id") for the cursor to identify a single row, and
+keeping every key in the same direction lets one composite index serve it.
+"""
+import base64
+import binascii
+import datetime
+import json
+from functools import cached_property
+
+from django.db import connection
+from django.db.models import Q
+
+# How far the bounded count goes before giving up and showing "N+"
+COUNT_LIMIT = 1000
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, values], default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (direction, values), or (None, None) for a missing or malformed token."""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direction, values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None, None
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        return None, None
+    return direction, values
+
+
+def approximate_count(queryset, limit=COUNT_LIMIT):
+    """
+    Cheap row count for display: the planner's estimate on Postgres, a count
+    capped at `limit` elsewhere. Returns (count, qualifier) where qualifier is
+    "" for an exact count, "~" for an estimate and "+" for a capped count.
+    """
+    queryset = queryset.order_by()
+    if connection.vendor == "postgresql":
+        plan = json.loads(queryset.explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"]), "~"
+    count = queryset[:limit + 1].count()
+    return (limit, "+") if count > limit else (count, "")
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def total(self):
+        """Approximate size of the whole result set, e.g. "42", "1000+" or "~52000"."""
+        count, qualifier = approximate_count(self.paginator.queryset, self.paginator.count_limit)
+        return f"~{count}" if qualifier == "~" else f"{count}{qualifier}"
+
+
+class KeysetPaginator:
+    """
+    paginator = KeysetPaginator(queryset, 12, ("-release_date", "id"))
+    page = paginator.get_page(request.GET.get("cursor"))
+
+    Ordering keys may be model fields or annotations on `queryset`.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_limit=COUNT_LIMIT):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_limit = count_limit
+        self.keys = [(key.lstrip("-"), key.startswith("-")) for key in self.ordering]
+
+    def _seek(self, values, backwards):
+        """Q matching rows strictly after `values` in the ordering (before, if backwards)."""
+        condition = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            lookup = "lt" if descending != backwards else "gt"
+            step = Q(**{f"{name}__{lookup}": values[index]})
+            for (earlier, _), value in zip(self.keys[:index], values):
+                step &= Q(**{earlier: value})
+            condition |= step
+        # The redundant bound on the leading key lets the database turn the
+        # OR chain into an index range scan.
+        name, descending = self.keys[0]
+        bound = "lte" if descending != backwards else "gte"
+        return Q(**{f"{name}__{bound}": values[0]}) & condition
+
+    def _values(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.keys]
+        return [getattr(row, name) for name, _ in self.keys]
+
+    def get_page(self, cursor=None):
+        direction, values = decode_cursor(cursor)
+        if values is not None and len(values) != len(self.keys):
+            direction, values = None, None
+        backwards = direction == "prev"
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        if backwards:
+            ordering = [name if descending else f"-{name}" for name, descending in self.keys]
+        else:
+            ordering = list(self.ordering)
+
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, self, None, None)
+        first, last = self._values(rows[0]), self._values(rows[-1])
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return KeysetPage(
+            rows,
+            self,
+            encode_cursor("next", last) if has_next else None,
+            encode_cursor("prev", first) if has_previous else None,
+        )
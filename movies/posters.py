@@ -0,0 +1,248 @@
+"""
+Poster migration: upload local poster files to remote storage.
+
+Uploads run on a bounded thread pool with retries and exponential backoff.
+Each finished upload is appended to a checkpoint file before its reference
+is written back to the database with batched bulk_update. A crashed run
+therefore resumes without uploading anything twice. Worker threads only
+talk to the storage backend; all database access stays on the calling
+thread.
+
+A storage backend is any object with `upload(path) -> reference`, where
+`reference` is the value to store in Movie.poster.
+CloudinaryPosterStorage is the real one; LocalPosterStorage copies files
+into a directory and stands in for it in tests and dry runs.
+
+Posters uploaded through the admin form take the same road one at a time:
+the file is parked in default storage (Cloudinary in production, so any
+process can read it) and the upload_poster task sends it on to the poster
+folder, so saving a movie doesn't wait on the upload.
+"""
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .frontpage import invalidate_front_page
+from .models import Movie
+from .tasks import task
+from .versions import bump_movie_versions
+
+DEFAULT_FOLDER = "webzmovies/posters/"
+UPLOAD_DIRECTORY = "poster_uploads"
+
+
+# =================== STORAGE BACKENDS ===================
+
+class CloudinaryPosterStorage:
+    def __init__(self, target=None):
+        self.folder = target or DEFAULT_FOLDER
+
+    def upload(self, path):
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(path, folder=self.folder, overwrite=True)
+        # Store the field's own "image/upload/v<version>/<public id>.<format>" form
+        return "/".join((
+            result["resource_type"],
+            result["type"],
+            f"v{result['version']}",
+            f"{result['public_id']}.{result['format']}",
+        ))
+
+
+class LocalPosterStorage:
+    def __init__(self, target):
+        if not target:
+            raise ValueError("LocalPosterStorage needs a target directory")
+        self.root = target
+
+    def upload(self, path):
+        name = os.path.basename(path)
+        os.makedirs(self.root, exist_ok=True)
+        shutil.copyfile(path, os.path.join(self.root, name))
+        return f"image/upload/posters/{name}"
+
+
+# =================== PIPELINE ===================
+
+@dataclass(frozen=True)
+class PosterJob:
+    movie_id: int
+    title: str
+    path: str
+
+
+def local_poster_jobs(media_root):
+    """
+    A job for every movie whose poster is still a local file under
+    `media_root`. Also returns the movies whose poster file is missing.
+    """
+    jobs, missing = [], []
+    # The raw column, not CloudinaryField's parsed resource (which drops the extension)
+    rows = (
+        Movie.objects.exclude(poster="").exclude(poster__isnull=True)
+        .annotate(poster_name=Cast("poster", output_field=CharField()))
+        .order_by("pk")
+        .values_list("pk", "title", "poster_name")
+    )
+    for movie_id, title, poster_path in rows.iterator(chunk_size=2000):
+        if poster_path.startswith(("http", "image/upload/")):
+            continue
+        local_path = os.path.join(media_root, poster_path)
+        if os.path.exists(local_path):
+            jobs.append(PosterJob(movie_id, title, local_path))
+        else:
+            missing.append(PosterJob(movie_id, title, local_path))
+    return jobs, missing
+
+
+def upload_with_retry(storage, path, retries=4, backoff=1.0, sleep=time.sleep):
+    """Upload `path`, retrying failures with exponential backoff plus jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return storage.upload(path)
+        except Exception:
+            if attempt == retries:
+                raise
+            sleep(backoff * (2 ** attempt) * (1 + random.random() / 2))
+
+
+def read_checkpoint(path):
+    """{movie id: stored reference} for every upload recorded in the checkpoint file."""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[entry["movie_id"]] = entry["reference"]
+    return done
+
+
+def save_references(references, batch_size=500):
+    """Point each movie at its uploaded poster; `references` maps movie id -> reference."""
+    if not references:
+        return
+    movies = []
+    for movie_id, reference in references.items():
+        movie = Movie(pk=movie_id)
+        movie.poster = reference
+        movies.append(movie)
+    with transaction.atomic():
+        Movie.objects.bulk_update(movies, ["poster"], batch_size=batch_size)
+    # bulk_update sends no signals, so drop the cached pages showing these posters here
+    bump_movie_versions(references)
+    invalidate_front_page()
+
+
+# =================== ADMIN UPLOADS ===================
+
+def stash_upload(uploaded):
+    """Park an uploaded poster in default storage until upload_poster picks it up; returns its name."""
+    return default_storage.save(f"{UPLOAD_DIRECTORY}/{os.path.basename(uploaded.name)}", uploaded)
+
+
+@task(max_attempts=5, retry_delay=30.0)
+def upload_poster(movie_id, name):
+    # The stash is only deleted after the reference is saved. A missing one means
+    # this process can't see the file (storage that isn't shared), so fail and
+    # retry rather than drop the poster
+    if not default_storage.exists(name):
+        raise FileNotFoundError(f"Stashed poster {name!r} is not in default storage")
+    with default_storage.open(name, "rb") as fh:
+        reference = CloudinaryPosterStorage().upload(fh)
+    if Movie.objects.filter(pk=movie_id).exists():
+        save_references({movie_id: reference})
+    default_storage.delete(name)
+
+
+class PosterMigration:
+    """
+    migration = PosterMigration(storage, workers=8, checkpoint="posters.ckpt")
+    migration.run(jobs, progress=print)
+    """
+
+    def __init__(self, storage, workers=8, batch_size=100, checkpoint=None, retries=4, backoff=1.0):
+        self.storage = storage
+        self.workers = workers
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.retries = retries
+        self.backoff = backoff
+        self.uploaded = 0
+        self.resumed = 0
+        self.failed = []
+
+    def run(self, jobs, progress=None, progress_every=5.0):
+        """Upload every job; returns the number of movies whose poster reference was updated."""
+        done = read_checkpoint(self.checkpoint)
+        # Uploads that finished before a crash may not have reached the database yet
+        pending_ids = {job.movie_id for job in jobs}
+        recovered = {movie_id: ref for movie_id, ref in done.items() if movie_id in pending_ids}
+        save_references(recovered)
+        self.resumed = len(recovered)
+        jobs = [job for job in jobs if job.movie_id not in done]
+
+        total = len(jobs)
+        started = last_report = time.monotonic()
+        unsaved = {}
+        queue = iter(jobs)
+        log = open(self.checkpoint, "a", encoding="utf-8") if self.checkpoint else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                in_flight = {}
+
+                def submit_next():
+                    job = next(queue, None)
+                    if job is not None:
+                        future = pool.submit(upload_with_retry, self.storage, job.path, self.retries, self.backoff)
+                        in_flight[future] = job
+
+                # Keep a bounded number of uploads queued instead of submitting them all
+                for _ in range(self.workers * 2):
+                    submit_next()
+                while in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job = in_flight.pop(future)
+                        submit_next()
+                        try:
+                            reference = future.result()
+                        except Exception as exc:
+                            self.failed.append((job, exc))
+                            continue
+                        if log:
+                            log.write(json.dumps({"movie_id": job.movie_id, "reference": reference}) + "\n")
+                            log.flush()
+                        unsaved[job.movie_id] = reference
+                        self.uploaded += 1
+
+                    if len(unsaved) >= self.batch_size:
+                        save_references(unsaved)
+                        unsaved = {}
+                    now = time.monotonic()
+                    if progress and now - last_report >= progress_every:
+                        last_report = now
+                        progress(self._progress(total, now - started))
+            save_references(unsaved)
+        finally:
+            if log:
+                log.close()
+        if progress:
+            progress(self._progress(total, time.monotonic() - started))
+        return self.uploaded + self.resumed
+
+    def _progress(self, total, elapsed):
+        handled = self.uploaded + len(self.failed)
+        rate = self.uploaded / elapsed if elapsed else 0.0
+        eta = (total - handled) / rate if rate else 0.0
+        return f"{handled}/{total} uploaded ({len(self.failed)} failed), {rate:.1f}/s, ETA {eta:.0f}s"
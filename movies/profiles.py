@@ -0,0 +1,18 @@
+"""
+Cached access to a user's UserProfile.
+
+Profiles are created by the post_save signal when a User is created.
+get_profile() also covers users that predate it, creating the missing
+profile the first time it is asked for. The result is kept in Django's
+reverse one-to-one cache, so asking again on the same user object is free.
+"""
+from .models import UserProfile
+
+
+def get_profile(user):
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        user.userprofile = profile
+        return profile
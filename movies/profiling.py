@@ -0,0 +1,249 @@
+"""
+Slow-request profiler.
+
+ProfilerMiddleware times every request and records each SQL statement it
+runs plus the time spent rendering templates. Most of that is thrown away
+when the response goes out. A request is kept as a RequestProfile row when:
+
+- the sampler picked it (PERF_SAMPLE_RATE of all requests), or
+- it took longer than PERF_SLOW_MS, whether sampled or not.
+
+With PERF_CPROFILE on, sampled requests also run under cProfile and keep
+the top of the report, and each of their statements notes the line of
+project code that issued it. Finding that line means walking the stack on
+every query, so it is skipped for the rest. (A request can't be known to
+be slow before it has run, so unsampled slow requests come without
+either, and their rows are saved with call_sites=False.)
+
+Only sampled rows feed the per-view percentiles in view_summaries(); the
+slow ones would skew them. The table is trimmed to the newest PERF_KEEP
+rows as it grows. Statements are stored without their parameters, which
+can hold email addresses and the like.
+
+Template time is measured by the ProfiledDjangoTemplates backend, which
+settings.TEMPLATES uses in place of Django's own.
+"""
+import io
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Paths never profiled: files, health checks and the profiler's own pages
+IGNORED_PREFIXES = ("/static/", "/media/", "/healthz", "/dashboard/perf/")
+
+MAX_QUERIES = 200         # statements kept per request; the count and total time cover all of them
+MAX_SQL_LENGTH = 2000
+PROFILE_LINES = 40
+TRIM_EVERY = 50           # on average, trim the table once per this many saves
+
+_active = threading.local()
+
+_PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+def _call_site():
+    """Where the innermost project code on the stack is, as "path:line in function"."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and filename != _THIS_FILE and "site-packages" not in filename:
+            return f"{Path(filename).relative_to(_PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return ""
+
+
+class Recorder:
+    """Collects one request's SQL and template timings."""
+
+    def __init__(self, call_sites=False):
+        # Whether to note where each statement came from; costs a stack walk per query
+        self.call_sites = call_sites
+        self.queries = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.sql_count += 1
+            self.sql_ms += ms
+            if len(self.queries) < MAX_QUERIES:
+                query = {"sql": sql[:MAX_SQL_LENGTH], "ms": round(ms, 3)}
+                if self.call_sites:
+                    query["site"] = _call_site()
+                self.queries.append(query)
+
+
+# =================== TEMPLATE TIMING ===================
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        recorder = getattr(_active, "recorder", None)
+        if recorder is None:
+            return super().render(context, request)
+        # Only the outermost render counts, so render_to_string() inside a tag isn't added twice
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_ms += (time.perf_counter() - started) * 1000
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Django's template backend, with render times reported to the active Recorder."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+# =================== MIDDLEWARE ===================
+
+def _profile_report(profiler):
+    import pstats
+
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return stream.getvalue()
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, "PERF_SAMPLE_RATE", 0)
+        slow_ms = getattr(settings, "PERF_SLOW_MS", None)
+        if (sample_rate <= 0 and slow_ms is None) or request.path.startswith(IGNORED_PREFIXES):
+            return self.get_response(request)
+
+        sampled = random.random() < sample_rate
+        recorder = _active.recorder = Recorder(call_sites=sampled)
+        profiler = None
+        if sampled and getattr(settings, "PERF_CPROFILE", False):
+            import cProfile
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is already running in this process
+                profiler = None
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if profiler is not None:
+                profiler.disable()
+            _active.recorder = None
+
+        if sampled or (slow_ms is not None and duration_ms >= slow_ms):
+            self.save(request, response, recorder, duration_ms, sampled, profiler)
+        return response
+
+    def save(self, request, response, recorder, duration_ms, sampled, profiler):
+        from .models import RequestProfile
+
+        match = request.resolver_match
+        try:
+            RequestProfile.objects.create(
+                method=request.method[:10],
+                path=request.path[:500],
+                view_name=(match.view_name if match else "")[:200],
+                status_code=response.status_code,
+                sampled=sampled,
+                duration_ms=duration_ms,
+                sql_ms=recorder.sql_ms,
+                sql_count=recorder.sql_count,
+                template_ms=recorder.template_ms,
+                queries=recorder.queries,
+                call_sites=recorder.call_sites,
+                profile=_profile_report(profiler) if profiler is not None else "",
+            )
+            if random.randrange(TRIM_EVERY) == 0:
+                trim(getattr(settings, "PERF_KEEP", 2000))
+        except DatabaseError:
+            logger.exception("Could not save the profile of %s %s", request.method, request.path)
+
+
+def trim(keep):
+    """Delete all but the newest `keep` profiles; returns how many went."""
+    from .models import RequestProfile
+
+    cutoff = RequestProfile.objects.order_by("-pk").values_list("pk", flat=True)[keep:keep + 1].first()
+    if cutoff is None:
+        return 0
+    deleted, _ = RequestProfile.objects.filter(pk__lte=cutoff).delete()
+    return deleted
+
+
+# =================== REPORTING ===================
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[max(1, math.ceil(len(ordered) * fraction)) - 1]
+
+
+def view_summaries():
+    """
+    Per view: how many sampled and slow captures there are, the p50/p95/p99
+    of the sampled durations, and the mean queries per request. Slowest p95
+    first.
+    """
+    from .models import RequestProfile
+
+    durations = defaultdict(list)
+    slow = defaultdict(int)
+    queries = defaultdict(int)
+    rows = RequestProfile.objects.values_list("view_name", "sampled", "duration_ms", "sql_count")
+    for view_name, sampled, duration_ms, sql_count in rows.iterator(chunk_size=1000):
+        if sampled:
+            durations[view_name].append(duration_ms)
+            queries[view_name] += sql_count
+        else:
+            slow[view_name] += 1
+
+    summaries = []
+    for view_name in set(durations) | set(slow):
+        ordered = sorted(durations[view_name])
+        summaries.append({
+            "view_name": view_name or "(unresolved)",
+            "samples": len(ordered),
+            "slow": slow[view_name],
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "avg_queries": queries[view_name] / len(ordered) if ordered else 0,
+        })
+    summaries.sort(key=lambda summary: (summary["p95"], summary["slow"]), reverse=True)
+    return summaries
@@ -0,0 +1,56 @@
+from django.db.models import Count, Q, Sum
+
+from .models import Movie, Review, RATING_HISTOGRAM_FIELDS
+
+AGGREGATE_FIELDS = ("rating_sum", "rating_count", *RATING_HISTOGRAM_FIELDS.values())
+
+
+def aggregate_ratings(reviews=None):
+    """
+    Group `reviews` (all reviews by default) by movie in a single query.
+
+    Returns {movie_id: {"rating_sum": ..., "rating_count": ..., "rating_1": ...}}.
+    """
+    if reviews is None:
+        reviews = Review.objects.all()
+    histogram = {
+        field: Count("id", filter=Q(rating=star))
+        for star, field in RATING_HISTOGRAM_FIELDS.items()
+    }
+    rows = (
+        reviews.order_by()
+        .values("movie_id")
+        .annotate(rating_sum=Sum("rating"), rating_count=Count("id"), **histogram)
+    )
+    return {row.pop("movie_id"): row for row in rows}
+
+
+def rebuild_ratings(apply=True, batch_size=500):
+    """
+    Compare every movie's stored aggregates with the review table.
+
+    Drifted movies are corrected with bulk_update unless `apply` is False.
+    Returns (movies checked, list of drifted movies).
+    """
+    stats = aggregate_ratings()
+    empty = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    drifted = []
+    checked = 0
+
+    movies = Movie.objects.only("id", "title", "average_rating", *AGGREGATE_FIELDS).order_by("pk")
+    for movie in movies.iterator(chunk_size=2000):
+        checked += 1
+        expected = stats.get(movie.pk, empty)
+        average = expected["rating_sum"] / expected["rating_count"] if expected["rating_count"] else 0
+        if (
+            any(getattr(movie, field) != expected[field] for field in AGGREGATE_FIELDS)
+            or abs(movie.average_rating - average) > 1e-9
+        ):
+            for field in AGGREGATE_FIELDS:
+                setattr(movie, field, expected[field])
+            movie.average_rating = average
+            drifted.append(movie)
+
+    if apply and drifted:
+        Movie.objects.bulk_update(drifted, ["average_rating", *AGGREGATE_FIELDS], batch_size=batch_size)
+    return checked, drifted
@@ -0,0 +1,225 @@
+"""
+Responsive poster renditions.
+
+Every poster is offered at a few named widths (thumb/card/detail) in AVIF,
+WebP and JPEG. With the "cloudinary" backend these are transformation URLs
+on the stored CloudinaryField resource. The "local" backend renders the
+same renditions with Pillow into MEDIA_ROOT/renditions/, so pages work
+offline and in tests. Either way, the URLs are computed once per poster
+reference and kept in the cache. The {% poster_picture %} tag turns them
+into a <picture> with srcset/sizes.
+
+Pages never render anything: a poster whose files aren't there yet is
+shown plain while the render_renditions task (or `manage.py
+generate_poster_renditions`) makes them. Only complete results are cached
+for long; a poster with no readable original is looked at again after
+EMPTY_TIMEOUT, in case it was still being uploaded.
+"""
+import hashlib
+import os
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .models import Movie
+from .tasks import task
+
+# Rendition name -> width in pixels, narrowest first
+RENDITIONS = {"thumb": 160, "card": 320, "detail": 640}
+
+# Preferred first; the last one is the <img> fallback every browser can show
+FORMATS = ("avif", "webp", "jpg")
+
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpg": "image/jpeg"}
+
+# `sizes` attribute for each place a poster is shown
+SIZES = {
+    "thumb": "80px",
+    "card": "(max-width: 768px) 50vw, 250px",
+    "detail": "(max-width: 768px) 100vw, 400px",
+}
+
+RENDITION_TIMEOUT = 60 * 60 * 24 * 30
+EMPTY_TIMEOUT = 5 * 60
+LOCAL_DIRECTORY = "renditions"
+
+
+@dataclass(frozen=True)
+class PosterRenditions:
+    # {(rendition name, format): url}
+    urls: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return bool(self.urls)
+
+    def url(self, name="card", fmt="jpg"):
+        return self.urls.get((name, fmt), "")
+
+    def srcset(self, fmt):
+        return ", ".join(
+            f"{self.urls[(name, fmt)]} {width}w"
+            for name, width in RENDITIONS.items()
+            if (name, fmt) in self.urls
+        )
+
+
+# =================== BACKENDS ===================
+
+def _resource(reference):
+    return Movie._meta.get_field("poster").to_python(reference)
+
+
+def _source_name(resource):
+    """Path of the original under MEDIA_ROOT, e.g. "posters/abc.jpg"."""
+    return f"{resource.public_id}.{resource.format}" if resource.format else resource.public_id
+
+
+def cloudinary_renditions(reference, render=True):
+    """Transformation URLs; there is never anything to render."""
+    resource = _resource(reference)
+    if not resource or not resource.public_id:
+        return {}
+    return {
+        (name, fmt): resource.build_url(
+            width=width, crop="limit", quality="auto", fetch_format=fmt, secure=True,
+        )
+        for name, width in RENDITIONS.items()
+        for fmt in FORMATS
+    }
+
+
+def _render_local(source, target, width, fmt):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((width, width * 4))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Render next to the target and rename, so readers never see a partial file
+        partial = f"{target}.partial"
+        image.save(partial, format="JPEG" if fmt == "jpg" else fmt.upper(), quality=80)
+        os.replace(partial, target)
+
+
+def local_renditions(reference, render=True):
+    """
+    Render (if not done yet) and return the renditions of a poster stored
+    under MEDIA_ROOT. With `render` False, None if any would have to be rendered.
+    """
+    resource = _resource(reference)
+    if not resource or not resource.public_id:
+        return {}
+    source = os.path.join(settings.MEDIA_ROOT, _source_name(resource))
+    if not os.path.exists(source):
+        return {}
+
+    urls = {}
+    for name, width in RENDITIONS.items():
+        for fmt in FORMATS:
+            relative = f"{LOCAL_DIRECTORY}/{resource.public_id}-{name}.{fmt}"
+            target = os.path.join(settings.MEDIA_ROOT, relative)
+            if not os.path.exists(target):
+                if not render:
+                    return None
+                try:
+                    _render_local(source, target, width, fmt)
+                except KeyError:
+                    continue  # this Pillow build has no encoder for the format
+                except OSError:
+                    return {}  # unreadable original; pages fall back to the plain poster URL
+            urls[(name, fmt)] = settings.MEDIA_URL + relative
+    return urls
+
+
+BACKENDS = {"cloudinary": cloudinary_renditions, "local": local_renditions}
+
+
+# =================== LOOKUP ===================
+
+def _cache_key(backend, reference):
+    digest = hashlib.sha1(f"{backend}:{reference}".encode()).hexdigest()
+    return f"movies:poster:{digest}"
+
+
+def poster_reference(poster):
+    """The stored column value for a poster, whatever form it arrives in."""
+    if isinstance(poster, str):
+        return poster
+    if not poster or not getattr(poster, "public_id", None):
+        return ""
+    return Movie._meta.get_field("poster").get_prep_value(poster) or ""
+
+
+def get_renditions_many(posters, render=False):
+    """
+    {poster reference: PosterRenditions} for `posters`, with one cache round
+    trip for the lot. Unless `render` is set, posters whose renditions still
+    have to be rendered come back empty and are queued for render_renditions.
+    """
+    backend = settings.POSTER_RENDITIONS_BACKEND
+    references = {poster_reference(poster) for poster in posters} - {""}
+    keys = {_cache_key(backend, reference): reference for reference in references}
+    found = cache.get_many(keys)
+
+    complete, empty = {}, {}
+    for key, reference in keys.items():
+        if key in found:
+            continue
+        urls = BACKENDS[backend](reference, render=render)
+        if urls is None:
+            render_renditions.enqueue(reference=reference, dedupe_key=f"renditions:{key}")
+            continue
+        (complete if urls else empty)[key] = urls
+    cache.set_many(complete, RENDITION_TIMEOUT)
+    cache.set_many(empty, EMPTY_TIMEOUT)
+    found.update(complete)
+
+    result = {reference: PosterRenditions(found.get(key, {})) for key, reference in keys.items()}
+    result[""] = PosterRenditions()
+    return result
+
+
+def get_renditions(poster, render=False):
+    return get_renditions_many([poster], render=render)[poster_reference(poster)]
+
+
+@task(max_attempts=3)
+def render_renditions(reference):
+    """Render one poster's renditions, then refresh the pages that showed it without them."""
+    from .frontpage import invalidate_front_page
+    from .versions import bump_movie_versions
+
+    if get_renditions(reference, render=True):
+        showing = (
+            Movie.objects.annotate(poster_name=Cast("poster", output_field=CharField()))
+            .filter(poster_name=reference)
+            .values_list("pk", flat=True)
+        )
+        bump_movie_versions(list(showing))
+        invalidate_front_page()
+
+
+def warm_renditions(batch_size=200):
+    """Compute (and with the local backend, render) the renditions of every poster ahead of page views."""
+    references = (
+        Movie.objects.exclude(poster="").exclude(poster__isnull=True)
+        .annotate(poster_name=Cast("poster", output_field=CharField()))
+        .order_by("pk")
+        .values_list("poster_name", flat=True)
+    )
+    batch, warmed, empty = [], 0, 0
+    for reference in references.iterator(chunk_size=batch_size):
+        batch.append(reference)
+        if len(batch) >= batch_size:
+            found = get_renditions_many(batch, render=True)
+            warmed += len(batch)
+            empty += sum(1 for reference in batch if not found[reference])
+            batch = []
+    if batch:
+        found = get_renditions_many(batch, render=True)
+        warmed += len(batch)
+        empty += sum(1 for reference in batch if not found[reference])
+    return warmed, empty
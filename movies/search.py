@@ -0,0 +1,198 @@
+"""
+Full-text movie search.
+
+SQLite databases keep an FTS5 table, Postgres a tsvector table with a GIN
+index; both are keyed by movie id and rank title matches above genre and
+synopsis matches. Signals in signals.py keep the index in step with Movie and
+Genre writes, and `manage.py rebuild_search_index` rebuilds it from scratch.
+Any other backend falls back to icontains filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Genre, Movie
+
+SEARCH_TABLE = "movies_movie_search"
+
+# bm25 column weights for the SQLite table, in (title, genres, synopsis) order
+FTS5_WEIGHTS = (10.0, 4.0, 1.0)
+
+MAX_TERMS = 8
+CHUNK_SIZE = 500
+
+# Letters and digits only: both tokenizers split on "_" as on any other punctuation
+_TERM_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def search_backend(conn=None):
+    vendor = (conn or connection).vendor
+    return vendor if vendor in ("sqlite", "postgresql") else None
+
+
+def _tables():
+    return Movie._meta.db_table, Movie.genre.through._meta.db_table, Genre._meta.db_table
+
+
+# =================== INDEX DDL ===================
+
+def create_search_index(conn=None):
+    conn = conn or connection
+    backend = search_backend(conn)
+    movie_table = Movie._meta.db_table
+    with conn.cursor() as cursor:
+        if backend == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5(title, genres, synopsis, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        elif backend == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"movie_id bigint PRIMARY KEY REFERENCES {movie_table} (id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+
+def drop_search_index(conn=None):
+    conn = conn or connection
+    if search_backend(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+# =================== INDEX MAINTENANCE ===================
+
+def _document_sql(backend, where):
+    """SELECT producing (movie id, document) rows for the movies matched by `where`."""
+    movie_table, through_table, genre_table = _tables()
+    genre_names = (
+        f"(SELECT {{agg}} FROM {through_table} mg JOIN {genre_table} g ON g.id = mg.genre_id "
+        f"WHERE mg.movie_id = m.id)"
+    )
+    if backend == "sqlite":
+        genres = genre_names.format(agg="group_concat(g.name, ' ')")
+        return (
+            f"SELECT m.id, m.title, coalesce({genres}, ''), m.synopsis "
+            f"FROM {movie_table} m {where}"
+        )
+    genres = genre_names.format(agg="string_agg(g.name, ' ')")
+    return (
+        f"SELECT m.id, "
+        f"setweight(to_tsvector('simple', m.title), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce({genres}, '')), 'B') || "
+        f"setweight(to_tsvector('simple', m.synopsis), 'C') "
+        f"FROM {movie_table} m {where}"
+    )
+
+
+def _write_documents(cursor, backend, where="", params=()):
+    select = _document_sql(backend, where)
+    if backend == "sqlite":
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, title, genres, synopsis) {select}", params)
+    else:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (movie_id, document) {select} "
+            f"ON CONFLICT (movie_id) DO UPDATE SET document = EXCLUDED.document",
+            params,
+        )
+
+
+def _key_column(backend):
+    return "rowid" if backend == "sqlite" else "movie_id"
+
+
+def index_movies(movie_ids):
+    """(Re)index the given movies; ids that no longer exist are dropped from the index."""
+    backend = search_backend()
+    if not backend:
+        return
+    movie_ids = list(movie_ids)
+    key = _key_column(backend)
+    with connection.cursor() as cursor:
+        for start in range(0, len(movie_ids), CHUNK_SIZE):
+            chunk = movie_ids[start:start + CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})", chunk)
+            _write_documents(cursor, backend, f"WHERE m.id IN ({placeholders})", chunk)
+
+
+def rebuild_search_index(conn=None):
+    """Drop every indexed document and index all movies again. Returns the row count."""
+    conn = conn or connection
+    backend = search_backend(conn)
+    if not backend:
+        return 0
+    create_search_index(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        _write_documents(cursor, backend)
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+# =================== QUERYING ===================
+
+def search_terms(query):
+    return _TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def match_expression(backend, terms):
+    """The FTS5 MATCH string or Postgres tsquery for non-empty `terms`; the last one is a prefix."""
+    if backend == "sqlite":
+        return " ".join(f'"{term}"' for term in terms) + "*"
+    return " & ".join(terms) + ":*"
+
+
+def search_movies(queryset, query):
+    """
+    Filter a Movie queryset down to matches for `query` and annotate each row
+    with `search_rank` (higher is better). Every term must match; the last
+    one may be a prefix so results update while the user is still typing.
+    """
+    terms = search_terms(query)
+    if not terms:
+        # Still annotated, so callers can order by search_rank either way
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    backend = search_backend()
+    movie_table = Movie._meta.db_table
+    if backend == "sqlite":
+        match = match_expression(backend, terms)
+        weights = ", ".join(str(w) for w in FTS5_WEIGHTS)
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f"{SEARCH_TABLE}.rowid = {movie_table}.id", f"{SEARCH_TABLE} MATCH %s"],
+            params=[match],
+        ).annotate(search_rank=RawSQL(f"-bm25({SEARCH_TABLE}, {weights})", (), output_field=FloatField()))
+    if backend == "postgresql":
+        tsquery = match_expression(backend, terms)
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f"{SEARCH_TABLE}.movie_id = {movie_table}.id",
+                f"{SEARCH_TABLE}.document @@ to_tsquery('simple', %s)",
+            ],
+            params=[tsquery],
+        ).annotate(search_rank=RawSQL(
+            f"ts_rank({SEARCH_TABLE}.document, to_tsquery('simple', %s))", (tsquery,), output_field=FloatField(),
+        ))
+
+    text = " ".join(terms)
+    return queryset.filter(
+        Q(title__icontains=text)
+        | Q(synopsis__icontains=text)
+        | Q(genre__in=Genre.objects.filter(name__icontains=text))
+    ).distinct().annotate(
+        search_rank=Case(
+            When(title__icontains=text, then=Value(2.0)),
+            default=Value(1.0),
+            output_field=FloatField(),
+        )
+    )
@@ -1,32 +1,237 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import Genre, Movie, Review, UserProfile
+from . import analytics, counters, search
+from .versions import bump_movie_versions
+from .frontpage import invalidate_front_page
+from .wishlist import invalidate_wishlist
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
     """
-    Signal to create a UserProfile automatically when a new User is created.
+    Create the UserProfile together with a new User. Later saves (every
+    login updates last_login) leave the profile alone; users that predate
+    this signal get theirs from profiles.get_profile on first access.
+    Fixture loads (raw) bring their own profiles.
     """
-    if created:
-        # Check if the UserProfile table exists before trying to create
-        try:
-            # This will raise an exception if the table doesn't exist
-            UserProfile.objects.get_or_create(user=instance)
-        except:
-            # If the table doesn't exist yet, just pass
-            # The profile will be created when the table is available
-            pass
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    """
+    Take a deleted review out of its movie's rating aggregates.
+    Runs for cascades and queryset deletes too, inside the delete transaction.
+    """
+    Movie.apply_rating_change(instance.movie_id, removed=instance.rating)
+
+
+# =================== SEARCH INDEX ===================
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def reindex_movie(sender, instance, **kwargs):
+    search.index_movies([instance.pk])
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def reindex_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
     """
-    Signal to save the UserProfile when the User is saved.
+    Keep indexed genre names current when a movie's genres change, from
+    either side of the relation (movie.genre.add or genre.movie_set.add).
     """
-    try:
-        # Check if the UserProfile table exists
-        UserProfile.objects.get_or_create(user=instance)
-        instance.userprofile.save()
-    except:
-        # If the table doesn't exist yet, just pass
-        pass
\ No newline at end of file
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            search.index_movies([instance.pk])
+    elif action == "pre_clear":
+        instance._search_movie_ids = list(instance.movie_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        search.index_movies(getattr(instance, "_search_movie_ids", []))
+    elif action in ("post_add", "post_remove"):
+        search.index_movies(pk_set)
+
+
+@receiver(post_save, sender=Genre)
+def reindex_renamed_genre(sender, instance, created, **kwargs):
+    if not created:
+        search.index_movies(instance.movie_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Genre)
+def collect_genre_movies(sender, instance, **kwargs):
+    instance._search_movie_ids = list(instance.movie_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def reindex_deleted_genre(sender, instance, **kwargs):
+    search.index_movies(getattr(instance, "_search_movie_ids", []))
+
+
+# =================== WISHLIST CACHE ===================
+
+@receiver(m2m_changed, sender=UserProfile.wishlist.through)
+def invalidate_cached_wishlist(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # post_clear gets no pk_set, so note whose wishlists held the movie beforehand
+        instance._wishlist_user_ids = list(
+            UserProfile.objects.filter(wishlist=instance).values_list("user_id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_wishlist(instance.user_id)
+    elif action == "post_clear":
+        invalidate_wishlist(*getattr(instance, "_wishlist_user_ids", []))
+    elif pk_set:
+        invalidate_wishlist(*UserProfile.objects.filter(pk__in=pk_set).values_list("user_id", flat=True))
+
+
+# =================== FRONT PAGE ===================
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def refresh_front_page(sender, instance, **kwargs):
+    # A new or re-dated movie can enter the latest list, so any write counts.
+    invalidate_front_page()
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def refresh_front_page_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        if reverse:
+            invalidate_front_page()
+        else:
+            invalidate_front_page(instance.pk)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def refresh_front_page_genre_names(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_front_page()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_front_page_rating(sender, instance, **kwargs):
+    invalidate_front_page(instance.movie_id)
+
+
+# =================== MOVIE VERSION STAMPS ===================
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def bump_movie_version(sender, instance, **kwargs):
+    bump_movie_versions([instance.pk])
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def bump_movie_genres_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_movie_versions([instance.pk])
+    elif action == "pre_clear":
+        instance._version_movie_ids = list(instance.movie_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        bump_movie_versions(getattr(instance, "_version_movie_ids", []))
+    elif action in ("post_add", "post_remove"):
+        bump_movie_versions(pk_set)
+
+
+@receiver(post_save, sender=Genre)
+def bump_renamed_genre_versions(sender, instance, created, **kwargs):
+    # A new genre has no movies yet but still shows up in the catalog filters
+    bump_movie_versions([] if created else instance.movie_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def bump_deleted_genre_versions(sender, instance, **kwargs):
+    # collect_genre_movies stashed the movie ids before the links went away
+    bump_movie_versions(getattr(instance, "_search_movie_ids", []))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_reviewed_movie_version(sender, instance, **kwargs):
+    bump_movie_versions([instance.movie_id])
+
+
+# =================== ANALYTICS ROLLUPS ===================
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    if created:
+        analytics.record_review(instance, 1)
+        return
+    previous = getattr(instance, "_previous_rating", None)
+    if previous and previous[1] != instance.rating:
+        analytics.record_review(instance, previous_rating=previous[1])
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    analytics.record_review(instance, -1)
+
+
+@receiver(m2m_changed, sender=Movie.genre.through)
+def count_genre_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep GenreMovieStat in step with movie-genre links, from either side."""
+    links = Movie.genre.through.objects.filter(**{"genre" if reverse else "movie": instance})
+    if action == "pre_remove":
+        links = links.filter(**{"movie__in" if reverse else "genre__in": pk_set})
+    if action in ("pre_remove", "pre_clear"):
+        instance._analytics_links = list(links.values_list("movie_id" if reverse else "genre_id", flat=True))
+        return
+
+    if action == "post_add":
+        changed, delta = pk_set, 1
+    elif action in ("post_remove", "post_clear"):
+        changed, delta = getattr(instance, "_analytics_links", []), -1
+    else:
+        return
+    if reverse:
+        analytics.record_genre_links([instance.pk], delta * len(changed))
+    else:
+        analytics.record_genre_links(changed, delta)
+
+
+@receiver(pre_delete, sender=Movie)
+def collect_movie_genres(sender, instance, **kwargs):
+    instance._analytics_genre_ids = list(instance.genre.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+def uncount_movie_genres(sender, instance, **kwargs):
+    analytics.record_genre_links(getattr(instance, "_analytics_genre_ids", []), -1)
+
+
+# =================== DASHBOARD COUNTERS ===================
+
+COUNTED_MODELS = {Movie: counters.MOVIES, Genre: counters.GENRES, Review: counters.REVIEWS, User: counters.USERS}
+
+
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(COUNTED_MODELS[sender])
+        if sender is Review:
+            counters.increment(counters.RATING_SUM, instance.rating)
+    elif sender is Review:
+        previous = getattr(instance, "_previous_rating", None)
+        if previous:
+            counters.increment(counters.RATING_SUM, instance.rating - previous[1])
+
+
+def count_deleted(sender, instance, **kwargs):
+    counters.increment(COUNTED_MODELS[sender], -1)
+    if sender is Review:
+        counters.increment(counters.RATING_SUM, -instance.rating)
+
+
+# Connected per model rather than for every sender, so saves and deletes of
+# all the other models (sessions, tasks, profiles...) never reach them
+for model in COUNTED_MODELS:
+    post_save.connect(count_created, sender=model, dispatch_uid=f"count_created_{model._meta.label_lower}")
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f"count_deleted_{model._meta.label_lower}")
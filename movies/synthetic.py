@@ -0,0 +1,224 @@
+"""
+Synthetic catalog for benchmarking: movies, users, reviews and wishlists
+with the skew of a real site.
+
+Popularity is Zipfian. The movie ranked k gets reviews and wishlist adds
+in proportion to 1 / k**exponent, so a few titles hold most of the
+reviews and the long tail has almost none. Reviewer activity is skewed
+the same way. Each movie has a hidden quality that its ratings scatter
+around, release dates lean towards recent years, and genre use is skewed
+too.
+
+Everything goes in with bulk_create in batches and nothing fires per-row
+signals; rebuild_derived_data() (see catalog.py) fills in the aggregates,
+search index, rollups and counters once at the end. A given seed always
+generates the same data.
+"""
+import datetime
+import itertools
+import random
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import rebuild_derived_data
+from .models import Genre, Movie, Review, UserProfile
+from .versions import bump_movie_versions
+
+GENRE_NAMES = (
+    "Drama", "Comedy", "Action", "Thriller", "Romance", "Horror", "Crime", "Adventure",
+    "Science Fiction", "Animation", "Fantasy", "Mystery", "Family", "Documentary",
+    "War", "History", "Music", "Western", "Biography", "Sport",
+)
+WORDS = (
+    "shadow", "river", "night", "last", "summer", "city", "broken", "secret", "king", "road",
+    "silent", "fire", "house", "storm", "golden", "lost", "empire", "winter", "heart", "edge",
+    "midnight", "return", "garden", "iron", "wild", "paper", "echo", "stranger", "ocean", "glass",
+)
+SYNOPSIS_WORDS = WORDS + (
+    "a", "the", "of", "and", "to", "in", "family", "detective", "journey", "war", "love",
+    "small", "town", "must", "find", "before", "after", "discovers", "team", "truth",
+)
+COMMENTS = (
+    "Loved it.", "Not for me.", "Great performances, slow second half.", "A classic.",
+    "Better than I expected.", "Too long.", "Would watch again.", "The ending made no sense.",
+)
+
+FIRST_RELEASE_YEAR = 1950
+
+
+@contextmanager
+def keep_created_at(model):
+    """
+    Let bulk_create() store the created_at values it is given. auto_now_add
+    would otherwise overwrite them, and putting them back with bulk_update()
+    costs far more than the insert.
+    """
+    field = model._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n, for random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class SyntheticCatalog:
+    """
+    catalog = SyntheticCatalog(movies=100_000, users=1_000_000, reviews=5_000_000)
+    catalog.generate(progress=print)
+    """
+
+    def __init__(self, movies, users, reviews, wishlists=0, exponent=1.1, seed=0, batch_size=5000):
+        self.counts = {"movies": movies, "users": users, "reviews": reviews, "wishlists": wishlists}
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.today = timezone.localdate()
+        self.genre_ids = []
+        self.movie_ids = []    # most popular first
+        self.quality = {}      # movie id -> mean rating
+        self.user_ids = []     # most active first
+        self.profile_ids = {}  # user id -> profile id
+
+    def generate(self, progress=lambda message: None):
+        self._genres()
+        progress(f"{len(self.genre_ids)} genres")
+        self._movies(progress)
+        self._users(progress)
+        self._reviews(progress)
+        self._wishlists(progress)
+        progress("Rebuilding ratings, search index, analytics and counters...")
+        rebuild_derived_data()
+        bump_movie_versions([])
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    # ---- genres and movies ----
+
+    def _genres(self):
+        existing = dict(Genre.objects.filter(name__in=GENRE_NAMES).values_list("name", "pk"))
+        created = Genre.objects.bulk_create([Genre(name=name) for name in GENRE_NAMES if name not in existing])
+        existing.update((genre.name, genre.pk) for genre in created)
+        self.genre_ids = [existing[name] for name in GENRE_NAMES]
+
+    def _release_date(self):
+        # Recent years are much better represented than old ones
+        span = self.today.year - FIRST_RELEASE_YEAR
+        year = self.today.year - min(span, int(self.rng.expovariate(1 / 12)))
+        return datetime.date(year, 1, 1) + datetime.timedelta(days=self.rng.randrange(365))
+
+    def _sentence(self, words):
+        return " ".join(self.rng.choice(SYNOPSIS_WORDS) for _ in range(words)).capitalize() + "."
+
+    def _movies(self, progress):
+        rng = self.rng
+        genre_weights = zipf_cum_weights(len(self.genre_ids), 0.8)
+        through = Movie.genre.through
+        for size in self._batches(self.counts["movies"]):
+            movies = [
+                Movie(
+                    title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title(),
+                    release_date=self._release_date(),
+                    synopsis=self._sentence(rng.randint(30, 120)),
+                    poster="",
+                    telegram_link=f"https://t.me/webzmovies/{rng.randrange(10 ** 6)}",
+                )
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                Movie.objects.bulk_create(movies)
+                through.objects.bulk_create([
+                    through(movie_id=movie.pk, genre_id=genre_id)
+                    for movie in movies
+                    for genre_id in set(rng.choices(self.genre_ids, cum_weights=genre_weights, k=rng.randint(1, 3)))
+                ])
+            for movie in movies:
+                self.movie_ids.append(movie.pk)
+                self.quality[movie.pk] = min(4.8, max(1.5, rng.gauss(3.4, 0.7)))
+            progress(f"{len(self.movie_ids)} movies")
+        # Popularity rank is unrelated to insertion order
+        rng.shuffle(self.movie_ids)
+
+    # ---- users ----
+
+    def _users(self, progress):
+        # Synthetic users can't log in; every one shares the same unusable hash
+        password = make_password(None)
+        start = User.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        created = 0
+        for size in self._batches(self.counts["users"]):
+            users = [
+                User(username=f"synthetic{start + created + n}", email=f"synthetic{start + created + n}@example.com",
+                     password=password)
+                for n in range(size)
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                profiles = UserProfile.objects.bulk_create([UserProfile(user_id=user.pk) for user in users])
+            self.user_ids.extend(user.pk for user in users)
+            self.profile_ids.update((profile.user_id, profile.pk) for profile in profiles)
+            created += size
+            progress(f"{created} users")
+        self.rng.shuffle(self.user_ids)
+
+    # ---- reviews and wishlists ----
+
+    def _reviews(self, progress):
+        if not self.movie_ids or not self.user_ids:
+            return
+        rng = self.rng
+        movie_weights = zipf_cum_weights(len(self.movie_ids), self.exponent)
+        user_weights = zipf_cum_weights(len(self.user_ids), self.exponent)
+        now = timezone.now()
+        written = 0
+        for size in self._batches(self.counts["reviews"]):
+            movie_ids = rng.choices(self.movie_ids, cum_weights=movie_weights, k=size)
+            user_ids = rng.choices(self.user_ids, cum_weights=user_weights, k=size)
+            reviews = [
+                Review(
+                    movie_id=movie_id,
+                    user_id=user_id,
+                    rating=min(5, max(1, round(rng.gauss(self.quality[movie_id], 1.0)))),
+                    comment=rng.choice(COMMENTS),
+                    # Spread over three years, for the analytics page
+                    created_at=now - datetime.timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+                )
+                for movie_id, user_id in zip(movie_ids, user_ids)
+            ]
+            with keep_created_at(Review):
+                Review.objects.bulk_create(reviews)
+            written += size
+            progress(f"{written} reviews")
+
+    def _wishlists(self, progress):
+        if not self.movie_ids or not self.user_ids:
+            return
+        rng = self.rng
+        movie_weights = zipf_cum_weights(len(self.movie_ids), self.exponent)
+        user_weights = zipf_cum_weights(len(self.user_ids), self.exponent)
+        through = UserProfile.wishlist.through
+        written = 0
+        for size in self._batches(self.counts["wishlists"]):
+            pairs = {
+                (self.profile_ids[user_id], movie_id)
+                for user_id, movie_id in zip(
+                    rng.choices(self.user_ids, cum_weights=user_weights, k=size),
+                    rng.choices(self.movie_ids, cum_weights=movie_weights, k=size),
+                )
+            }
+            through.objects.bulk_create(
+                [through(userprofile_id=profile_id, movie_id=movie_id) for profile_id, movie_id in pairs],
+                ignore_conflicts=True,
+            )
+            written += size
+            progress(f"{written} wishlist adds")
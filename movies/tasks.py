@@ -0,0 +1,264 @@
+"""
+Background tasks without a broker.
+
+    @task(max_attempts=5)
+    def upload_poster(movie_id, name): ...
+
+    upload_poster.enqueue(movie_id=movie.pk, name=name, dedupe_key=f"poster:{movie.pk}")
+
+enqueue() writes a Task row in the caller's transaction, so a task for a
+row that gets rolled back never runs. How the row gets run depends on
+settings.TASKS_MODE:
+
+- "thread" (the default): an in-process thread pool picks the task up
+  after commit. A retry waits on a timer rather than in a pool thread, so
+  a task backing off doesn't hold up the others. When a process starts
+  its pool it also runs whatever an earlier process left queued, so a
+  restart doesn't strand tasks.
+- "worker": `manage.py run_tasks` polls the table. Use this only where
+  such a worker is actually deployed.
+- "sync": the task runs inline after commit. Use this in tests.
+
+A failed attempt is retried with exponential backoff until max_attempts,
+then left as "failed" with its traceback for `manage.py task_queue` to
+show. Only one queued task may hold a given dedupe_key; enqueueing a
+duplicate returns the one already waiting.
+"""
+import importlib
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=10)
+
+TASKS = {}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# =================== DEFINING AND QUEUEING ===================
+
+@dataclass(frozen=True)
+class TaskDefinition:
+    name: str
+    func: object
+    max_attempts: int = 3
+    retry_delay: float = 10.0  # seconds before the first retry; doubles after each failure
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, dedupe_key=None, delay=0, **kwargs):
+        """Queue a run with `kwargs` (which must be JSON-serialisable); returns the Task row."""
+        try:
+            with transaction.atomic():
+                queued = Task.objects.create(
+                    name=self.name,
+                    kwargs=kwargs,
+                    dedupe_key=dedupe_key,
+                    max_attempts=self.max_attempts,
+                    run_after=timezone.now() + timedelta(seconds=delay),
+                )
+        except IntegrityError:
+            existing = Task.objects.filter(dedupe_key=dedupe_key, status=Task.QUEUED).first()
+            if existing is not None:
+                return existing
+            raise
+        _dispatch(queued.pk)
+        return queued
+
+
+def task(func=None, *, max_attempts=3, retry_delay=10.0):
+    """Register `func` as a task, named after its module and function."""
+    def register(func):
+        definition = TaskDefinition(f"{func.__module__}.{func.__name__}", func, max_attempts, retry_delay)
+        TASKS[definition.name] = definition
+        return definition
+    return register(func) if func is not None else register
+
+
+def get_definition(name):
+    """The registered task called `name`, importing its module on first use."""
+    if name not in TASKS:
+        module = name.rpartition(".")[0]
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    return TASKS.get(name)
+
+
+def _dispatch(task_id):
+    mode = getattr(settings, "TASKS_MODE", "worker")
+    if mode == "thread":
+        transaction.on_commit(lambda: _thread_pool().submit(_run_in_thread, task_id))
+    elif mode == "sync":
+        transaction.on_commit(lambda: run_until_settled(task_id, wait=False))
+
+
+def _thread_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "TASKS_THREADS", 4), thread_name_prefix="tasks",
+            )
+            _pool.submit(_run_backlog)
+        return _pool
+
+
+def _run_backlog():
+    """Run the tasks queued before this process started (in thread mode nothing else would)."""
+    try:
+        requeue_stale()
+        backlog = Task.objects.filter(status=Task.QUEUED).order_by("run_after", "pk").values_list("pk", flat=True)
+        for task_id in list(backlog):
+            _run_in_thread(task_id)
+    except Exception:
+        logger.exception("Running the task backlog failed")
+    finally:
+        close_old_connections()
+
+
+def _run_in_thread(task_id):
+    """One attempt if the task is due; a retry, or a task not due yet, is handed to a timer."""
+    try:
+        queued = claim([task_id])
+        if queued is None or execute(queued) == Task.QUEUED:
+            _submit_when_due(task_id)
+    except Exception:
+        logger.exception("Task %s crashed its thread", task_id)
+    finally:
+        close_old_connections()
+
+
+def _submit_when_due(task_id):
+    run_after = Task.objects.filter(pk=task_id, status=Task.QUEUED).values_list("run_after", flat=True).first()
+    if run_after is None:
+        return  # done, failed, or claimed by someone else
+    delay = max(0.0, (run_after - timezone.now()).total_seconds())
+    timer = threading.Timer(delay, lambda: _thread_pool().submit(_run_in_thread, task_id))
+    timer.daemon = True  # whatever is still waiting at exit is run by the next process's backlog
+    timer.start()
+
+
+# =================== RUNNING ===================
+
+def claim(task_ids, due_only=True):
+    """Mark the first of `task_ids` that is still queued (and due) as running and return it, or None."""
+    now = timezone.now()
+    queued = Task.objects.filter(status=Task.QUEUED)
+    if due_only:
+        queued = queued.filter(run_after__lte=now)
+    for task_id in task_ids:
+        claimed = queued.filter(pk=task_id).update(
+            status=Task.RUNNING, locked_at=now, attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def claim_next(batch=10):
+    due = (
+        Task.objects.filter(status=Task.QUEUED, run_after__lte=timezone.now())
+        .order_by("run_after", "pk")
+        .values_list("pk", flat=True)[:batch]
+    )
+    return claim(list(due))
+
+
+def execute(queued):
+    """Run a claimed task and record the outcome; returns its new status."""
+    definition = get_definition(queued.name)
+    started = time.perf_counter()
+    try:
+        if definition is None:
+            raise LookupError(f"No task named {queued.name!r}")
+        definition.func(**queued.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Task %s (%s) failed on attempt %s", queued.pk, queued.name, queued.attempts)
+        if definition is not None and queued.attempts < queued.max_attempts:
+            delay = definition.retry_delay * 2 ** (queued.attempts - 1)
+            if _requeue(queued.pk, timezone.now() + timedelta(seconds=delay), error):
+                return Task.QUEUED
+        _finish(queued.pk, Task.FAILED, error)
+        return Task.FAILED
+    _finish(queued.pk, Task.DONE)
+    logger.info("Task %s (%s) done in %.0f ms", queued.pk, queued.name, (time.perf_counter() - started) * 1000)
+    return Task.DONE
+
+
+def _requeue(task_id, run_after, error):
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task_id).update(
+                status=Task.QUEUED, run_after=run_after, locked_at=None, last_error=error,
+            )
+        return True
+    except IntegrityError:
+        return False  # a newer task with the same dedupe key is already queued and will do the work
+
+
+def _finish(task_id, status, error=""):
+    Task.objects.filter(pk=task_id).update(
+        status=status, locked_at=None, last_error=error, finished_at=timezone.now(),
+    )
+
+
+def run_until_settled(task_id, wait=True):
+    """
+    Run one task until it is done or failed, sleeping through its retry
+    delays (or with `wait` False, retrying straight away).
+    """
+    while True:
+        queued = claim([task_id], due_only=wait)
+        if queued is None:
+            current = Task.objects.filter(pk=task_id).values_list("status", "run_after").first()
+            if current is None or current[0] != Task.QUEUED:
+                return
+            time.sleep(max(0.0, (current[1] - timezone.now()).total_seconds()))
+            continue
+        if execute(queued) != Task.QUEUED:
+            return
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """Put tasks whose worker died mid-run back in the queue; returns how many."""
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=timezone.now() - older_than)
+    count = 0
+    for task_id in stale.values_list("pk", flat=True):
+        if _requeue(task_id, timezone.now(), "Worker stopped while running this task"):
+            count += 1
+        else:
+            _finish(task_id, Task.FAILED, "Worker stopped while running this task")
+    return count
+
+
+# =================== BUILT-IN TASKS ===================
+
+@task(max_attempts=5, retry_delay=30.0)
+def send_email(subject, message, recipient_list, from_email=None):
+    from django.core.mail import send_mail
+
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list=recipient_list,
+    )
@@ -0,0 +1,15 @@
+from django import template
+
+from movies.avatars import avatar_url as processed_avatar_url
+
+register = template.Library()
+
+
+@register.filter
+def avatar_url(avatar, size="small"):
+    """
+    {{ profile.avatar|avatar_url:"medium" }} — URL of a processed avatar
+    size, the original until it is processed, or "" when there is no
+    avatar (templates show the placeholder).
+    """
+    return processed_avatar_url(getattr(avatar, "name", avatar), size)
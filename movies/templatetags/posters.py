@@ -0,0 +1,46 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from movies.renditions import FORMATS, MIME_TYPES, SIZES, PosterRenditions, get_renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def poster_picture(poster, rendition="card", alt="", css_class="", loading="lazy", fallback=""):
+    """
+    <picture> for a poster: AVIF and WebP sources plus a JPEG <img>, each
+    with a srcset over every rendition width and `sizes` for `rendition`.
+
+    {% poster_picture movie.poster "card" alt=movie.title css_class="movie-poster" fallback=movie.poster_url %}
+
+    `poster` may be a PosterRenditions (as on MovieCard) or the model's
+    poster field value. Without renditions a plain <img> of `fallback`
+    (or the field's own URL) is rendered.
+    """
+    if isinstance(poster, PosterRenditions):
+        renditions = poster
+    else:
+        renditions = get_renditions(poster)
+        if not fallback and getattr(poster, "public_id", None):
+            fallback = poster.url
+    if not renditions:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}">', fallback or "", alt, css_class, loading)
+
+    sizes = SIZES.get(rendition, SIZES["card"])
+    *preferred, base_format = FORMATS
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], renditions.srcset(fmt), sizes) for fmt in preferred if renditions.srcset(fmt)),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}"></picture>',
+        sources,
+        renditions.url(rendition, base_format),
+        renditions.srcset(base_format),
+        sizes,
+        alt,
+        css_class,
+        loading,
+    )
@@ -1,3 +1,1443 @@
-from django.test import TestCase
+"""
+Query budgets for every URL in movies/urls.py.
 
-# Create your tests here.
+Each URL name is requested as an anonymous visitor, a signed-in user and a
+staff user, with 1, 10 and 100 rows in everything a page can list
+(movies, genres, reviews, wishlist entries, users, request profiles). The
+tests fail if:
+
+- a URL name has no row in query_budgets.csv (or a row names a URL that
+  no longer exists),
+- the number of queries grows with the number of rows, which is how an
+  N+1 in a view or template shows up,
+- the query count or the render time at 100 rows is over its budget.
+
+Requests run with empty caches, so the budgets cover the uncached path.
+To record fresh measurements (budgets of existing rows are kept; new rows
+get budgets from what was measured), run
+
+    UPDATE_QUERY_BUDGETS=1 python manage.py test movies
+
+StartupTests checks that a cold start leaves the lazily imported modules
+(profile_startup.LAZY_MODULES) alone; the time budget itself is left to
+`manage.py profile_startup`, since it depends on the machine.
+
+The TestCases after those cover the pieces whose bugs don't show up as an
+error page: rating aggregates, pagination cursors, OTPs and the like.
+"""
+import base64
+import csv
+import datetime
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from allauth.socialaccount.models import SocialApp
+from PIL import Image
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import counters, embeds, frontpage, maintenance, otp, tasks, urls
+from .avatars import AvatarUnreadable, avatar_url, process_avatar
+from .cache import TieredCache, TTLCache, tiered
+from .catalog import CatalogImporter
+from .checks import cache_tables, shared_cache
+from .analytics import rebuild_analytics
+from .models import (
+    DailyReviewStat, Genre, GenreMovieStat, Movie, RequestProfile, Review, Task, UserProfile, UserReviewStat,
+)
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .posters import LocalPosterStorage, PosterMigration, local_poster_jobs, upload_poster
+from .renditions import EMPTY_TIMEOUT, RENDITIONS, SIZES as POSTER_SIZES, get_renditions
+from .search import match_expression, search_movies, search_terms
+from .tasks import send_email
+from .templatetags.posters import poster_picture
+from .wishlist import get_wishlist_ids
+
+BUDGETS_FILE = Path(__file__).with_name("query_budgets.csv")
+BUDGET_COLUMNS = ("url_name", "user", "max_queries", "max_ms", "measured_queries", "measured_ms")
+USERS = ("anonymous", "user", "staff")
+SIZES = (1, 10, 100)
+TIMING_RUNS = 3
+# A listing may run one more query once it has more than a page of rows
+# (movie_list counts the total for its pager). An N+1 adds one per row.
+PAGINATION_ALLOWANCE = 1
+UPDATE = os.getenv("UPDATE_QUERY_BUDGETS") == "1"
+
+
+def load_budgets():
+    if UPDATE and not BUDGETS_FILE.exists():
+        return {}
+    with open(BUDGETS_FILE, newline="") as fh:
+        return {(row["url_name"], row["user"]): row for row in csv.DictReader(fh)}
+
+
+def save_budgets(budgets):
+    with open(BUDGETS_FILE, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, BUDGET_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        for key in sorted(budgets):
+            writer.writerow(budgets[key])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    PERF_SAMPLE_RATE=0,
+    PERF_SLOW_MS=None,
+    POSTER_RENDITIONS_BACKEND="local",
+    TASKS_MODE="sync",
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user("member", "member@example.com", "pw")
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "pw", is_staff=True)
+        cls.movies, cls.genres, cls.reviewers = [], [], []
+        # signup.html links to Google sign-in, which needs a configured app
+        google = SocialApp.objects.create(provider="google", name="Google", client_id="test", secret="test")
+        google.sites.add(Site.objects.get_current())
+
+    def grow(self, size):
+        """Add rows until every listable collection holds `size` of them."""
+        while len(self.genres) < size:
+            self.genres.append(Genre.objects.create(name=f"Genre {len(self.genres)}"))
+        while len(self.movies) < size:
+            index = len(self.movies)
+            movie = Movie.objects.create(
+                title=f"Movie {index}",
+                release_date=datetime.date(2000, 1, 1) + datetime.timedelta(days=index),
+                synopsis="A synopsis long enough to be cut short on the cards. " * 5,
+                poster="",
+                telegram_link=f"https://t.me/webzmovies/{index}",
+            )
+            movie.genre.add(self.genres[0], self.genres[index])
+            # The member reviews and wishlists every movie
+            Review.objects.create(user=self.member, movie=movie, rating=index % 5 + 1, comment="Fine.")
+            UserProfile.objects.get_or_create(user=self.member)[0].wishlist.add(movie)
+            self.movies.append(movie)
+        # ...and the first movie gets a review from every other user
+        while len(self.reviewers) < size:
+            reviewer = User.objects.create_user(f"reviewer{len(self.reviewers)}", password="pw")
+            Review.objects.create(user=reviewer, movie=self.movies[0], rating=4, comment="Good.")
+            self.reviewers.append(reviewer)
+        while RequestProfile.objects.count() < size:
+            RequestProfile.objects.create(
+                method="GET", path="/movies/", view_name="movies:movie_list", status_code=200, sampled=True,
+                duration_ms=12.5, queries=[{"sql": "SELECT 1", "ms": 0.1, "site": "movies/views.py:1 in f"}],
+            )
+
+    def url(self, name):
+        movie, genre = self.movies[0], self.genres[0]
+        args = {
+            "movie_detail": [movie.pk],
+            "add_to_wishlist": [movie.pk],
+            "admin_edit_movie": [movie.pk],
+            "admin_movie_delete": [movie.pk],
+            "admin_genre_edit": [genre.pk],
+            "admin_genre_delete": [genre.pk],
+            "admin_delete_review": [Review.objects.filter(movie=movie).order_by("pk").first().pk],
+            "admin_user_edit": [self.member.pk],
+            "admin_user_delete": [self.member.pk],
+            "admin_perf_detail": [RequestProfile.objects.order_by("pk").first().pk],
+            "password_reset_confirm": ["MQ", "set-password"],
+            "api_movie_detail": [movie.pk],
+            "api_review_list": [movie.pk],
+        }
+        return reverse(f"movies:{name}", args=args.get(name, []))
+
+    def request(self, url, user):
+        client = Client()
+        if user == "user":
+            client.force_login(self.member)
+        elif user == "staff":
+            client.force_login(self.staff)
+        cache.clear()
+        tiered.l1.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        self.assertLess(response.status_code, 500, f"{url} answered {response.status_code}")
+        return len(queries), elapsed
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        expected = {(name, user) for name in names for user in USERS}
+        budgets = load_budgets()
+        self.assertEqual(sorted(expected - budgets.keys()), [], "URLs without a budget in query_budgets.csv")
+        self.assertEqual(sorted(budgets.keys() - expected), [], "Budgets for URLs that no longer exist")
+
+    def test_query_counts_are_flat_and_within_budget(self):
+        names = sorted(pattern.name for pattern in urls.urlpatterns)
+        counts = {}
+        for size in SIZES:
+            self.grow(size)
+            for name in names:
+                for user in USERS:
+                    counts.setdefault((name, user), []).append(self.request(self.url(name), user)[0])
+
+        budgets = load_budgets()
+        updated = {}
+        for (name, user), by_size in counts.items():
+            with self.subTest(url_name=name, user=user):
+                self.assertLessEqual(
+                    max(by_size) - min(by_size), PAGINATION_ALLOWANCE,
+                    f"Query count grows with the rows rendered: {dict(zip(SIZES, by_size))}",
+                )
+                elapsed = min(self.request(self.url(name), user)[1] for _ in range(TIMING_RUNS))
+                measured = {"measured_queries": by_size[-1], "measured_ms": f"{elapsed:.1f}"}
+                budget = budgets.get((name, user))
+                if UPDATE:
+                    updated[name, user] = {
+                        "url_name": name,
+                        "user": user,
+                        "max_queries": budget["max_queries"] if budget else by_size[-1],
+                        # Generous: the point is to catch a page getting several times slower
+                        "max_ms": budget["max_ms"] if budget else max(250, math.ceil(elapsed * 5 / 50) * 50),
+                        **measured,
+                    }
+                    continue
+                self.assertIsNotNone(budget, "No budget in query_budgets.csv")
+                self.assertLessEqual(by_size[-1], int(budget["max_queries"]), "Over the query budget")
+                self.assertLessEqual(elapsed, float(budget["max_ms"]), "Over the render time budget")
+
+        if UPDATE:
+            save_budgets(updated)
+
+
+class StartupTests(SimpleTestCase):
+    def test_cold_start_leaves_lazy_modules_unloaded(self):
+        # profile_startup raises CommandError if any of them was imported
+        out = StringIO()
+        call_command("profile_startup", runs=1, top=5, budget_ms=0, stdout=out)
+        self.assertIn("Cold start", out.getvalue())
+
+
+@override_settings(TASKS_MODE="sync")
+class RatingAggregateTests(TestCase):
+    """Movie's stored rating aggregates follow every review write, and only those."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.movie = Movie.objects.create(
+            title="Heat", release_date=datetime.date(1995, 12, 15), synopsis="", poster="",
+            telegram_link="https://t.me/webzmovies/1",
+        )
+
+    def assertAggregates(self, count, total, histogram):
+        movie = Movie.objects.get(pk=self.movie.pk)
+        self.assertEqual((movie.rating_count, movie.rating_sum), (count, total))
+        self.assertEqual(dict(movie.rating_histogram), {star: histogram.get(star, 0) for star in range(1, 6)})
+        self.assertAlmostEqual(movie.average_rating, total / count if count else 0)
+
+    def test_create_edit_and_delete(self):
+        review = Review.objects.create(user=self.alice, movie=self.movie, rating=5, comment="")
+        Review.objects.create(user=self.bob, movie=self.movie, rating=2, comment="")
+        self.assertAggregates(2, 7, {5: 1, 2: 1})
+
+        review.rating = 3
+        review.save()
+        self.assertAggregates(2, 5, {3: 1, 2: 1})
+
+        review.delete()
+        self.assertAggregates(1, 2, {2: 1})
+        Review.objects.all().delete()
+        self.assertAggregates(0, 0, {})
+
+    def test_saving_a_stale_instance_keeps_the_aggregates(self):
+        stale = Movie.objects.get(pk=self.movie.pk)
+        Review.objects.create(user=self.alice, movie=self.movie, rating=5, comment="")
+
+        stale.title = "Heat (1995)"
+        stale.save()
+        self.assertAggregates(1, 5, {5: 1})
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).title, "Heat (1995)")
+
+    def test_rebuild_ratings_check(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=4, comment="")
+        call_command("rebuild_ratings", "--check", stdout=StringIO())
+
+        Movie.objects.filter(pk=self.movie.pk).update(rating_count=3)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ratings", "--check", stdout=StringIO())
+        call_command("rebuild_ratings", stdout=StringIO())
+        call_command("rebuild_ratings", "--check", stdout=StringIO())
+        self.assertAggregates(1, 4, {4: 1})
+
+
+@override_settings(TASKS_MODE="sync")
+class TaskQueueTests(TestCase):
+    """Background tasks report lost work instead of finishing quietly."""
+
+    def test_upload_poster_fails_when_the_stash_is_missing(self):
+        with self.assertLogs("movies.tasks", "WARNING"), self.captureOnCommitCallbacks(execute=True):
+            queued = upload_poster.enqueue(movie_id=1, name="poster_uploads/gone.jpg")
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIn("FileNotFoundError", queued.last_error)
+
+    @override_settings(TASKS_MODE="worker")
+    def test_backlog_left_by_another_process_is_run(self):
+        queued = send_email.enqueue(subject="Hi", message="Hello", recipient_list=["a@example.com"])
+        tasks._run_backlog()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.DONE)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+    @override_settings(TASKS_MODE="worker")
+    def test_thread_mode_retries_on_a_timer(self):
+        queued = upload_poster.enqueue(movie_id=1, name="poster_uploads/gone.jpg")
+        with self.assertLogs("movies.tasks", "WARNING"), mock.patch("movies.tasks.threading.Timer") as timer:
+            started = time.monotonic()
+            tasks._run_in_thread(queued.pk)
+        self.assertLess(time.monotonic() - started, 5)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.QUEUED, 1))
+        delay = timer.call_args.args[0]
+        self.assertAlmostEqual(delay, upload_poster.retry_delay, delta=5)
+        self.assertTrue(timer.return_value.start.called)
+
+        # Not due yet: handed straight back to a timer without an attempt
+        with mock.patch("movies.tasks.threading.Timer") as timer:
+            tasks._run_in_thread(queued.pk)
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 1)
+        self.assertTrue(timer.return_value.start.called)
+
+
+class AvatarTests(TestCase):
+    """Processing never throws away an avatar it can't decode."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, TASKS_MODE="sync"))
+        self.user = User.objects.create_user("avatar", password="pw")
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def set_avatar(self, content):
+        name = default_storage.save("avatars/legacy.heic", ContentFile(content))
+        UserProfile.objects.filter(pk=self.profile.pk).update(avatar=name)
+        return name
+
+    def test_unreadable_original_is_kept(self):
+        name = self.set_avatar(b"not an image Pillow knows")
+        with self.assertRaises(AvatarUnreadable):
+            process_avatar(self.profile.pk, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(UserProfile.objects.get(pk=self.profile.pk).avatar.name, name)
+
+        out = StringIO()
+        call_command("process_avatars", stdout=out)
+        self.assertIn("original kept", out.getvalue())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_unprocessed_avatar_falls_back_to_the_original(self):
+        name = self.set_avatar(b"legacy")
+        self.assertEqual(avatar_url(name, "medium"), default_storage.url(name))
+        self.assertEqual(avatar_url("", "medium"), "")
+        self.assertEqual(avatar_url("avatars/7/abc123-240.webp", "small"), default_storage.url("avatars/7/abc123-80.webp"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TieredCacheTests(TestCase):
+    """The catalog cache's failure paths and keys."""
+
+    def setUp(self):
+        cache.clear()
+        tiered.l1.clear()
+
+    def test_waiter_computes_when_the_leader_is_stuck(self):
+        stuck = TieredCache(lock_timeout=0.05)
+        release = threading.Event()
+        leader = threading.Thread(target=stuck.get_or_set, args=("slow", lambda: release.wait(5) and "leader"))
+        leader.start()
+        try:
+            while "slow" not in stuck._inflight:
+                time.sleep(0.001)
+            with self.assertLogs("movies.cache", "WARNING"):
+                self.assertEqual(stuck.get_or_set("slow", lambda: "waiter"), "waiter")
+        finally:
+            release.set()
+            leader.join()
+
+    def test_catalog_page_keys_ignore_spelling(self):
+        Movie.objects.create(
+            title="Heat", release_date=datetime.date(1995, 12, 15), synopsis="", poster="",
+            telegram_link="https://t.me/webzmovies/1",
+        )
+        client = Client()
+        client.get(reverse("movies:movie_list"), {"search": "Heat ", "genre": " Crime"})
+        computes = tiered.stats()["computes"]
+        client.get(reverse("movies:movie_list"), {"search": "heat", "genre": "crime", "cursor": "%%junk"})
+        self.assertEqual(tiered.stats()["computes"], computes)
+
+    @override_settings(DEBUG=False)
+    def test_production_requires_a_shared_cache(self):
+        self.assertEqual([error.id for error in shared_cache(None)], ["movies.E001"])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                                                   "LOCATION": "movies_cache"}}):
+            self.assertEqual(shared_cache(None), [])
+
+    def test_missing_cache_table_is_reported(self):
+        for table, expected in (("movies_cache", []), ("no_such_cache", ["movies.W002"])):
+            with self.subTest(table=table), override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": table,
+            }}):
+                self.assertEqual([warning.id for warning in cache_tables(None, databases=["default"])], expected)
+                self.assertEqual(cache_tables(None), [])
+
+
+class MovieDetailFragmentTests(TestCase):
+    """The cached review list is the same for every visitor; owner controls live outside it."""
+
+    def test_edit_links_only_reach_the_author(self):
+        author = User.objects.create_user("author", password="pw")
+        reader = User.objects.create_user("reader", password="pw")
+        movie = Movie.objects.create(
+            title="Heat", release_date=datetime.date(1995, 12, 15), synopsis="", poster="",
+            telegram_link="https://t.me/webzmovies/1",
+        )
+        Review.objects.create(user=author, movie=movie, rating=5, comment="Great heist.")
+        url = reverse("movies:movie_detail", args=[movie.pk])
+
+        client = Client()
+        client.force_login(author)
+        self.assertContains(client.get(url), 'class="edit-review"', count=1)
+        # Same version, so the reader gets the fragment the author's request cached
+        client.force_login(reader)
+        response = client.get(url)
+        self.assertContains(response, "Great heist.")
+        self.assertNotContains(response, 'class="edit-review"')
+        self.assertNotContains(response, "data-user-id")
+
+
+def make_movie(title="Heat", **fields):
+    defaults = {
+        "release_date": datetime.date(1995, 12, 15), "synopsis": "", "poster": "",
+        "telegram_link": "https://t.me/webzmovies/1",
+    }
+    return Movie.objects.create(title=title, **{**defaults, **fields})
+
+
+def raw_poster(movie):
+    return Movie.objects.filter(pk=movie.pk).annotate(
+        raw=Cast("poster", output_field=CharField())).values_list("raw", flat=True).get()
+
+
+class CountingStorage(LocalPosterStorage):
+    """LocalPosterStorage that fails the first `failures` uploads of each file and counts the rest."""
+
+    def __init__(self, target, failures=0):
+        super().__init__(target)
+        self.failures = failures
+        self.attempts = Counter()
+
+    def upload(self, path):
+        self.attempts[path] += 1
+        if self.attempts[path] <= self.failures:
+            raise ConnectionError("flaky")
+        return super().upload(path)
+
+
+@override_settings(TASKS_MODE="sync")
+class PosterMigrationTests(TestCase):
+    """Poster uploads, run against LocalPosterStorage instead of Cloudinary."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media = os.path.join(directory.name, "media")
+        self.target = os.path.join(directory.name, "uploaded")
+        self.checkpoint = os.path.join(directory.name, "posters.ckpt")
+        os.makedirs(os.path.join(self.media, "posters"))
+        self.movies = []
+        for index in range(3):
+            name = f"posters/{index}.jpg"
+            with open(os.path.join(self.media, name), "wb") as fh:
+                fh.write(b"jpeg")
+            self.movies.append(make_movie(f"Movie {index}", poster=name))
+        self.gone = make_movie("Missing file", poster="posters/gone.jpg")
+
+    def run_migration(self, storage, **options):
+        jobs, missing = local_poster_jobs(self.media)
+        migration = PosterMigration(storage, workers=2, batch_size=2, checkpoint=self.checkpoint, backoff=0, **options)
+        return migration, migration.run(jobs), missing
+
+    def test_uploads_and_saves_every_reference(self):
+        migration, updated, missing = self.run_migration(LocalPosterStorage(self.target))
+        self.assertEqual(updated, 3)
+        self.assertEqual([job.movie_id for job in missing], [self.gone.pk])
+        for index, movie in enumerate(self.movies):
+            self.assertEqual(raw_poster(movie), f"image/upload/posters/{index}.jpg")
+            self.assertTrue(os.path.exists(os.path.join(self.target, f"{index}.jpg")))
+
+    def test_retries_flaky_uploads_and_reports_lasting_failures(self):
+        migration, updated, _ = self.run_migration(CountingStorage(self.target, failures=2), retries=2)
+        self.assertEqual((updated, migration.failed), (3, []))
+        self.assertEqual(set(migration.storage.attempts.values()), {3})
+
+        for index, movie in enumerate(self.movies):
+            Movie.objects.filter(pk=movie.pk).update(poster=f"posters/{index}.jpg")
+        os.remove(self.checkpoint)
+        migration, updated, _ = self.run_migration(CountingStorage(self.target, failures=5), retries=1)
+        self.assertEqual(updated, 0)
+        self.assertEqual(len(migration.failed), 3)
+
+    def test_resumes_from_the_checkpoint_without_uploading_again(self):
+        first = self.movies[0]
+        with open(self.checkpoint, "w") as fh:
+            fh.write(json.dumps({"movie_id": first.pk, "reference": "image/upload/posters/done.jpg"}) + "\n")
+        storage = CountingStorage(self.target)
+        migration, updated, _ = self.run_migration(storage)
+        self.assertEqual((updated, migration.resumed), (3, 1))
+        self.assertEqual(raw_poster(first), "image/upload/posters/done.jpg")
+        self.assertNotIn(os.path.join(self.media, "posters/0.jpg"), storage.attempts)
+
+    def test_command_with_local_storage(self):
+        out = StringIO()
+        call_command(
+            "migrate_posters_to_cloudinary", storage="movies.posters.LocalPosterStorage", target=self.target,
+            media_root=self.media, checkpoint=self.checkpoint, stdout=out,
+        )
+        self.assertIn("Moved 3 poster(s)", out.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+@override_settings(POSTER_RENDITIONS_BACKEND="local", TASKS_MODE="sync")
+class PosterRenditionTests(TestCase):
+    """Renditions rendered locally with Pillow, so posters work offline and in tests."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, MEDIA_URL="/media/"))
+        self.media = media.name
+        cache.clear()
+
+    def poster_file(self, name, content=None):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if content is None:
+            Image.new("RGB", (800, 1200), "navy").save(path, format="JPEG")
+        else:
+            with open(path, "wb") as fh:
+                fh.write(content)
+        return name
+
+    def test_local_backend_renders_every_width(self):
+        movie = make_movie(poster=self.poster_file("posters/heat.jpg"))
+        renditions = get_renditions(raw_poster(movie), render=True)
+        for name, width in RENDITIONS.items():
+            url = renditions.url(name, "jpg")
+            self.assertEqual(url, f"/media/renditions/posters/heat-{name}.jpg")
+            with Image.open(os.path.join(self.media, url.removeprefix("/media/"))) as image:
+                self.assertEqual(image.width, width)
+        self.assertIn("640w", renditions.srcset("jpg"))
+
+    def test_picture_markup_and_fallback(self):
+        good = make_movie(poster=self.poster_file("posters/heat.jpg"))
+        get_renditions(raw_poster(good), render=True)
+        html = poster_picture(raw_poster(good), "detail", alt="Heat")
+        self.assertIn("<picture>", html)
+        self.assertIn(f'sizes="{POSTER_SIZES["detail"]}"', html)
+        self.assertIn('type="image/webp"', html)
+
+        broken = make_movie(poster=self.poster_file("posters/broken.jpg", b"not a jpeg"))
+        self.assertFalse(get_renditions(raw_poster(broken)))
+        html = poster_picture(raw_poster(broken), fallback="/media/posters/broken.jpg")
+        self.assertNotIn("<picture>", html)
+        self.assertIn('src="/media/posters/broken.jpg"', html)
+
+    def test_generate_poster_renditions(self):
+        make_movie(poster=self.poster_file("posters/heat.jpg"))
+        make_movie("Gone", poster="posters/gone.jpg")
+        out = StringIO()
+        call_command("generate_poster_renditions", stdout=out)
+        self.assertIn("Renditions ready for 1 of 2 poster(s)", out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.media, "renditions/posters/heat-card.jpg")))
+
+    @override_settings(TASKS_MODE="sync")
+    def test_pages_queue_renders_instead_of_rendering(self):
+        movie = make_movie(poster=self.poster_file("posters/heat.jpg"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertFalse(get_renditions(raw_poster(movie)))
+            self.assertFalse(get_renditions(raw_poster(movie)))
+        self.assertFalse(os.path.exists(os.path.join(self.media, "renditions")))
+        self.assertEqual(Task.objects.filter(name="movies.renditions.render_renditions").count(), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Task.objects.get(name="movies.renditions.render_renditions").status, Task.DONE)
+        self.assertEqual(get_renditions(raw_poster(movie)).url("card", "jpg"), "/media/renditions/posters/heat-card.jpg")
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_missing_originals_are_looked_at_again_soon(self):
+        movie = make_movie(poster="posters/late.jpg")
+        self.assertFalse(get_renditions(raw_poster(movie), render=True))
+        self.poster_file("posters/late.jpg")
+        self.assertFalse(get_renditions(raw_poster(movie), render=True))
+        with mock.patch("time.time", return_value=time.time() + EMPTY_TIMEOUT + 1):
+            self.assertTrue(get_renditions(raw_poster(movie), render=True))
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursors walk every row exactly once, both ways, and bad ones fall back to the first page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Three release dates for eleven movies, so most sort keys tie
+        for index in range(11):
+            make_movie(f"Movie {index}", release_date=datetime.date(2000, 1, 1 + index % 3))
+
+    def paginator(self, ordering=("-release_date", "-id")):
+        return KeysetPaginator(Movie.objects.all(), 4, ordering)
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_forward_walk_matches_the_ordering_despite_ties(self):
+        for ordering in (("-release_date", "-id"), ("release_date", "id"), ("title", "id")):
+            with self.subTest(ordering=ordering):
+                pages = self.walk(self.paginator(ordering))
+                walked = [movie.pk for page in pages for movie in page]
+                self.assertEqual(walked, list(Movie.objects.order_by(*ordering).values_list("pk", flat=True)))
+                self.assertEqual([len(page) for page in pages], [4, 4, 3])
+                self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_the_same_page(self):
+        paginator = self.paginator()
+        pages = self.walk(paginator)
+        for earlier, later in zip(pages, pages[1:]):
+            back = paginator.get_page(later.previous_cursor)
+            self.assertEqual([movie.pk for movie in back], [movie.pk for movie in earlier])
+            self.assertTrue(back.has_next())
+
+    def test_round_trip(self):
+        cursor = encode_cursor("next", [datetime.date(2000, 1, 2), 7])
+        self.assertEqual(decode_cursor(cursor), ("next", ["2000-01-02", 7]))
+
+    def test_tampered_cursors_give_the_first_page(self):
+        first = [movie.pk for movie in self.paginator().get_page(None)]
+        tampered = [
+            "%%%not-base64",
+            encode_cursor("sideways", ["2000-01-02", 7]),
+            encode_cursor("next", ["2000-01-02"]),  # too few keys
+            encode_cursor("next", {"release_date": "2000-01-02"}),
+            base64.urlsafe_b64encode(b"[1, 2").decode(),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor=cursor):
+                self.assertEqual([movie.pk for movie in self.paginator().get_page(cursor)], first)
+        response = Client().get(reverse("movies:movie_list"), {"cursor": tampered[0]})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    TASKS_MODE="sync",
+)
+class OTPTests(TestCase):
+    """Signup codes: single use, expiring, a bounded number of guesses, throttled resends."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_code_verifies_once(self):
+        challenge_id, code = otp.issue("a@example.com", "5550100")
+        self.assertEqual(otp.verify(challenge_id, f" {code} "), otp.Challenge("a@example.com", "5550100"))
+        with self.assertRaisesMessage(otp.OTPError, "expired"):
+            otp.verify(challenge_id, code)
+
+    def test_code_expires(self):
+        challenge_id, code = otp.issue("a@example.com", "5550100")
+        later = time.time() + otp.OTP_TTL + 1
+        with mock.patch("time.time", return_value=later), self.assertRaisesMessage(otp.OTPError, "expired"):
+            otp.verify(challenge_id, code)
+
+    def test_attempt_limit(self):
+        challenge_id, code = otp.issue("a@example.com", "5550100")
+        wrong = f"{(int(code) + 1) % 10 ** otp.CODE_DIGITS:0{otp.CODE_DIGITS}d}"
+        for _ in range(otp.MAX_ATTEMPTS):
+            with self.assertRaisesMessage(otp.OTPError, "Invalid OTP"):
+                otp.verify(challenge_id, wrong)
+        with self.assertRaisesMessage(otp.OTPError, "Too many wrong codes"):
+            otp.verify(challenge_id, code)
+        with self.assertRaisesMessage(otp.OTPError, "expired"):
+            otp.verify(challenge_id, code)
+
+    def test_token_bucket(self):
+        capacity, refill = otp.THROTTLES["send-email"]
+        start = 1_000_000 * capacity * refill - 1  # a second before a fixed window would have reset
+        for _ in range(capacity):
+            self.assertEqual(otp.take_token("send-email", "a@example.com", now=start), 0)
+        # No fresh allowance at a window boundary: one token comes back per `refill` seconds
+        self.assertEqual(otp.take_token("send-email", "a@example.com", now=start + 2), refill - 2)
+        self.assertEqual(otp.take_token("send-email", "A@example.com", now=start + 10), refill - 10)
+        self.assertEqual(otp.take_token("send-email", "b@example.com", now=start + 10), 0)
+        self.assertEqual(otp.take_token("send-email", "a@example.com", now=start + refill), 0)
+        self.assertEqual(otp.take_token("send-email", "a@example.com", now=start + refill), refill)
+        for _ in range(capacity):
+            self.assertEqual(otp.take_token("send-email", "a@example.com", now=start + 10 * capacity * refill), 0)
+
+    def test_held_bucket_lock_turns_requests_away(self):
+        with mock.patch.object(otp, "LOCK_WAIT", 0):
+            otp.take_token("send-ip", "10.0.0.1")
+            key = f"movies:otp:bucket:send-ip:{hashlib.sha1(b'10.0.0.1').hexdigest()}:lock"
+            cache.add(key, 1)
+            self.assertEqual(otp.take_token("send-ip", "10.0.0.1"), 1)
+            cache.delete(key)
+            self.assertEqual(otp.take_token("send-ip", "10.0.0.1"), 0)
+
+    def test_signup_flow(self):
+        client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(reverse("movies:phone_signup"), {"phone": "5550100", "email": "a@example.com"})
+        code = mail.outbox[-1].body.rsplit(" ", 1)[-1]
+        self.assertEqual(mail.outbox[-1].to, ["a@example.com"])
+        queued = Task.objects.get(name="movies.otp.send_code")
+        self.assertEqual(list(queued.kwargs), ["challenge_id"])
+        self.assertNotIn(code, json.dumps(queued.kwargs))
+        self.assertIsNone(cache.get(f"movies:otp:outbox:{queued.kwargs['challenge_id']}"))
+        response = client.post(reverse("movies:verify_otp"), {"otp": code})
+        self.assertRedirects(response, reverse("movies:login"), fetch_redirect_response=False)
+        self.assertTrue(User.objects.filter(username="5550100", email="a@example.com").exists())
+
+    def test_send_ip_throttle_answers_429(self):
+        capacity, _ = otp.THROTTLES["send-ip"]
+        client = Client()
+        for _ in range(capacity):
+            client.post(reverse("movies:phone_signup"), {})
+        response = client.post(reverse("movies:phone_signup"), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+
+class ProfileBackfillTests(TestCase):
+    """create_user_profiles fills in exactly the missing profiles and tolerates ones that appear meanwhile."""
+
+    def test_backfill(self):
+        users = [User.objects.create_user(f"user{index}", password="pw") for index in range(5)]
+        UserProfile.objects.filter(user__in=users[1:4]).delete()
+        out = StringIO()
+        call_command("create_user_profiles", stdout=out)
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 5)
+        self.assertFalse(maintenance.users_without_profile().exists())
+
+    def test_only_the_given_ids_and_no_conflicts(self):
+        first, middle, last = (User.objects.create_user(f"user{index}", password="pw") for index in range(3))
+        UserProfile.objects.filter(user__in=[first, middle, last]).delete()
+        # `middle` signed up during the run and already has its profile again
+        UserProfile.objects.create(user=middle)
+        maintenance._insert_profiles([first.pk, middle.pk])
+        self.assertEqual(
+            sorted(UserProfile.objects.filter(user__in=[first, middle, last]).values_list("user_id", flat=True)),
+            [first.pk, middle.pk],
+        )
+
+
+class GenreFilterTests(TestCase):
+    """The API and the movie_list page filter genres the same way."""
+
+    @classmethod
+    def setUpTestData(cls):
+        science_fiction, drama = Genre.objects.create(name="Science Fiction"), Genre.objects.create(name="Drama")
+        cls.alien = make_movie("Alien")
+        cls.alien.genre.add(science_fiction)
+        make_movie("Heat").genre.add(drama)
+
+    def test_api_matches_the_page(self):
+        for genre in ("Science Fiction", "science", " SCI "):
+            with self.subTest(genre=genre):
+                response = Client().get(reverse("movies:api_movie_list"), {"genre": genre, "fields": "id"})
+                self.assertEqual([row["id"] for row in response.json()["results"]], [self.alien.pk])
+                page = Client().get(reverse("movies:movie_list"), {"genre": genre})
+                self.assertEqual([card.id for card in page.context["movies"]], [self.alien.pk])
+
+
+class DashboardCounterTests(TestCase):
+    """The counters follow creates, edits and deletes of the counted models and ignore every other model."""
+
+    def test_counters_stay_in_step(self):
+        user = User.objects.create_user("counted", password="pw")
+        movie = make_movie()
+        genre = Genre.objects.create(name="Crime")
+        review = Review.objects.create(user=user, movie=movie, rating=4, comment="")
+        review.rating = 2
+        review.save()
+        self.assertEqual(counters.reconcile_counters(apply=False), {})
+        review.delete()
+        genre.delete()
+        self.assertEqual(counters.reconcile_counters(apply=False), {})
+
+    def test_other_models_have_no_receivers(self):
+        for model in (Task, RequestProfile, UserProfile):
+            with self.subTest(model=model):
+                self.assertFalse(post_save.has_listeners(model))
+                self.assertFalse(post_delete.has_listeners(model))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PERF_CPROFILE=False,
+)
+class ProfilerTests(TestCase):
+    """Call sites are collected for sampled requests only; slow ones are saved marked without them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_movie()
+        cls.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+
+    def setUp(self):
+        cache.clear()  # a cached catalog page would run no SQL to record
+
+    def capture(self):
+        Client().get(reverse("movies:movie_list"))
+        return RequestProfile.objects.get(path=reverse("movies:movie_list"))
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SLOW_MS=None)
+    def test_sampled_requests_note_call_sites(self):
+        capture = self.capture()
+        self.assertTrue(capture.sampled)
+        self.assertTrue(capture.call_sites)
+        self.assertTrue(capture.queries)
+        self.assertTrue(all(query["site"] for query in capture.queries))
+
+    @override_settings(PERF_SAMPLE_RATE=0, PERF_SLOW_MS=0)
+    def test_slow_requests_skip_the_stack_walk(self):
+        with mock.patch("movies.profiling._call_site") as call_site:
+            capture = self.capture()
+        call_site.assert_not_called()
+        self.assertFalse(capture.sampled)
+        self.assertFalse(capture.call_sites)
+        self.assertTrue(capture.queries)
+        self.assertTrue(all("site" not in query for query in capture.queries))
+
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(reverse("movies:admin_perf_detail", args=[capture.pk]))
+        self.assertContains(response, "not collected")
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SearchTests(TestCase):
+    """Ranking, prefixes, reindexing through the signals, and queries that leave no terms."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crime = Genre.objects.create(name="Crime")
+        cls.heat = make_movie("Heat", synopsis="A thief and a detective in Los Angeles.")
+        cls.heat.genre.add(cls.crime)
+        cls.ronin = make_movie("Ronin", synopsis="Mercenaries chase a case through the summer heat.")
+        cls.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+
+    def found(self, query):
+        found = search_movies(Movie.objects.all(), query).order_by("-search_rank", "-id")
+        return list(found.values_list("title", flat=True))
+
+    def test_title_matches_rank_above_synopsis_matches(self):
+        self.assertEqual(self.found("heat"), ["Heat", "Ronin"])
+
+    def test_last_term_matches_as_a_prefix(self):
+        self.assertEqual(self.found("ron"), ["Ronin"])
+        self.assertEqual(self.found("los ang"), ["Heat"])
+        self.assertEqual(self.found("ang los"), [])
+
+    def test_renames_are_reindexed(self):
+        self.heat.title = "Heatwave"
+        self.heat.save()
+        self.assertEqual(self.found("heatwave"), ["Heatwave"])
+        self.crime.name = "Noir"
+        self.crime.save()
+        self.assertEqual(self.found("noir"), ["Heatwave"])
+        self.assertEqual(self.found("crime"), [])
+        self.ronin.genre.add(self.crime)
+        self.assertEqual(self.found("noir"), ["Ronin", "Heatwave"])
+
+    def test_queries_without_terms(self):
+        for query in ("!!!", '"', '""', "_", "  ", "-*:"):
+            with self.subTest(query=query):
+                self.assertEqual(search_terms(query), [])
+                self.assertEqual(self.found(query), [])
+        client = Client()
+        client.force_login(self.staff)
+        for query in ("!!!", '"'):
+            with self.subTest(query=query):
+                self.assertEqual(client.get(reverse("movies:admin_movies"), {"q": query}).status_code, 200)
+
+    def test_match_expressions(self):
+        terms = search_terms('"Los" Ang*')
+        self.assertEqual(terms, ["los", "ang"])
+        self.assertEqual(match_expression("sqlite", terms), '"los" "ang"*')
+        self.assertEqual(match_expression("postgresql", terms), "los & ang:*")
+
+    def test_fallback_without_an_index(self):
+        with mock.patch("movies.search.search_backend", return_value=None):
+            self.assertEqual(self.found("heat"), ["Heat", "Ronin"])
+            self.assertEqual(self.found("!!!"), [])
+
+    @skipUnless(connection.vendor == "postgresql", "needs Postgres")
+    def test_postgres_tsquery_runs(self):
+        for query in ("heat", "los ang", "don't", "ünïcode"):
+            with self.subTest(query=query):
+                self.found(query)
+
+    def test_api_queries_without_terms(self):
+        everything = Client().get(reverse("movies:api_movie_list"), {"fields": "id"}).json()["results"]
+        for query in ("!!!", '"', "_", ""):
+            for sort in ("", "relevance"):
+                with self.subTest(query=query, sort=sort):
+                    response = Client().get(
+                        reverse("movies:api_movie_list"), {"search": query, "sort": sort, "fields": "id"}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json()["results"], everything)
+        response = Client().get(reverse("movies:api_movie_list"), {"search": " HEAT! ", "fields": "title"})
+        self.assertEqual([row["title"] for row in response.json()["results"]], ["Heat", "Ronin"])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogTests(TestCase):
+    """Export and import round trips, checkpoint resumes, and bad records skipped without failing a batch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        crime, drama = Genre.objects.create(name="Crime"), Genre.objects.create(name="Drama")
+        heat = make_movie("Heat", synopsis="Thief | detective")
+        heat.genre.add(crime, drama)
+        make_movie("Ronin", release_date=datetime.date(1998, 9, 25))
+        reviewer = User.objects.create_user("reviewer", password="pw")
+        Review.objects.create(user=reviewer, movie=heat, rating=5, comment="Line one,\nline two")
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def export(self):
+        # The command streams to sys.stdout itself, so read back a file instead
+        call_command("export_catalog", "-o", self.path("export.ndjson"), stdout=StringIO())
+        with open(self.path("export.ndjson")) as fh:
+            return fh.read()
+
+    def wipe(self):
+        Review.objects.all().delete()
+        Movie.objects.all().delete()
+        Genre.objects.all().delete()
+
+    def test_ndjson_round_trip(self):
+        before = self.export()
+        self.assertEqual(before.count("\n"), 5)
+        with open(self.path("catalog.ndjson"), "w") as fh:
+            fh.write(before)
+        self.wipe()
+        call_command("import_catalog", self.path("catalog.ndjson"), stdout=StringIO())
+        self.assertEqual(self.export(), before)
+        self.assertEqual(Movie.objects.get(title="Heat").rating_count, 1)
+        self.assertEqual(search_movies(Movie.objects.all(), "thief").get().title, "Heat")
+
+    def test_csv_round_trip(self):
+        before = self.export()
+        for record_type in ("genre", "movie", "review"):
+            call_command("export_catalog", "--format=csv", f"--type={record_type}", "-o", self.path(record_type),
+                         stdout=StringIO())
+        self.wipe()
+        for record_type in ("genre", "movie", "review"):
+            call_command("import_catalog", self.path(record_type), "--format=csv", f"--type={record_type}",
+                         stdout=StringIO())
+        self.assertEqual(self.export(), before)
+
+    def test_resume_from_checkpoint(self):
+        records = [{"type": "movie", "id": 100 + index, "title": f"Imported {index}", "release_date": "2001-01-01"}
+                   for index in range(3)]
+        lines = [json.dumps(record) for record in records]
+        with open(self.path("catalog.ndjson"), "w") as fh:
+            fh.write("\n".join([*lines[:2], "{not json", lines[2]]))
+        checkpoint = self.path("checkpoint")
+        with self.assertRaises(CommandError):
+            call_command("import_catalog", self.path("catalog.ndjson"), "--batch-size=1", "--resume", checkpoint,
+                         stdout=StringIO())
+        with open(checkpoint) as fh:
+            self.assertEqual(fh.read(), "2")
+        self.assertEqual(Movie.objects.filter(pk__gte=100).count(), 2)
+
+        with open(self.path("catalog.ndjson"), "w") as fh:
+            fh.write("\n".join(lines))
+        out = StringIO()
+        call_command("import_catalog", self.path("catalog.ndjson"), "--resume", checkpoint, stdout=out)
+        self.assertIn("Resuming after record 2", out.getvalue())
+        self.assertIn("Imported 0 genre(s), 1 movie(s)", out.getvalue())
+        self.assertEqual(Movie.objects.filter(pk__gte=100).count(), 3)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_bad_records_are_skipped(self):
+        importer = CatalogImporter(batch_size=10)
+        for record in [
+            {"type": "movie", "id": 200, "title": "No date"},
+            {"type": "movie", "id": 201, "title": "Bad date", "release_date": "someday"},
+            {"type": "movie", "id": 202, "title": "First draft", "release_date": "2001-01-01"},
+            {"type": "movie", "id": 202, "title": "Final cut", "release_date": "2001-01-01"},
+            {"type": "review", "id": 300, "movie": 202, "user": "reviewer", "comment": "No rating"},
+            {"type": "review", "id": 301, "movie": 202, "user": "reviewer", "rating": 9, "comment": ""},
+            {"type": "review", "id": 302, "movie": 202, "user": "reviewer", "rating": 4, "comment": ""},
+            {"type": "trailer"},
+        ]:
+            importer.add(record)
+        importer.flush()
+        importer.finish()
+        self.assertEqual(importer.stats["skipped"], 6)
+        self.assertEqual(importer.stats["movies"], 1)
+        self.assertEqual(importer.stats["reviews"], 1)
+        self.assertEqual(Movie.objects.get(pk=202).title, "Final cut")
+        self.assertFalse(Movie.objects.filter(pk__in=[200, 201]).exists())
+        self.assertEqual(list(Review.objects.filter(pk__gte=300).values_list("pk", flat=True)), [302])
+        self.assertIn("movie 200: missing release_date", importer.errors)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class FrontPageTests(TestCase):
+    """The movie of the day holds for the day; the list follows every movie write."""
+
+    def setUp(self):
+        cache.clear()
+        for index in range(frontpage.FRONT_PAGE_SIZE):
+            make_movie(f"Movie {index}", release_date=datetime.date(2000, 1, 1 + index))
+
+    def test_pick_holds_across_rebuilds(self):
+        pick = frontpage.get_front_page()["movie_of_the_day"].id
+        for index in range(frontpage.FRONT_PAGE_SIZE):
+            make_movie(f"New {index}", release_date=datetime.date(2020, 1, 1 + index))
+        snapshot = frontpage.get_front_page()
+        self.assertNotIn(pick, [movie.id for movie in snapshot["movies"]])
+        self.assertEqual(snapshot["movie_of_the_day"].id, pick)
+
+        # Still on the snapshot's watch list once out of the latest ten
+        Movie.objects.get(pk=pick).delete()
+        self.assertNotEqual(frontpage.get_front_page()["movie_of_the_day"].id, pick)
+
+    def titles(self):
+        return [movie.title for movie in frontpage.get_front_page()["movies"]]
+
+    def test_movie_writes_refresh_the_list(self):
+        frontpage.get_front_page()
+        added = make_movie("Added", release_date=datetime.date(2021, 1, 1))
+        self.assertEqual(self.titles()[0], "Added")
+        added.title = "Edited"
+        added.save()
+        self.assertEqual(self.titles()[0], "Edited")
+        added.delete()
+        self.assertNotIn("Edited", self.titles())
+        self.assertEqual(len(self.titles()), frontpage.FRONT_PAGE_SIZE)
+
+        pick = frontpage.get_front_page()["movie_of_the_day"]
+        movie = Movie.objects.get(pk=pick.id)
+        movie.title = "Renamed"
+        movie.save()
+        self.assertEqual(frontpage.get_front_page()["movie_of_the_day"].title, "Renamed")
+
+    def test_anonymous_home_runs_no_queries_once_warm(self):
+        client = Client()
+        self.assertEqual(client.get(reverse("movies:home")).status_code, 200)
+        with self.assertNumQueries(0):
+            response = Client().get(reverse("movies:home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, frontpage.get_front_page()["movie_of_the_day"].title)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ConditionalGetTests(TestCase):
+    """Catalog pages answer revalidations with 304 until something on them changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = make_movie()
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return [reverse("movies:home"), reverse("movies:movie_list"), reverse("movies:movie_detail", args=[self.movie.pk])]
+
+    def test_revalidation_answers_304(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                client = Client()
+                client.get(url)  # sets the CSRF cookie, which is part of the ETag from then on
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag, modified = response.headers["ETag"], response.headers["Last-Modified"]
+                self.assertEqual(client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+                self.assertEqual(client.get(url, headers={"If-Modified-Since": modified}).status_code, 304)
+
+    def test_etag_differs_per_user(self):
+        url = reverse("movies:movie_detail", args=[self.movie.pk])
+        etags = {Client().get(url).headers["ETag"]}
+        for user in (self.alice, self.bob):
+            client = Client()
+            client.force_login(user)
+            response = client.get(url)
+            self.assertNotIn("Last-Modified", response.headers)
+            etags.add(response.headers["ETag"])
+        self.assertEqual(len(etags), 3)
+
+    def test_etag_changes_after_a_review_or_an_edit(self):
+        detail = reverse("movies:movie_detail", args=[self.movie.pk])
+        before = {url: Client().get(url).headers["ETag"] for url in self.urls()}
+
+        Review.objects.create(user=self.alice, movie=self.movie, rating=4, comment="")
+        response = Client().get(detail, headers={"If-None-Match": before[detail]})
+        self.assertEqual(response.status_code, 200)
+        before[detail] = response.headers["ETag"]
+
+        self.movie.refresh_from_db()
+        self.movie.title = "Heat (1995)"
+        self.movie.save()
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = Client().get(url, headers={"If-None-Match": before[url]})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response.headers["ETag"], before[url])
+
+    def test_pending_messages_are_never_answered_with_304(self):
+        home = reverse("movies:home")
+        client = Client()
+        client.get(home)
+        etag = client.get(home).headers["ETag"]
+        client.post(reverse("movies:phone_signup"), {})  # leaves "Both phone and email are required."
+        response = client.get(home, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Both phone and email are required.")
+        self.assertNotIn("ETag", response.headers)
+        # Shown once; after that the earlier copy is current again
+        self.assertEqual(client.get(home, headers={"If-None-Match": etag}).status_code, 304)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class EmbedTests(TestCase):
+    """Every supported link shape resolves, and no link raises anything but EmbedError."""
+
+    YOUTUBE = f"https://www.youtube.com/embed/dQw4w9WgXcQ?{embeds.PLAYER_PARAMS}"
+    RESOLVED = {
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ": ("youtube", "iframe", YOUTUBE),
+        "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42": ("youtube", "iframe", YOUTUBE),
+        "https://youtube.com/shorts/dQw4w9WgXcQ?feature=share": ("youtube", "iframe", YOUTUBE),
+        " https://youtu.be/dQw4w9WgXcQ?t=10 ": ("youtube", "iframe", YOUTUBE),
+        "https://www.twitch.tv/videos/123456789": (
+            "twitch", "iframe", "https://player.twitch.tv/?video=v123456789&parent=example.com",
+        ),
+        "https://twitch.tv/some_channel/": (
+            "twitch", "iframe", "https://player.twitch.tv/?channel=some_channel&parent=example.com",
+        ),
+        "https://www.instagram.com/reel/C1a2B3c4D5e/?igsh=x": (
+            "instagram", "iframe", "https://www.instagram.com/reel/C1a2B3c4D5e/embed",
+        ),
+        "https://instagr.am/p/C1a2B3c4D5e": ("instagram", "iframe", "https://www.instagram.com/p/C1a2B3c4D5e/embed"),
+        "https://vimeo.com/channels/staffpicks/76979871": (
+            "vimeo", "iframe", "https://player.vimeo.com/video/76979871?autoplay=1",
+        ),
+        "https://cdn.example.com/films/clip.MP4": ("direct", "direct", "https://cdn.example.com/films/clip.MP4"),
+    }
+    REJECTED = [
+        "", "   ", "not a link", "youtube.com/watch?v=dQw4w9WgXcQ", "//youtube.com/watch?v=dQw4w9WgXcQ",
+        "https:///watch?v=dQw4w9WgXcQ", "ftp://youtube.com/watch?v=dQw4w9WgXcQ", "javascript:alert(1)",
+        "data:video/mp4;base64,AAAA", "file:///tmp/clip.mp4", "http://[::1", "http://[not-ipv6]/clip.mp4",
+        "https://user@:99999/clip.mp4", "https://www.youtube.com/watch?v=", "https://www.youtube.com/watch?v=short",
+        "https://youtu.be/", "https://www.twitch.tv/videos/", "https://www.twitch.tv/videos",
+        "https://www.instagram.com/p/", "https://vimeo.com/", "https://notyoutube.com/watch?v=dQw4w9WgXcQ", "https://example.com/page.html",
+        "https://example.com/clip.mp4.html",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        embeds.oembed.cache.clear()
+
+    def test_supported_links(self):
+        for link, (provider, kind, url) in self.RESOLVED.items():
+            with self.subTest(link=link):
+                embed = embeds.resolve(link, parent="example.com")
+                self.assertEqual((embed.provider, embed.kind, embed.url), (provider, kind, url))
+        self.assertEqual(embeds.resolve("https://example.com/clip.webm").mime, "video/webm")
+
+    def test_anything_else_is_an_embed_error(self):
+        for link in self.REJECTED:
+            with self.subTest(link=link), self.assertRaises(embeds.EmbedError):
+                embeds.resolve(link)
+
+    def test_oembed_results_are_cached_for_their_ttl(self):
+        now = [0.0]
+        client = embeds.OEmbedClient(cache=TTLCache(clock=lambda: now[0]), ttl=60, failure_ttl=5)
+        client._session = session = mock.Mock()
+        session.get.return_value.json.return_value = {"html": "<blockquote>post</blockquote>"}
+        params = {"url": "https://www.instagram.com/p/C1a2B3c4D5e/", "access_token": "secret"}
+
+        self.assertIsNone(client.cached(embeds.INSTAGRAM_OEMBED, params))
+        self.assertEqual(client.fetch(embeds.INSTAGRAM_OEMBED, params), "<blockquote>post</blockquote>")
+        self.assertEqual(client.fetch(embeds.INSTAGRAM_OEMBED, params), "<blockquote>post</blockquote>")
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(session.get.call_args.kwargs["timeout"], client.timeout)
+        self.assertNotIn("secret", client._key(embeds.INSTAGRAM_OEMBED, params))
+
+        # Another process finds it in the shared cache
+        other = embeds.OEmbedClient(cache=TTLCache(clock=lambda: now[0]))
+        self.assertEqual(other.cached(embeds.INSTAGRAM_OEMBED, params), "<blockquote>post</blockquote>")
+
+        # Failures are remembered, briefly
+        session.get.side_effect = ConnectionError("down")
+        other_post = {**params, "url": "https://www.instagram.com/p/Z9y8X7w6V5u/"}
+        self.assertEqual(client.fetch(embeds.INSTAGRAM_OEMBED, other_post), "")
+        self.assertEqual(client.fetch(embeds.INSTAGRAM_OEMBED, other_post), "")
+        self.assertEqual(session.get.call_count, 2)
+        now[0] += 6
+        with mock.patch("time.time", return_value=time.time() + 6):
+            self.assertEqual(client.fetch(embeds.INSTAGRAM_OEMBED, other_post), "")
+        self.assertEqual(session.get.call_count, 3)
+
+    @override_settings(INSTAGRAM_OEMBED_TOKEN="token", TASKS_MODE="sync")
+    def test_instagram_oembed_is_fetched_off_the_request(self):
+        link = "https://www.instagram.com/reel/C1a2B3c4D5e/"
+        with mock.patch.object(embeds.oembed, "_session", mock.Mock()) as session:
+            session.get.return_value.json.return_value = {"html": "<blockquote>reel</blockquote>"}
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertEqual(embeds.resolve(link).kind, "iframe")
+            session.get.assert_not_called()
+            for callback in callbacks:
+                callback()
+            self.assertEqual(session.get.call_count, 1)
+            embed = embeds.resolve(link)
+            self.assertEqual((embed.kind, embed.html), ("html", "<blockquote>reel</blockquote>"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class WishlistCacheTests(TestCase):
+    """The cached wishlist ids follow every change to the relation, from either side."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", password="pw")
+        cls.bob = User.objects.create_user("bob", password="pw")
+        cls.heat, cls.ronin = make_movie("Heat"), make_movie("Ronin")
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, user):
+        # A fresh instance each time, so only the cache carries the set between calls
+        return set(get_wishlist_ids(User.objects.get(pk=user.pk)))
+
+    def profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    def test_changes_from_the_profile_side(self):
+        self.assertEqual(self.ids(self.alice), set())
+        self.profile(self.alice).wishlist.add(self.heat, self.ronin)
+        self.assertEqual(self.ids(self.alice), {self.heat.pk, self.ronin.pk})
+        self.profile(self.alice).wishlist.remove(self.heat)
+        self.assertEqual(self.ids(self.alice), {self.ronin.pk})
+        self.profile(self.alice).wishlist.clear()
+        self.assertEqual(self.ids(self.alice), set())
+
+    def test_changes_from_the_movie_side(self):
+        alice, bob = self.profile(self.alice), self.profile(self.bob)
+        self.assertEqual((self.ids(self.alice), self.ids(self.bob)), (set(), set()))
+        self.heat.wishlisted_by.add(alice, bob)
+        self.assertEqual((self.ids(self.alice), self.ids(self.bob)), ({self.heat.pk}, {self.heat.pk}))
+        self.heat.wishlisted_by.remove(alice)
+        self.assertEqual((self.ids(self.alice), self.ids(self.bob)), (set(), {self.heat.pk}))
+        self.ronin.wishlisted_by.add(alice)
+        self.heat.wishlisted_by.clear()
+        self.assertEqual((self.ids(self.alice), self.ids(self.bob)), ({self.ronin.pk}, set()))
+
+    def test_list_pages_read_membership_once(self):
+        for index in range(5):
+            self.profile(self.alice).wishlist.add(make_movie(f"Movie {index}"))
+        client = Client()
+        client.force_login(self.alice)
+        table = UserProfile.wishlist.through._meta.db_table
+        for url in (reverse("movies:home"), reverse("movies:movie_list")):
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(client.get(url).status_code, 200)
+                self.assertEqual(sum(table in query["sql"] for query in queries.captured_queries), 1)
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                self.assertEqual(sum(table in query["sql"] for query in queries.captured_queries), 0)
+
+
+class AnalyticsRollupTests(TestCase):
+    """The incrementally kept rollups match a full recount after every kind of write."""
+
+    def snapshot(self):
+        return (
+            {row.date: (row.review_count, row.rating_sum) for row in DailyReviewStat.objects.all()
+             if row.review_count or row.rating_sum},
+            {row.genre_id: row.movie_count for row in GenreMovieStat.objects.all() if row.movie_count},
+            {row.user_id: row.review_count for row in UserReviewStat.objects.all() if row.review_count},
+        )
+
+    def assertMatchesRecount(self):
+        incremental = self.snapshot()
+        rebuild_analytics()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_rollups_match_a_recount(self):
+        crime, drama, noir = (Genre.objects.create(name=name) for name in ("Crime", "Drama", "Noir"))
+        heat, ronin, thief = make_movie("Heat"), make_movie("Ronin"), make_movie("Thief")
+        alice, bob, carol = (User.objects.create_user(name, password="pw") for name in ("alice", "bob", "carol"))
+
+        heat.genre.add(crime, drama)
+        ronin.genre.set([crime])
+        noir.movie_set.add(heat, ronin, thief)
+        reviews = [
+            Review.objects.create(user=user, movie=movie, rating=rating, comment="")
+            for user, movie, rating in [(alice, heat, 5), (alice, ronin, 4), (carol, thief, 2)]
+        ]
+        three_days_ago = timezone.now() - datetime.timedelta(days=3)
+        with mock.patch("django.utils.timezone.now", return_value=three_days_ago):
+            earlier = Review.objects.create(user=bob, movie=heat, rating=3, comment="")
+        self.assertEqual(len(self.snapshot()[0]), 2)
+        self.assertMatchesRecount()
+
+        # Rating edits, including one on an older review, and a review moved to another movie
+        earlier.rating = 1
+        earlier.save()
+        reviews[0].rating = 2
+        reviews[0].movie = thief
+        reviews[0].save()
+        self.assertMatchesRecount()
+
+        # Links removed from either side, and cleared from either side
+        heat.genre.remove(drama)
+        noir.movie_set.remove(thief)
+        crime.movie_set.clear()
+        ronin.genre.clear()
+        self.assertMatchesRecount()
+
+        # Deletes that cascade
+        reviews[1].delete()
+        thief.delete()
+        carol.delete()
+        drama.delete()
+        self.assertMatchesRecount()
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SyntheticDataTests(TestCase):
+    """seed_synthetic is repeatable for a seed, and bench_views runs against what it makes."""
+
+    SEED = ["--movies=12", "--users=8", "--reviews=40", "--wishlists=15", "--seed=7", "--batch-size=5", "--force"]
+
+    def setUp(self):
+        cache.clear()
+        tiered.l1.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def seed(self, *args):
+        call_command("seed_synthetic", *self.SEED, *args, stdout=StringIO())
+
+    def snapshot(self):
+        # Ids and usernames move on between runs, so compare rows by their position instead
+        movies = {pk: n for n, pk in enumerate(Movie.objects.order_by("pk").values_list("pk", flat=True))}
+        users = {pk: n for n, pk in enumerate(UserProfile.objects.order_by("pk").values_list("user_id", flat=True))}
+        profiles = dict(UserProfile.objects.values_list("pk", "user_id"))
+        return {
+            "movies": list(Movie.objects.order_by("pk").values_list("title", "release_date", "rating_count")),
+            "genres": sorted((movies[movie], genre) for movie, genre in Movie.genre.through.objects.values_list(
+                "movie_id", "genre__name"
+            )),
+            "reviews": sorted((users[user], movies[movie], rating) for user, movie, rating in Review.objects.values_list(
+                "user_id", "movie_id", "rating"
+            )),
+            "wishlists": sorted((users[profiles[profile]], movies[movie]) for profile, movie in
+                                UserProfile.wishlist.through.objects.values_list("userprofile_id", "movie_id")),
+        }
+
+    def wipe(self):
+        Review.objects.all().delete()
+        Movie.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_same_seed_same_catalog(self):
+        self.seed()
+        first = self.snapshot()
+        self.assertEqual(len(first["movies"]), 12)
+        self.assertEqual(User.objects.count(), 8)
+        self.assertGreater(len(first["reviews"]), 0)
+        self.assertLessEqual(len(first["reviews"]), 40)
+        self.assertGreater(len(first["wishlists"]), 0)
+        for movie in Movie.objects.all():
+            self.assertEqual(movie.rating_count, movie.review_set.count())
+
+        self.wipe()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+        self.wipe()
+        self.seed("--seed=8")
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_refuses_without_force_when_debug_is_off(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_synthetic", "--movies=1", "--users=1", "--reviews=1", stdout=StringIO())
+        self.assertFalse(Movie.objects.exists())
+
+    def test_bench_views_on_seeded_data(self):
+        self.seed()
+        User.objects.create_user("staff", password="pw", is_staff=True)
+        output = os.path.join(self.directory.name, "bench.json")
+        out = StringIO()
+        call_command("bench_views", "--runs=2", "--warmup=0", "--output", output, stdout=out)
+
+        with open(output) as fh:
+            report = json.load(fh)
+        self.assertEqual(report["meta"]["movies"], 12)
+        self.assertLessEqual(
+            {"home", "movie_list", "movie_list_deep", "movie_detail_popular", "movie_detail_tail", "wishlist", "analytics"},
+            set(report["scenarios"]),
+        )
+        self.assertGreater(report["scenarios"]["home"]["queries"], 0)
+        for name, result in report["scenarios"].items():
+            with self.subTest(name):
+                self.assertGreater(result["bytes"], 0)
+                self.assertLessEqual(result["p50"], result["p99"])
+
+        # Compared with itself there is nothing to report
+        call_command("bench_views", "--runs=2", "--warmup=0", "--baseline", output, "--max-regression=1000",
+                     "--only=home", stdout=out)
+        self.assertIn("No regressions", out.getvalue())
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 from django.contrib.auth import views as auth_views
 from django.urls import reverse_lazy
 
@@ -23,6 +23,8 @@ urlpatterns = [
     # --- custom admin ---
     path("dashboard/", views.admin_dashboard, name="admin_dashboard"),
     path('dashboard/analytics/', views.analytics, name='admin_analytics'),  # Updated to dashboard/analytics/
+    path("dashboard/perf/", views.perf_dashboard, name="admin_perf"),
+    path("dashboard/perf/<int:pk>/", views.perf_detail, name="admin_perf_detail"),
 
     # Movies
     path("dashboard/movies/", views.admin_movies, name="admin_movies"),
@@ -58,4 +60,11 @@ urlpatterns = [
     path("reset/done/", auth_views.PasswordResetCompleteView.as_view(template_name='registration/password_reset_complete.html'), name="password_reset_complete"),
 
     path('play-online/', views.play_online, name='play_online'),
+
+    # Read-only JSON API
+    path("api/v1/movies/", api.movie_list, name="api_movie_list"),
+    path("api/v1/movies/<int:movie_id>/", api.movie_detail, name="api_movie_detail"),
+    path("api/v1/movies/<int:movie_id>/reviews/", api.review_list, name="api_review_list"),
+    path("api/v1/genres/", api.genre_list, name="api_genre_list"),
+    path("api/v1/wishlist/", api.wishlist, name="api_wishlist"),
 ]
\ No newline at end of file
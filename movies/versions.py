@@ -0,0 +1,43 @@
+"""
+Version stamps for the catalog and for each movie.
+
+A stamp is a nanosecond timestamp, kept as a tag version of the tiered
+cache (cache.py) and replaced by signals.py whenever what it covers
+changes: the per-movie stamp tracks the movie, its genres and its
+reviews; the catalog stamp moves with any of those for any movie, and
+with genres being added or removed. Cached
+movie_detail fragments put the stamp in their key, so a bump makes the old
+fragments unreachable and they simply age out; conditional.py derives
+ETag / Last-Modified values from the same stamps. A stamp lost to
+eviction is replaced with a fresh one, which only costs a re-render.
+"""
+import datetime
+
+from .cache import tiered
+
+# How long a rendered movie_detail fragment may live in the cache
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+CATALOG_TAG = "catalog"
+
+
+def movie_tag(movie_id):
+    return str(movie_id)
+
+
+def get_movie_version(movie_id):
+    tag = movie_tag(movie_id)
+    return tiered.tag_versions([tag])[tag]
+
+
+def get_catalog_version():
+    return tiered.tag_versions([CATALOG_TAG])[CATALOG_TAG]
+
+
+def bump_movie_versions(movie_ids):
+    """Replace the stamps of `movie_ids` and the catalog stamp."""
+    tiered.invalidate_tags(CATALOG_TAG, *(movie_tag(movie_id) for movie_id in movie_ids))
+
+
+def stamp_to_datetime(stamp):
+    return datetime.datetime.fromtimestamp(stamp / 1e9, tz=datetime.timezone.utc)
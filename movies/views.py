@@ -1,6 +1,8 @@
+import datetime
+from collections import Counter
 from datetime import timedelta
 from functools import wraps
-import hashlib, hmac, random
+import hashlib, hmac
 
 from django import forms
 from django.contrib import messages
@@ -8,12 +10,15 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.core.paginator import Paginator
 from django.db.models import Q, Avg, Count
 from django.http import JsonResponse, HttpResponseForbidden
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition
 from django.conf import settings
 
 from .forms import (
@@ -22,65 +27,107 @@ from .forms import (
     AdminMovieForm,
     AdminGenreForm,
     AdminReviewForm,
-    AdminUserSearchForm,
     ProfileForm,  # New import
 )
-from .models import Movie, Review, UserProfile, Genre
+from .models import Movie, Review, UserProfile, Genre, RequestProfile
+from .cards import build_cards, card_queryset
+from .embeds import EmbedError, resolve as resolve_embed
+from .frontpage import get_front_page
+from . import analytics as analytics_rollups
+from .avatars import AvatarUploadHandler, delete_avatar_files, schedule_avatar_processing
+from .cache import cached, tiered
+from . import conditional, counters, otp, profiling
+from .pagination import KeysetPage, KeysetPaginator, decode_cursor, encode_cursor
+from .profiles import get_profile
+from .search import search_movies, search_terms
+from .versions import CATALOG_TAG, FRAGMENT_TIMEOUT, get_movie_version
+from .wishlist import get_wishlist_ids
 from django.http import HttpResponse
 def healthz(request):
     return HttpResponse("OK", status=200)
 # =================== PUBLIC VIEWS ===================
 
+@condition(etag_func=conditional.home_etag, last_modified_func=conditional.home_last_modified)
 def home(request):
-    movies = Movie.objects.all().order_by('-release_date')[:10]
-    movie_of_the_day = random.choice(movies) if movies.exists() else None
-    return render(request, 'home.html', {'movies': movies, 'movie_of_the_day': movie_of_the_day})
+    snapshot = get_front_page()
+    return render(request, 'home.html', {
+        'movies': snapshot['movies'],
+        'movie_of_the_day': snapshot['movie_of_the_day'],
+    })
 
 
-def movie_list(request):
-    movies = Movie.objects.all().order_by('-release_date')
-    genre_filter = request.GET.get('genre', '')
-    search_query = request.GET.get('search', '')
-    sort_by = request.GET.get('sort', 'newest')
+# Keyset orderings for movie_list; each ends in "id" so cursors are unique
+MOVIE_LIST_ORDERINGS = {
+    'relevance': ('-search_rank', '-id'),
+    'rating': ('-average_rating', '-id'),
+    'title': ('title', 'id'),
+    'oldest': ('release_date', 'id'),
+    'newest': ('-release_date', '-id'),
+}
+
+
+@cached(ttl=60 * 60, stale_ttl=60 * 60 * 24, tags=(CATALOG_TAG,))
+def catalog_genre_names():
+    return list(Genre.objects.order_by('pk').values_list('name', flat=True))
+
 
+@cached(ttl=15 * 60, stale_ttl=60 * 60, tags=(CATALOG_TAG,))
+def catalog_page(genre_filter, search_query, sort_by, cursor):
+    """One page of movie_list as plain data; any catalog change invalidates it."""
+    movies = card_queryset()
     if genre_filter:
-        movies = movies.filter(genre__name__icontains=genre_filter)
+        movies = movies.filter(pk__in=Movie.genre.through.objects.filter(
+            genre__name__icontains=genre_filter).values('movie_id'))
     if search_query:
-        movies = movies.filter(
-            Q(title__icontains=search_query) |
-            Q(synopsis__icontains=search_query) |
-            Q(genre__name__icontains=search_query)
-        ).distinct()
-
-    if sort_by == 'rating':
-        movies = movies.order_by('-average_rating')
-    elif sort_by == 'title':
-        movies = movies.order_by('title')
-    elif sort_by == 'oldest':
-        movies = movies.order_by('release_date')
+        movies = search_movies(movies, search_query)
+
+    page = KeysetPaginator(movies, 12, MOVIE_LIST_ORDERINGS[sort_by]).get_page(cursor)
+    return {
+        'cards': build_cards(page.object_list),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        # Only shown alongside pagination links
+        'total': page.total if page.has_other_pages() else '',
+    }
+
+
+@condition(etag_func=conditional.catalog_etag, last_modified_func=conditional.catalog_last_modified)
+def movie_list(request):
+    genre_filter = request.GET.get('genre', '')
+    search_query = request.GET.get('search', '')
+    # catalog_page is cached by its arguments, so spelling variants of one
+    # query (case, spacing, padding on the cursor) must come out the same
+    search_key = ' '.join(search_terms(search_query))
+    sort_by = request.GET.get('sort') or ('relevance' if search_key else 'newest')
+    if sort_by not in MOVIE_LIST_ORDERINGS or (sort_by == 'relevance' and not search_key):
+        sort_by = 'newest'
+    direction, values = decode_cursor(request.GET.get('cursor'))
+    if values is None or len(values) != len(MOVIE_LIST_ORDERINGS[sort_by]):
+        cursor = ''
     else:
-        movies = movies.order_by('-release_date')
+        cursor = encode_cursor(direction, values)
 
-    all_genres = Genre.objects.all()
-    paginator = Paginator(movies, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    snapshot = catalog_page(genre_filter.strip().lower(), search_key, sort_by, cursor)
+    page_obj = KeysetPage(snapshot['cards'], None, snapshot['next_cursor'], snapshot['previous_cursor'])
+    page_obj.total = snapshot['total']
 
     return render(request, 'movie_list.html', {
         'movies': page_obj,
-        'all_genres': all_genres,
+        'all_genres': catalog_genre_names(),
         'selected_genre': genre_filter,
         'search_query': search_query,
         'sort_by': sort_by,
     })
 
 
+@condition(etag_func=conditional.movie_etag, last_modified_func=conditional.movie_last_modified)
 def movie_detail(request, movie_id):
     movie = get_object_or_404(Movie, pk=movie_id)
-    reviews = Review.objects.filter(movie=movie).order_by('-created_at')
+    # Only evaluated when the cached review fragment for this version is missing
+    reviews = Review.objects.filter(movie=movie).select_related('user').order_by('-created_at')
     if request.method == 'POST':
         if not request.user.is_authenticated:
-            return redirect('login')
+            return redirect('movies:login')
         form = ReviewForm(request.POST)
         if form.is_valid():
             review = form.save(commit=False)
@@ -90,17 +137,21 @@ def movie_detail(request, movie_id):
             return redirect('movies:movie_detail', movie_id=movie.id)
     else:
         form = ReviewForm()
+    # Rendered outside the cached fragment, with the edit controls only their author sees
+    own_reviews = reviews.filter(user=request.user) if request.user.is_authenticated else []
     return render(request, 'movie_detail.html', {
         'movie': movie,
         'reviews': reviews,
+        'own_reviews': own_reviews,
         'form': form,
+        'version': get_movie_version(movie.id),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
     })
 
 
 @login_required
 def wishlist(request):
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-    movies = profile.wishlist.all()
+    movies = build_cards(card_queryset(Movie.objects.filter(wishlisted_by__user=request.user)))
     return render(request, "wishlist.html", {"wishlist_movies": movies})
 
 
@@ -108,9 +159,9 @@ def wishlist(request):
 def add_to_wishlist(request, movie_id):
     if request.method == "POST":
         movie = get_object_or_404(Movie, pk=movie_id)
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        profile = get_profile(request.user)
 
-        if movie in profile.wishlist.all():
+        if movie.id in get_wishlist_ids(request.user):
             profile.wishlist.remove(movie)
             return JsonResponse({"status": "removed", "message": f"{movie.title} removed from wishlist"})
         else:
@@ -122,9 +173,9 @@ def add_to_wishlist(request, movie_id):
 @login_required
 def remove_from_wishlist(request, movie_id):
     movie = get_object_or_404(Movie, pk=movie_id)
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    profile = get_profile(request.user)
 
-    if movie in profile.wishlist.all():
+    if movie.id in get_wishlist_ids(request.user):
         profile.wishlist.remove(movie)
         message = f'Removed {movie.title} from your wishlist'
         is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
@@ -172,8 +223,8 @@ def logout_view(request):
 
 @login_required
 def profile(request):
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-    reviews = Review.objects.filter(user=request.user).order_by('-created_at')
+    profile = get_profile(request.user)
+    reviews = Review.objects.filter(user=request.user).select_related('movie').order_by('-created_at')
     avg_rating = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
     return render(request, 'profile.html', {'profile': profile, 'reviews': reviews, 'avg_rating': avg_rating})
 
@@ -209,57 +260,74 @@ def telegram_callback(request):
 
 # =================== PHONE SIGNUP (EMAIL OTP) ===================
 
+def _throttled(retry_after):
+    # Deliberately bare: no template, no session, no database
+    return HttpResponse(
+        "Too many requests. Please try again later.",
+        status=429,
+        content_type="text/plain",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 def phone_signup(request):
     if request.method == "POST":
-        phone = request.POST.get("phone")
-        email = request.POST.get("email")
+        wait = otp.take_token("send-ip", otp.client_ip(request))
+        if wait:
+            return _throttled(wait)
+
+        phone = request.POST.get("phone", "").strip()
+        email = request.POST.get("email", "").strip()
 
         if not email or not phone:
             messages.error(request, "Both phone and email are required.")
             return redirect("movies:phone_signup")
+        try:
+            validate_email(email)
+        except ValidationError:
+            messages.error(request, "Enter a valid email address.")
+            return redirect("movies:phone_signup")
 
-        otp = random.randint(100000, 999999)
-
-        request.session["otp"] = str(otp)
-        request.session["email"] = email
-        request.session["phone"] = phone
+        wait = otp.take_token("send-email", email)
+        if wait:
+            messages.error(request, f"A code was sent to {email} recently. Try again in {wait} seconds.")
+            return redirect("movies:phone_signup")
 
-        send_mail(
-            subject="Your WEBZMOVIES OTP",
-            message=f"Your OTP for WEBZMOVIES signup is: {otp}",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-        )
+        challenge_id, _ = otp.issue(email, phone)
+        # Only the challenge id goes into the task row; the task reads the code from the cache
+        otp.send_code.enqueue(challenge_id=challenge_id)
 
         messages.success(request, f"OTP has been sent to {email}. Please check your inbox.")
-        return redirect("movies:verify_otp")
+        return otp.set_challenge_cookie(redirect("movies:verify_otp"), challenge_id)
 
     return render(request, "phone_signup.html")
 
 
 def verify_otp(request):
     if request.method == "POST":
-        entered_otp = request.POST.get("otp")
-        session_otp = request.session.get("otp")
-        email = request.session.get("email")
-        phone = request.session.get("phone")
-
-        if entered_otp == session_otp:
-            if User.objects.filter(username=phone).exists():
-                messages.info(request, "User already exists. Please login.")
-                return redirect("movies:login")
-
-            user = User.objects.create_user(
-                username=phone,
-                email=email,
-                password="defaultpassword123"
-            )
-            messages.success(request, "Account created successfully! Please login.")
-            return redirect("movies:login")
-        else:
-            messages.error(request, "Invalid OTP. Please try again.")
+        wait = otp.take_token("verify-ip", otp.client_ip(request))
+        if wait:
+            return _throttled(wait)
+
+        try:
+            challenge = otp.verify(otp.get_challenge_id(request), request.POST.get("otp"))
+        except otp.OTPError as exc:
+            messages.error(request, str(exc))
             return redirect("movies:verify_otp")
 
+        response = otp.clear_challenge_cookie(redirect("movies:login"))
+        if User.objects.filter(username=challenge.phone).exists():
+            messages.info(request, "User already exists. Please login.")
+            return response
+
+        User.objects.create_user(
+            username=challenge.phone,
+            email=challenge.email,
+            password="defaultpassword123"
+        )
+        messages.success(request, "Account created successfully! Please login.")
+        return response
+
     return render(request, "verify_otp.html")
 
 
@@ -269,7 +337,7 @@ def staff_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
         if not request.user.is_authenticated:
-            return redirect("login")
+            return redirect("movies:login")
         if not (request.user.is_staff or request.user.is_superuser):
             return HttpResponseForbidden("You do not have permission to access the admin dashboard.")
         return view_func(request, *args, **kwargs)
@@ -282,9 +350,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render
 from django.db.models import Avg, Count
 from django.utils import timezone
-from django.db.models.functions import TruncMonth
 from .models import Movie, Genre, Review, User
-from collections import defaultdict
 
 def is_staff_user(user):
     return user.is_authenticated and user.is_staff
@@ -292,15 +358,18 @@ def is_staff_user(user):
 @login_required
 @user_passes_test(is_staff_user)
 def admin_dashboard(request):
+    # Counter rows are kept current by signals; one query for every number
+    counts = counters.get_counts()
     stats = {
-        "movie_count": Movie.objects.count(),
-        "genre_count": Genre.objects.count(),
-        "review_count": Review.objects.count(),
-        "user_count": User.objects.count(),
-        "avg_rating": Review.objects.aggregate(avg=Avg("rating"))["avg"] or 0,
+        "movie_count": counts[counters.MOVIES],
+        "genre_count": counts[counters.GENRES],
+        "review_count": counts[counters.REVIEWS],
+        "user_count": counts[counters.USERS],
+        "avg_rating": counts[counters.RATING_SUM] / counts[counters.REVIEWS] if counts[counters.REVIEWS] else 0,
     }
     latest_reviews = Review.objects.select_related("movie", "user").order_by("-created_at")[:8]
-    top_movies = Movie.objects.annotate(rc=Count("review")).order_by("-rc", "-release_date")[:8]
+    # rating_count is the per-movie review count maintained by Review.save()/delete
+    top_movies = Movie.objects.order_by("-rating_count", "-release_date")[:8]
     movies = Movie.objects.order_by('-release_date')[:5]  # Recent 5 movies
 
     return render(request, "admin_dashboard.html", {
@@ -308,30 +377,62 @@ def admin_dashboard(request):
         "latest_reviews": latest_reviews,
         "top_movies": top_movies,
         "movies": movies,
+        "cache_stats": tiered.shared_stats(),
     })
 
 @login_required
 @user_passes_test(is_staff_user)
-def analytics(request):
-    # Total movies by genre
-    genre_stats = Movie.objects.values('genre__name').annotate(movie_count=Count('id')).order_by('-movie_count')
+def perf_dashboard(request):
+    recent = (
+        RequestProfile.objects.defer("queries", "profile")
+        .order_by("-created_at")[:50]
+    )
+    return render(request, "admin_perf.html", {
+        "summaries": profiling.view_summaries(),
+        "recent": recent,
+        "sample_rate": settings.PERF_SAMPLE_RATE,
+        "slow_ms": settings.PERF_SLOW_MS,
+    })
 
-    # Average rating by month (last 6 months) - SQLite compatible
-    end_date = timezone.now()
-    start_date = end_date - timezone.timedelta(days=180)
-    monthly_ratings = Review.objects.filter(created_at__range=(start_date, end_date)) \
-        .annotate(month=TruncMonth('created_at')) \
-        .values('month') \
-        .annotate(avg_rating=Avg('rating')) \
-        .order_by('month')
 
-    # User activity (reviews per user)
-    user_activity = User.objects.annotate(review_count=Count('review')).order_by('-review_count')[:5]
+@login_required
+@user_passes_test(is_staff_user)
+def perf_detail(request, pk):
+    capture = get_object_or_404(RequestProfile, pk=pk)
+    # The same statement run again and again from one place is usually an N+1
+    repeats = Counter((query["sql"], query.get("site")) for query in capture.queries)
+    queries = [dict(query, repeats=repeats[query["sql"], query.get("site")]) for query in capture.queries]
+    return render(request, "admin_perf_detail.html", {
+        "capture": capture,
+        "queries": queries,
+        "unrecorded": capture.sql_count - len(capture.queries),
+    })
+
+def _parse_date(value, default):
+    try:
+        return datetime.date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def analytics(request):
+    # Everything here reads the rollup tables maintained by analytics.py
+    start, end = analytics_rollups.default_range()
+    start = _parse_date(request.GET.get('start'), start)
+    end = _parse_date(request.GET.get('end'), end)
+    granularity = request.GET.get('granularity', 'month')
+    if granularity not in analytics_rollups.GRANULARITIES:
+        granularity = 'month'
 
     context = {
-        'genre_stats': genre_stats,
-        'monthly_ratings': monthly_ratings,
-        'user_activity': user_activity,
+        'genre_stats': analytics_rollups.genre_movie_counts(),
+        'rating_series': analytics_rollups.rating_series(start, end, granularity),
+        'user_activity': analytics_rollups.top_reviewers(5),
+        'start': start,
+        'end': end,
+        'granularity': granularity,
     }
     return render(request, 'analytics.html', context)
 # =================== ADMIN MOVIES ===================
@@ -342,14 +443,15 @@ def admin_movies(request):
     genre_id = request.GET.get("genre")
     movies = Movie.objects.all().prefetch_related("genre")
 
-    if q:
-        movies = movies.filter(Q(title__icontains=q) | Q(synopsis__icontains=q))
     if genre_id:
         movies = movies.filter(genre__id=genre_id)
-
-    movies = movies.order_by("-release_date", "title").distinct()
-    paginator = Paginator(movies, 12)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    if q:
+        movies = search_movies(movies, q)
+        ordering = ("-search_rank", "-id")
+    else:
+        ordering = ("-release_date", "-id")
+    paginator = KeysetPaginator(movies, 12, ordering)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     return render(request, "admin_movies.html", {
         "page_obj": page_obj,
@@ -457,17 +559,17 @@ def admin_genre_delete(request, pk):
 
 @staff_required
 def admin_reviews(request):
-    q = request.GET.get("q", "").strip()
-    reviews = Review.objects.select_related("movie", "user").order_by("-created_at")
+    q = request.GET.get("search", "").strip()
+    reviews = Review.objects.select_related("movie", "user")
     if q:
         reviews = reviews.filter(
             Q(movie__title__icontains=q) |
             Q(user__username__icontains=q) |
             Q(comment__icontains=q)
         )
-    paginator = Paginator(reviews, 20)
-    page_obj = paginator.get_page(request.GET.get("page"))
-    return render(request, "admin_reviews.html", {"page_obj": page_obj, "q": q})
+    paginator = KeysetPaginator(reviews, 20, ("-created_at", "-id"))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    return render(request, "admin_reviews.html", {"reviews": page_obj, "search_query": q})
 
 
 @staff_required
@@ -505,19 +607,17 @@ class AdminUserForm(forms.ModelForm):
 
 @staff_required
 def admin_users(request):
-    form = AdminUserSearchForm(request.GET or None)
-    users = User.objects.all().order_by("-is_superuser", "-is_staff", "username")
-    if form.is_valid():
-        q = form.cleaned_data.get("q") or ""
-        if q:
-            users = users.filter(Q(username__icontains=q) | Q(email__icontains=q))
-    paginator = Paginator(users, 30)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    q = request.GET.get("search", "").strip()
+    users = User.objects.all()
+    if q:
+        users = users.filter(Q(username__icontains=q) | Q(email__icontains=q))
+    paginator = KeysetPaginator(users, 30, ("-is_superuser", "-is_staff", "username", "id"))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
     profiles = {p.user_id: p for p in UserProfile.objects.filter(user__in=[u.id for u in page_obj.object_list])}
     return render(request, "admin_users.html", {
-        "page_obj": page_obj,
+        "users": page_obj,
         "profiles": profiles,
-        "form": form
+        "search_query": q,
     })
 
 
@@ -565,18 +665,35 @@ def admin_user_delete(request, user_id):
 
 # =================== PROFILE SETTINGS ===================
 
+@csrf_exempt
 @login_required
 def profile_settings(request):
-    profile = UserProfile.objects.get_or_create(user=request.user)[0]
+    # The avatar cap must be installed before anything reads the body, the CSRF check included
+    handler = AvatarUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    return _profile_settings(request, handler)
+
+
+@csrf_protect
+def _profile_settings(request, handler):
+    profile = get_profile(request.user)
     if request.method == 'POST':
+        previous = profile.avatar.name
         form = ProfileForm(request.POST, request.FILES, instance=profile)
+        if handler.error:
+            form.add_error('avatar', handler.error)
         if form.is_valid():
-            form.save()
+            profile = form.save()
+            if profile.avatar.name != previous:
+                if profile.avatar:
+                    schedule_avatar_processing(profile, previous)
+                elif previous:
+                    delete_avatar_files(previous)
             messages.success(request, 'Profile updated successfully!')
             return redirect('movies:profile')
     else:
         form = ProfileForm(instance=profile)
-    return render(request, 'profile_settings.html', {'form': form})
+    return render(request, 'profile_settings.html', {'form': form, 'profile': profile})
 
 @login_required
 def delete_account(request):
@@ -589,107 +706,19 @@ def delete_account(request):
 
 # =================== ONLINE PLAYER ===================
 
-
-import requests
-from django.contrib.auth.decorators import login_required
-from django.shortcuts import render
-from urllib.parse import urlparse, parse_qs
-import re
-
 @login_required
 def play_online(request):
-    embed_url = None
-    video_type = None
+    embed = None
     error_message = None
     if request.method == 'POST':
         video_link = request.POST.get('video_link', '').strip()
         if video_link:
-            parsed_url = urlparse(video_link)
-            hostname = parsed_url.hostname.lower()
-
-            # YouTube
-            if 'youtube.com' in hostname or 'youtu.be' in hostname:
-                video_type = 'iframe'
-                if parsed_url.path.startswith('/embed/'):
-                    video_id = parsed_url.path.split('/embed/')[1].split('?')[0]
-                elif 'youtu.be' in hostname:
-                    video_id = parsed_url.path[1:].split('?')[0]
-                else:
-                    query_params = parse_qs(parsed_url.query)
-                    video_id = query_params.get('v', [None])[0]
-                if video_id:
-                    embed_url = f"https://www.youtube.com/embed/{video_id}"
-                else:
-                    error_message = "Could not extract a valid video ID from the YouTube link. Use 'Share' > 'Copy Link'."
-
-            # Vimeo
-            elif 'vimeo.com' in hostname:
-                video_type = 'iframe'
-                video_id = parsed_url.path.split('/')[1].split('?')[0]
-                if video_id:
-                    embed_url = f"https://player.vimeo.com/video/{video_id}"
-
-            # Dailymotion
-            elif 'dailymotion.com' in hostname:
-                video_type = 'iframe'
-                video_id = parsed_url.path.split('/video/')[1].split('_')[0]
-                if video_id:
-                    embed_url = f"https://www.dailymotion.com/embed/video/{video_id}"
-
-            # Twitch
-            elif 'twitch.tv' in hostname:
-                video_type = 'iframe'
-                video_id = parsed_url.path.split('/')[1]
-                if video_id:
-                    embed_url = f"https://player.twitch.tv/?channel={video_id}&parent=localhost"  # Adjust parent for production
-
-            # Facebook
-            elif 'facebook.com' in hostname and '/video.php' in parsed_url.path:
-                video_type = 'iframe'
-                video_id = parse_qs(parsed_url.query).get('v', [None])[0]
-                if video_id:
-                    embed_url = f"https://www.facebook.com/video/embed?video_id={video_id}"
-
-            # TikTok
-            elif 'tiktok.com' in hostname:
-                video_type = 'iframe'
-                video_id = parsed_url.path.split('/video/')[1].split('?')[0]
-                if video_id:
-                    embed_url = f"https://www.tiktok.com/embed/v2/{video_id}"
-
-            # Instagram
-            elif 'instagram.com' in hostname and '/reel/' in parsed_url.path:
-                video_type = 'iframe'
-                video_id = parsed_url.path.split('/reel/')[1].split('?')[0]
-                if video_id:
-                    # Attempt to use Instagram oEmbed (requires API setup)
-                    try:
-                        response = requests.get(
-                            f"https://graph.facebook.com/v20.0/instagram_oembed",
-                            params={"url": video_link, "access_token": "YOUR_INSTAGRAM_ACCESS_TOKEN"}
-                        )
-                        data = response.json()
-                        if 'html' in data:
-                            embed_url = data['html']  # oEmbed provides the iframe HTML
-                        else:
-                            error_message = "Instagram embedding requires an API token. Fallback not available."
-                    except Exception:
-                        error_message = "Instagram embedding failed. Please use a supported platform or check API setup."
-
-            # Direct video (e.g., .mp4, .webm, .ogg)
-            elif any(parsed_url.path.endswith(ext) for ext in ['.mp4', '.webm', '.ogg']):
-                video_type = 'direct'
-                embed_url = video_link
-
-            if not embed_url and not error_message:
-                error_message = (
-                    "Unsupported or invalid video link. Supported platforms include YouTube, Vimeo, Dailymotion, Twitch, "
-                    "Facebook, TikTok, Instagram, or direct video URLs (e.g., .mp4). Ensure you copy the link correctly: "
-                    "For YouTube, click 'Share' > 'Copy Link'; for Instagram/TikTok, use the share option and copy the URL."
-                )
+            try:
+                embed = resolve_embed(video_link, parent=request.get_host().split(':')[0])
+            except EmbedError as exc:
+                error_message = str(exc)
 
     return render(request, 'play_online.html', {
-        'embed_url': embed_url,
-        'video_type': video_type,
+        'embed': embed,
         'error_message': error_message
-    })
\ No newline at end of file
+    })
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+
+from .models import UserProfile
+
+WISHLIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(user_id):
+    return f"movies:wishlist:{user_id}"
+
+
+def get_wishlist_ids(user):
+    """
+    Frozen set of movie ids on the user's wishlist.
+
+    Loaded with one values_list query, kept in the cache per user and memoised
+    on the (per-request) user object, so membership checks in templates are
+    plain set lookups.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, "_wishlist_ids", None)
+    if ids is None:
+        key = _cache_key(user.pk)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(
+                UserProfile.wishlist.through.objects
+                .filter(userprofile__user_id=user.pk)
+                .values_list("movie_id", flat=True)
+            )
+            cache.set(key, ids, WISHLIST_CACHE_TIMEOUT)
+        user._wishlist_ids = ids
+    return ids
+
+
+def invalidate_wishlist(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -5,10 +5,8 @@ Keep secrets (SECRET_KEY, DATABASE_URL, etc.) in environment variables.
 """
 
 import os
+import tempfile
 from pathlib import Path
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -61,12 +59,23 @@ INSTALLED_APPS = [
     'cloudinary_storage',
 ]
 
-# Media settings
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+# Media settings: uploads (avatars, posters waiting for upload_poster) have to be
+# readable from every web and task process, so with Cloudinary configured they
+# go there. (Django 5.1+ ignores the old DEFAULT_FILE_STORAGE setting.)
+STORAGES = {
+    "default": {
+        "BACKEND": (
+            "cloudinary_storage.storage.MediaCloudinaryStorage" if os.getenv("CLOUDINARY_URL")
+            else "django.core.files.storage.FileSystemStorage"
+        ),
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # serve static files
+    "movies.profiling.ProfilerMiddleware",  # samples requests and keeps slow ones (/dashboard/perf/)
 
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,7 +98,8 @@ ROOT_URLCONF = "webzmovies.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's backend plus render timing for the request profiler
+        "BACKEND": "movies.profiling.ProfiledDjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -98,6 +108,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",  # required by allauth
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "movies.context_processors.wishlist",
             ],
         },
     },
@@ -122,6 +133,39 @@ else:
         'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
     }
 
+# ---- Cache ----
+# Tag versions, OTP challenges and rate limits live here, so in production it
+# must be shared by every web and task process on every machine: Redis when
+# REDIS_URL is set (install the `redis` package), otherwise the database
+# (the release step in the Procfile runs `manage.py createcachetable`; the
+# movies.W002 check warns while the table is missing). Files under CACHE_DIR
+# are for local development only.
+# movies/cache.py keeps a small in-process tier in front of it.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "webzmovies-cache")),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "movies_cache",
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }
+    }
+
 # ---- Password validators ----
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -146,6 +190,31 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Poster renditions: "cloudinary" builds transformation URLs, "local" renders
+# them with Pillow into MEDIA_ROOT (offline development and tests)
+POSTER_RENDITIONS_BACKEND = os.getenv(
+    "POSTER_RENDITIONS_BACKEND", "cloudinary" if os.getenv("CLOUDINARY_URL") else "local"
+)
+
+# Background tasks (movies/tasks.py): "thread" runs them in a thread pool inside the
+# web process, "worker" leaves them for `manage.py run_tasks`, "sync" right after
+# commit. Render ignores the Procfile and runs no worker unless one is set up as a
+# separate Background Worker service (start command `python manage.py run_tasks`);
+# only then set TASKS_MODE=worker, or OTP emails and uploads are never sent.
+TASKS_MODE = os.getenv("TASKS_MODE", "thread")
+
+# Request profiler (movies/profiling.py): the fraction of requests sampled, the
+# duration over which a request is always kept, whether sampled requests also run
+# under cProfile, and how many profiles to keep
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.01"))
+PERF_SLOW_MS = float(os.getenv("PERF_SLOW_MS", "800"))
+PERF_CPROFILE = os.getenv("PERF_CPROFILE", "False").lower() == "true"
+PERF_KEEP = int(os.getenv("PERF_KEEP", "2000"))
+
+# `manage.py profile_startup` fails when a cold start (fresh interpreter up to a
+# loaded URLconf) takes longer than this; 0 turns the check off
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
 # Security behind proxies (Render)
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SESSION_COOKIE_SECURE = not DEBUG
@@ -182,6 +251,9 @@ EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.Em
 # TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 # TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
+# Graph API token for Instagram oEmbed on "Play Online"; without it the public embed page is used
+INSTAGRAM_OEMBED_TOKEN = os.getenv("INSTAGRAM_OEMBED_TOKEN", "")
+
 # Extra convenience: you can set ALLOWED_HOSTS and CSRF_TRUSTED_ORIGINS in env
 # e.g. ALLOWED_HOSTS=127.0.0.1,localhost,webzmovies.onrender.com
 # CSRF_TRUSTED_ORIGINS=https://webzmovies.onrender.com